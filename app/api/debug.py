@@ -0,0 +1,48 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import FileResponse
+from app.api.dependencies import get_profiler
+from app.core.config import settings
+from app.core.profiling import RequestProfiler
+
+debug_router = APIRouter()
+
+PROFILE_MEDIA_TYPES = {"collapsed": "text/plain", "speedscope": "application/json"}
+
+
+def require_profiling_token(
+        profiler: RequestProfiler = Depends(get_profiler),
+        x_profile: Optional[str] = Header(None, alias=settings.PROFILING_HEADER)
+) -> RequestProfiler:
+    """Las capturas solo se consultan con el token de perfilado (sin token no se autoriza nada)"""
+    if not profiler.authorized(x_profile):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de perfilado inválido")
+    return profiler
+
+
+@debug_router.get("/profiles", summary="Listar las capturas de perfilado recientes")
+async def list_profiles(profiler: RequestProfiler = Depends(require_profiling_token)):
+    """
+    Capturas recientes, la más nueva primero. Cada una separa el tiempo total (wall_ms)
+    en CPU de la solicitud (cpu_ms), espera de E/S (idle_ms) y otras tareas, e indica el
+    tiempo de las llamadas a Pipedrive (upstream_ms).
+    """
+    return {"profiles": profiler.list()}
+
+
+@debug_router.get("/profiles/{profile_id}/{fmt}", summary="Descargar una captura de perfilado")
+async def download_profile(
+        profile_id: str,
+        fmt: str,
+        profiler: RequestProfiler = Depends(require_profiling_token)
+):
+    """
+    Descarga la captura en formato 'collapsed' (flamegraph.pl, speedscope) o
+    'speedscope' (JSON para https://www.speedscope.app).
+    """
+    capture = profiler.get(profile_id)
+    path = capture["files"].get(fmt) if capture else None
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Captura no encontrada")
+    return FileResponse(path, media_type=PROFILE_MEDIA_TYPES[fmt], filename=os.path.basename(path))
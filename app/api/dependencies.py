@@ -0,0 +1,63 @@
+from typing import AsyncIterator, Optional
+from fastapi import Depends, Request
+from app.core.config import settings
+from app.core.profiling import RequestProfiler
+from app.services.idempotency import IdempotencyManager
+from app.services.job_queue import JobQueue
+from app.services.pipedrive_service import PipedriveService
+from app.services.tenants import TenantConfig
+from app.services.webhooks import PipedriveWebhookProcessor
+
+
+def get_tenant(request: Request) -> Optional[TenantConfig]:
+    """
+    Identifica el tenant de la solicitud por API key o por el encabezado de tenant.
+    Retorna None si la aplicación atiende una sola cuenta (TENANTS_ENABLED=false).
+    """
+    registry = request.app.state.tenants
+    if registry is None:
+        return None
+    tenant = registry.resolve(
+        tenant_id=request.headers.get(settings.TENANT_HEADER),
+        api_key=request.headers.get(settings.TENANT_API_KEY_HEADER)
+    )
+    request.state.tenant = tenant
+    return tenant
+
+
+async def get_pipedrive_service(
+        request: Request,
+        tenant: Optional[TenantConfig] = Depends(get_tenant)
+) -> AsyncIterator[PipedriveService]:
+    """Obtiene el servicio de Pipedrive del tenant, o el compartido creado en el lifespan"""
+    if tenant is None:
+        yield request.app.state.pipedrive_service
+        return
+    async with request.app.state.tenants.lease(tenant) as service:
+        yield service
+
+
+def get_tenant_id(request: Request) -> Optional[str]:
+    """ID del tenant resuelto por get_pipedrive_service, o None con una sola cuenta"""
+    tenant = getattr(request.state, "tenant", None)
+    return tenant.tenant_id if tenant else None
+
+
+def get_webhook_processor(request: Request) -> Optional[PipedriveWebhookProcessor]:
+    """Obtiene el procesador de webhooks de Pipedrive, o None si están desactivados"""
+    return request.app.state.webhooks
+
+
+def get_job_queue(request: Request) -> Optional[JobQueue]:
+    """Obtiene la cola de trabajos asíncronos, o None si está desactivada"""
+    return request.app.state.job_queue
+
+
+def get_idempotency_manager(request: Request) -> Optional[IdempotencyManager]:
+    """Obtiene el gestor de Idempotency-Key, o None si está desactivado"""
+    return request.app.state.idempotency
+
+
+def get_profiler(request: Request) -> Optional[RequestProfiler]:
+    """Obtiene el perfilador de solicitudes, o None si está desactivado"""
+    return request.app.state.profiler
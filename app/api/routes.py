@@ -1,28 +1,186 @@
-from fastapi import APIRouter, HTTPException, status
+import secrets
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from app.core.serialization import DefaultJSONResponse, json_loads
 from app.schemas.contact import (
     ContactCreate,
     ContactUpdate,
+    ContactUpsert,
     ContactNote,
     ContactResponse,
-    NoteResponse
+    NoteResponse,
+    ContactBatchCreate,
+    ContactNoteBatch,
+    ContactUpdateBatch,
+    BatchResponse,
+    JobAcceptedResponse,
+    JobStatusResponse,
+    WebhookResponse
 )
+from app.services import contact_operations
+from app.services.contact_import import IMPORT_MEDIA_TYPES, import_contacts, parse_rows
 from app.services.pipedrive_service import PipedriveService
+from app.services.idempotency import IdempotencyManager, request_fingerprint
+from app.services.job_queue import JobQueue
+from app.services.tenants import TenantConfig, tenant_scope
+from app.services.webhooks import PipedriveWebhookProcessor, webhook_credentials
+from app.core.config import settings
+from app.api.dependencies import (
+    get_idempotency_manager,
+    get_job_queue,
+    get_pipedrive_service,
+    get_tenant,
+    get_tenant_id,
+    get_webhook_processor
+)
 from app.core.exceptions import (
     CRMException,
+    CircuitOpenException,
     ContactNotFoundException,
-    DuplicateContactException
+    DeadlineExceededException,
+    DuplicateContactException,
+    ValidationException
 )
 
 crm_router = APIRouter()
 
+webhook_auth = HTTPBasic(auto_error=False)
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que no escucha la desconexión del cliente mientras responde.
+    StreamingResponse consume los mensajes de 'receive' y descartaría el cuerpo de la
+    solicitud, que aquí se sigue leyendo mientras se envían los resultados.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+ASYNC_RESPONSES = {202: {"model": JobAcceptedResponse, "description": "Solicitud encolada (Prefer: respond-async)"}}
+
+def model_response(model: BaseModel, status_code: int = status.HTTP_200_OK) -> JSONResponse:
+    """
+    Serializar el modelo directamente. Al retornar una Response, FastAPI no vuelve a
+    validar el contenido contra response_model (que sigue documentando el endpoint).
+    """
+    return DefaultJSONResponse(status_code=status_code, content=model.model_dump())
+
+async def hold_lease(lease, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Mantener el servicio de un tenant en uso mientras se envía una respuesta en streaming"""
+    async with lease:
+        async for chunk in chunks:
+            yield chunk
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match coincide con el ETag (comparación débil, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+def contact_cache_headers(etag: str) -> dict:
+    """Encabezados de caché de la consulta de un contacto"""
+    headers = {"ETag": etag, "Cache-Control": f"max-age={settings.CONTACT_MAX_AGE_SECONDS}"}
+    if settings.TENANTS_ENABLED:
+        # La misma URL responde distinto según la cuenta
+        headers["Vary"] = f"{settings.TENANT_HEADER}, {settings.TENANT_API_KEY_HEADER}"
+    return headers
+
+def prefers_async(prefer: Optional[str]) -> bool:
+    """El cliente pide procesamiento asíncrono con 'Prefer: respond-async' (RFC 7240)"""
+    return prefer is not None and "respond-async" in prefer.lower()
+
+def wants_async(prefer: Optional[str], job_queue: Optional[JobQueue]) -> bool:
+    """Procesar la solicitud en la cola de trabajos durable"""
+    return job_queue is not None and prefers_async(prefer)
+
+async def enqueue_job(job_queue: JobQueue, request: Request, kind: str, payload: dict) -> JSONResponse:
+    """Encolar una escritura y responder 202 con la URL para consultar su estado"""
+    job = await job_queue.enqueue(kind, payload, tenant_id=get_tenant_id(request))
+    status_url = f"/crm/jobs/{job['id']}"
+    body = JobAcceptedResponse(
+        success=True,
+        message="Solicitud aceptada. Consulte el estado del trabajo en status_url.",
+        job_id=job["id"],
+        status=job["status"],
+        status_url=status_url
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=body.model_dump(),
+        headers={"Location": status_url, "Preference-Applied": "respond-async"}
+    )
+
+# Encabezados de la respuesta que se almacenan con la Idempotency-Key y se repiten al reutilizarla
+IDEMPOTENT_HEADERS = ("Location", "Preference-Applied")
+
+async def run_idempotent(
+        request: Request,
+        idempotency: Optional[IdempotencyManager],
+        idempotency_key: Optional[str],
+        payload: dict,
+        success_status: int,
+        handler: Callable[[], Awaitable]
+):
+    """
+    Ejecutar el handler una sola vez por Idempotency-Key.
+    Una clave repetida retorna la respuesta almacenada sin llamar a Pipedrive, con los
+    encabezados de IDEMPOTENT_HEADERS de la original (p. ej. Location de un 202).
+    """
+    if not idempotency_key or idempotency is None:
+        return await handler()
+
+    response = None
+
+    async def execute():
+        nonlocal response
+        result = await handler()
+        if isinstance(result, JSONResponse):
+            response = result
+            headers = {name: result.headers[name] for name in IDEMPOTENT_HEADERS if name in result.headers}
+            return result.status_code, json_loads(result.body), headers
+        return success_status, result.model_dump(mode="json"), {}
+
+    path = request.url.path
+    status_code, body, headers, replayed = await idempotency.run(
+        idempotency_key,
+        request_fingerprint(request.method, path, payload),
+        execute,
+        # Cada tenant tiene su propio espacio de claves
+        scope=tenant_scope(get_tenant_id(request), path)
+    )
+    if replayed:
+        return JSONResponse(status_code=status_code, content=body, headers={**headers, "Idempotent-Replayed": "true"})
+    # Primera ejecución: la respuesta del handler sale tal cual, con todos sus encabezados
+    return response if response is not None else JSONResponse(status_code=status_code, content=body)
+
 @crm_router.post(
     "/contact",
     response_model=ContactResponse,
+    responses=ASYNC_RESPONSES,
     status_code=status.HTTP_201_CREATED,
     summary="Crear un nuevo contacto",
     description="Crea un nuevo contacto en Pipedrive. Implementa idempotencia verificando duplicados."
 )
-async def create_contact(contact: ContactCreate):
+async def create_contact(
+        request: Request,
+        contact: ContactCreate,
+        service: PipedriveService = Depends(get_pipedrive_service),
+        job_queue: Optional[JobQueue] = Depends(get_job_queue),
+        idempotency: Optional[IdempotencyManager] = Depends(get_idempotency_manager),
+        prefer: Optional[str] = Header(None),
+        idempotency_key: Optional[str] = Header(None)
+):
     """
     Crea un nuevo contacto en Pipedrive.
 
@@ -31,73 +189,109 @@ async def create_contact(contact: ContactCreate):
     - **phone**: Teléfono en formato internacional (opcional)
 
     La API verifica duplicados antes de crear para evitar contactos repetidos.
+    Con el encabezado `Idempotency-Key`, una solicitud repetida retorna la respuesta
+    original sin volver a consultar Pipedrive.
     """
-    service = PipedriveService()
+    payload = contact.model_dump(mode="json")
 
-    try:
-        # Idempotencia: Verificar si el contacto ya existe
-        existing = await service.check_duplicate_contact(
-            contact.name,
-            contact.email
-        )
+    async def handle():
+        if wants_async(prefer, job_queue):
+            return await enqueue_job(job_queue, request, "create_contact", payload)
 
-        if existing:
-            return ContactResponse(
-                success=True,
-                message=f"El contacto '{contact.name}' ya existe. Se retorna el contacto existente.",
-                contact_id=existing.get("id"),
-                contact_url=service.get_person_url(existing.get("id")),
-                data={
-                    "id": existing.get("id"),
-                    "name": existing.get("name"),
-                    "email": existing.get("email", [{}])[0].get("value") if existing.get("email") else None,
-                    "phone": existing.get("phone", [{}])[0].get("value") if existing.get("phone") else None,
-                    "is_new": False
-                }
+        try:
+            return model_response(
+                await contact_operations.create_contact(service, contact),
+                status.HTTP_201_CREATED
             )
 
-        # Preparar datos del nuevo contacto
-        person_data = {
-            "name": contact.name
-        }
-
-        if contact.email:
-            person_data["email"] = [{"value": contact.email}]
-
-        if contact.phone:
-            person_data["phone"] = [{"value": contact.phone}]
-
-        # Crear nuevo contacto en Pipedrive
-        result = await service.create_person(person_data)
-
-        return ContactResponse(
-            success=True,
-            message=f"Contacto '{contact.name}' creado exitosamente en Pipedrive",
-            contact_id=result.get("id"),
-            contact_url=service.get_person_url(result.get("id")),
-            data={
-                "id": result.get("id"),
-                "name": result.get("name"),
-                "email": result.get("email", [{}])[0].get("value") if result.get("email") else None,
-                "phone": result.get("phone", [{}])[0].get("value") if result.get("phone") else None,
-                "is_new": True
-            }
-        )
+        except (CircuitOpenException, DeadlineExceededException):
+            # Se responde con 503 o 504 desde los manejadores globales
+            raise
+        except CRMException as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
 
-    except CRMException as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
+    return await run_idempotent(
+        request, idempotency, idempotency_key, payload, status.HTTP_201_CREATED, handle
+    )
+
+@crm_router.post(
+    "/contact:upsert",
+    response_model=ContactResponse,
+    responses={201: {"model": ContactResponse, "description": "Contacto creado"}, **ASYNC_RESPONSES},
+    summary="Crear o actualizar un contacto y agregarle notas",
+    description="Crea el contacto si no existe (o toma el existente), actualiza sus campos y agrega notas en una sola solicitud"
+)
+async def upsert_contact(
+        request: Request,
+        upsert: ContactUpsert,
+        service: PipedriveService = Depends(get_pipedrive_service),
+        job_queue: Optional[JobQueue] = Depends(get_job_queue),
+        idempotency: Optional[IdempotencyManager] = Depends(get_idempotency_manager),
+        prefer: Optional[str] = Header(None),
+        idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Crea o actualiza un contacto y le agrega notas, en lugar de llamar por separado a
+    POST /crm/contact, PATCH /crm/contact y POST /crm/contact/note.
+
+    - **name**, **email**, **phone**: Datos del contacto; el existente se busca por email o nombre
+    - **fields**: Campos a actualizar (opcional); al crear, se envían en el mismo POST
+    - **notes**: Notas a agregar, en orden (opcional)
+
+    El contacto se resuelve una sola vez y la actualización y las notas se envían en
+    paralelo. Responde `201` si el contacto se creó y `200` si ya existía.
+    """
+    payload = upsert.model_dump(mode="json")
+
+    async def handle():
+        if wants_async(prefer, job_queue):
+            return await enqueue_job(job_queue, request, "upsert_contact", payload)
+
+        try:
+            response = await contact_operations.upsert_contact(service, upsert)
+            return model_response(
+                response,
+                status.HTTP_201_CREATED if response.data["is_new"] else status.HTTP_200_OK
+            )
+
+        except ValidationException as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={"message": e.message, **e.details}
+            )
+        except (CircuitOpenException, DeadlineExceededException):
+            # Se responde con 503 o 504 desde los manejadores globales
+            raise
+        except CRMException as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
+    return await run_idempotent(
+        request, idempotency, idempotency_key, payload, status.HTTP_200_OK, handle
+    )
 
 @crm_router.post(
     "/contact/note",
     response_model=NoteResponse,
+    responses=ASYNC_RESPONSES,
     status_code=status.HTTP_201_CREATED,
     summary="Agregar nota a un contacto",
     description="Agrega una nota a un contacto existente en Pipedrive"
 )
-async def add_contact_note(note: ContactNote):
+async def add_contact_note(
+        request: Request,
+        note: ContactNote,
+        service: PipedriveService = Depends(get_pipedrive_service),
+        job_queue: Optional[JobQueue] = Depends(get_job_queue),
+        idempotency: Optional[IdempotencyManager] = Depends(get_idempotency_manager),
+        prefer: Optional[str] = Header(None),
+        idempotency_key: Optional[str] = Header(None)
+):
     """
     Agrega una nota a un contacto existente.
 
@@ -105,39 +299,82 @@ async def add_contact_note(note: ContactNote):
     - **content**: Contenido de la nota
 
     La API busca el contacto por nombre, email o ID y maneja desambiguación.
+    Con el encabezado `Idempotency-Key`, una solicitud repetida no vuelve a crear la nota.
+    Las notas de un mismo contacto se escriben en el orden en que se aceptan. Con
+    `Prefer: respond-async` (sin cola de trabajos) se responde `202` en cuanto la nota
+    queda en cola, sin esperar a Pipedrive.
     """
-    service = PipedriveService()
+    payload = note.model_dump(mode="json")
+
+    async def handle():
+        if wants_async(prefer, job_queue):
+            return await enqueue_job(job_queue, request, "add_contact_note", payload)
+
+        # Sin cola de trabajos, 'Prefer: respond-async' deja la nota en el pipeline en memoria
+        wait = not (prefers_async(prefer) and service.note_pipeline)
+        try:
+            response = model_response(
+                await contact_operations.add_contact_note(service, note, wait=wait),
+                status.HTTP_201_CREATED if wait else status.HTTP_202_ACCEPTED
+            )
+            if not wait:
+                response.headers["Preference-Applied"] = "respond-async"
+            return response
+
+        except ContactNotFoundException as e:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No se encontró el contacto: {note.contact_identifier}"
+            )
+        except DuplicateContactException as e:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={
+                    "message": "Se encontraron múltiples contactos. Por favor, especifique cuál usando el ID.",
+                    "duplicates": e.duplicates
+                }
+            )
+        except (CircuitOpenException, DeadlineExceededException):
+            # Se responde con 503 o 504 desde los manejadores globales
+            raise
+        except CRMException as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
+    return await run_idempotent(
+        request, idempotency, idempotency_key, payload, status.HTTP_201_CREATED, handle
+    )
+
+@crm_router.get(
+    "/contact/{identifier}",
+    response_model=ContactResponse,
+    responses={304: {"description": "El contacto no cambió desde el ETag de If-None-Match"}},
+    summary="Consultar un contacto",
+    description="Consulta un contacto de Pipedrive por nombre, email o ID"
+)
+async def get_contact(
+        identifier: str,
+        service: PipedriveService = Depends(get_pipedrive_service),
+        if_none_match: Optional[str] = Header(None)
+):
+    """
+    Consulta un contacto existente en Pipedrive.
+
+    - **identifier**: Nombre, email o ID del contacto
 
+    La respuesta incluye un `ETag` que cambia cuando el contacto se modifica en Pipedrive.
+    Con `If-None-Match` y el mismo ETag se responde `304` sin cuerpo. Las consultas
+    repetidas se sirven desde la caché, sin llamar a Pipedrive.
+    """
     try:
-        # Encontrar contacto
-        contact = await service.find_contact_by_identifier(note.contact_identifier)
-
-        if not contact:
-            raise ContactNotFoundException(note.contact_identifier)
-
-        contact_id = contact.get("id")
-        contact_name = contact.get("name")
-
-        # Agregar nota al contacto
-        result = await service.add_note(contact_id, note.content)
-
-        return NoteResponse(
-            success=True,
-            message=f"Nota agregada exitosamente al contacto '{contact_name}'",
-            note_id=result.get("id"),
-            data={
-                "note_id": result.get("id"),
-                "contact_id": contact_id,
-                "contact_name": contact_name,
-                "content": note.content,
-                "created_at": result.get("add_time")
-            }
-        )
+        contact, etag = await contact_operations.get_contact(service, identifier)
 
     except ContactNotFoundException as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"No se encontró el contacto: {note.contact_identifier}"
+            detail=f"No se encontró el contacto: {identifier}"
         )
     except DuplicateContactException as e:
         raise HTTPException(
@@ -147,55 +384,57 @@ async def add_contact_note(note: ContactNote):
                 "duplicates": e.duplicates
             }
         )
+    except (CircuitOpenException, DeadlineExceededException):
+        # Se responde con 503 o 504 desde los manejadores globales
+        raise
     except CRMException as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
 
+    headers = contact_cache_headers(etag)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response = model_response(contact)
+    response.headers.update(headers)
+    return response
+
 @crm_router.patch(
     "/contact",
     response_model=ContactResponse,
+    responses=ASYNC_RESPONSES,
     summary="Actualizar un contacto",
     description="Actualiza campos de un contacto existente en Pipedrive"
 )
-async def update_contact(update: ContactUpdate):
+async def update_contact(
+        request: Request,
+        update: ContactUpdate,
+        service: PipedriveService = Depends(get_pipedrive_service),
+        job_queue: Optional[JobQueue] = Depends(get_job_queue),
+        prefer: Optional[str] = Header(None)
+):
     """
     Actualiza un contacto existente en Pipedrive.
 
     - **contact_identifier**: Nombre, email o ID del contacto
     - **fields**: Diccionario con los campos a actualizar
 
-    Campos comunes: name, email, phone, org_id, owner_id, etc.
+    Campos comunes: name, email, phone, org_id, owner_id, etc. Los campos personalizados
+    pueden indicarse por su nombre en Pipedrive ("Industria") y las opciones por su nombre;
+    un campo desconocido o un valor de tipo incorrecto se rechaza con `422`.
     """
-    service = PipedriveService()
+    if wants_async(prefer, job_queue):
+        return await enqueue_job(job_queue, request, "update_contact", update.model_dump(mode="json"))
 
     try:
-        # Encontrar contacto
-        contact = await service.find_contact_by_identifier(update.contact_identifier)
-
-        if not contact:
-            raise ContactNotFoundException(update.contact_identifier)
-
-        contact_id = contact.get("id")
-        contact_name = contact.get("name")
-
-        # Actualizar contacto
-        result = await service.update_person(contact_id, update.fields)
-
-        return ContactResponse(
-            success=True,
-            message=f"Contacto '{contact_name}' actualizado exitosamente",
-            contact_id=contact_id,
-            contact_url=service.get_person_url(contact_id),
-            data={
-                "id": result.get("id"),
-                "name": result.get("name"),
-                "updated_fields": update.fields,
-                "update_time": result.get("update_time")
-            }
-        )
+        return model_response(await contact_operations.update_contact(service, update))
 
+    except ValidationException as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": e.message, **e.details}
+        )
     except ContactNotFoundException as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -209,8 +448,203 @@ async def update_contact(update: ContactUpdate):
                 "duplicates": e.duplicates
             }
         )
+    except (CircuitOpenException, DeadlineExceededException):
+        # Se responde con 503 o 504 desde los manejadores globales
+        raise
     except CRMException as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+@crm_router.post(
+    "/contacts:batch",
+    response_model=BatchResponse,
+    summary="Crear contactos por lotes",
+    description="Crea varios contactos en una sola solicitud, con resultado individual por elemento"
+)
+async def create_contacts_batch(
+        batch: ContactBatchCreate,
+        service: PipedriveService = Depends(get_pipedrive_service)
+):
+    """
+    Crea varios contactos en Pipedrive.
+
+    - **items**: Lista de contactos (mismo formato que POST /crm/contact)
+
+    Los contactos repetidos dentro del lote (mismo email o nombre) se crean una sola vez
+    y se reportan con `duplicate_of`. Los errores de un elemento no afectan a los demás.
+    """
+    return await contact_operations.create_contacts_batch(service, batch.items)
+
+@crm_router.post(
+    "/contacts:import",
+    summary="Importar contactos en streaming",
+    description="Importa contactos desde un cuerpo NDJSON o CSV y retorna un resultado NDJSON por fila",
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "Un resultado por fila y un resumen final"},
+        415: {"description": "Content-Type no soportado"}
+    }
+)
+async def import_contacts_stream(
+        request: Request,
+        service: PipedriveService = Depends(get_pipedrive_service)
+):
+    """
+    Importa contactos fila por fila sin cargar el archivo completo en memoria.
+
+    - **NDJSON** (`application/x-ndjson`): un objeto por línea con name, email y phone
+    - **CSV** (`text/csv`): encabezado con las columnas name, email y phone
+
+    Cada fila se valida como en POST /crm/contact. La respuesta se envía mientras se
+    procesa el archivo: una línea por fila (`index`, `success`, `status_code`, `result`
+    o `error`) en orden de finalización, y al final `{"summary": {...}}`.
+    El cliente debe leer la respuesta a medida que envía el archivo (p. ej. curl -T).
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type not in IMPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content-Type no soportado. Use uno de: {', '.join(IMPORT_MEDIA_TYPES)}"
+        )
+
+    rows = parse_rows(request.stream(), media_type)
+    results = import_contacts(service, rows)
+    tenant = getattr(request.state, "tenant", None)
+    if tenant is not None:
+        # La dependencia libera el servicio antes de enviar la respuesta; la importación
+        # lo retiene mientras dure para que no se cierre por inactividad
+        results = hold_lease(request.app.state.tenants.lease(tenant), results)
+    return DuplexStreamingResponse(results, media_type="application/x-ndjson")
+
+@crm_router.post(
+    "/contact/notes:batch",
+    response_model=BatchResponse,
+    summary="Agregar notas por lotes",
+    description="Agrega varias notas en una sola solicitud, con resultado individual por elemento"
+)
+async def add_contact_notes_batch(
+        batch: ContactNoteBatch,
+        service: PipedriveService = Depends(get_pipedrive_service)
+):
+    """
+    Agrega varias notas a contactos existentes.
+
+    - **items**: Lista de notas (mismo formato que POST /crm/contact/note)
+
+    Cada elemento reporta su propio código de estado (201, 404 o 409).
+    """
+    return await contact_operations.add_contact_notes_batch(service, batch.items)
+
+@crm_router.patch(
+    "/contacts:batch",
+    response_model=BatchResponse,
+    summary="Actualizar contactos por lotes",
+    description="Actualiza varios contactos en una sola solicitud, con resultado individual por elemento"
+)
+async def update_contacts_batch(
+        batch: ContactUpdateBatch,
+        service: PipedriveService = Depends(get_pipedrive_service)
+):
+    """
+    Actualiza varios contactos existentes.
+
+    - **items**: Lista de actualizaciones (mismo formato que PATCH /crm/contact)
+
+    Las actualizaciones del mismo contacto dentro del lote se combinan en una sola.
+    """
+    return await contact_operations.update_contacts_batch(service, batch.items)
+
+@crm_router.get(
+    "/jobs/{job_id}",
+    response_model=JobStatusResponse,
+    summary="Consultar un trabajo asíncrono",
+    description="Retorna el estado y el resultado de una escritura encolada con 'Prefer: respond-async'"
+)
+async def get_job(
+        job_id: str,
+        job_queue: Optional[JobQueue] = Depends(get_job_queue),
+        tenant: Optional[TenantConfig] = Depends(get_tenant)
+):
+    """
+    Consulta el estado de un trabajo: pending, running, succeeded o failed.
+
+    - **result**: respuesta de la operación cuando el trabajo termina con éxito
+    - **error**: detalle del último error (con su código de estado) si falló
+    """
+    job = await job_queue.get(job_id) if job_queue else None
+    # Un tenant solo puede consultar sus propios trabajos
+    if not job or job["tenant_id"] != (tenant.tenant_id if tenant else None):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No se encontró el trabajo: {job_id}"
+        )
+
+    return JobStatusResponse(
+        job_id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        attempts=job["attempts"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        result=job["result"],
+        error=job["error"]
+    )
+
+@crm_router.post(
+    "/webhooks/pipedrive",
+    response_model=WebhookResponse,
+    summary="Recibir webhooks de personas de Pipedrive",
+    description="Aplica a la caché local las altas, cambios, eliminaciones y fusiones de personas hechas en Pipedrive"
+)
+async def pipedrive_webhook(
+        request: Request,
+        tenant: Optional[str] = Query(None),
+        processor: Optional[PipedriveWebhookProcessor] = Depends(get_webhook_processor),
+        credentials: Optional[HTTPBasicCredentials] = Depends(webhook_auth)
+):
+    """
+    Endpoint llamado por Pipedrive con HTTP Basic: WEBHOOK_USER y WEBHOOK_PASSWORD, o
+    con TENANTS_ENABLED, el webhook_user y webhook_password del tenant.
+
+    - **tenant**: tenant de la cuenta que envía el evento (con TENANTS_ENABLED)
+
+    Los eventos repetidos se descartan. Siempre se responde 200 a un evento válido,
+    aunque se ignore, para que Pipedrive no lo reintente.
+    """
+    if processor is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Webhooks desactivados")
+
+    registry = request.app.state.tenants
+    tenant_config = registry.store.get(tenant) if registry is not None and tenant else None
+    if registry is not None and tenant_config is None:
+        # Tenant desconocido: ninguna credencial es válida (sin revelar si el tenant existe)
+        user, password = "", ""
+    else:
+        user, password = webhook_credentials(tenant_config)
+    authorized = bool(user) and credentials is not None and all((
+        secrets.compare_digest(credentials.username.encode(), user.encode()),
+        secrets.compare_digest(credentials.password.encode(), password.encode())
+    ))
+    if not authorized:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Credenciales del webhook inválidas",
+            headers={"WWW-Authenticate": "Basic"}
+        )
+
+    try:
+        payload = json_loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El cuerpo debe ser JSON")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El cuerpo debe ser un objeto JSON")
+
+    if registry is None:
+        service = request.app.state.pipedrive_service
+    else:
+        # Si el tenant no tiene un servicio abierto, no hay caché que actualizar
+        service = registry.get_active(tenant)
+
+    outcome = await processor.process(payload, service, scope=tenant or "")
+    return WebhookResponse(success=True, status=outcome)
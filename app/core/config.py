@@ -8,6 +8,14 @@ class Settings(BaseSettings):
     PIPEDRIVE_API_TOKEN: str
     PIPEDRIVE_API_URL: str = "https://api.pipedrive.com/v1"
 
+    # Multi-tenant: varias cuentas de Pipedrive en un mismo proceso
+    TENANTS_ENABLED: bool = False
+    TENANTS_CONFIG_PATH: str = "tenants.json"
+    TENANT_HEADER: str = "X-Tenant-ID"
+    TENANT_API_KEY_HEADER: str = "X-API-Key"
+    TENANT_IDLE_SECONDS: float = 600.0  # se cierra el pool de un tenant sin uso durante este tiempo
+    TENANT_EVICTION_INTERVAL_SECONDS: float = 60.0
+
     # Configuración de la aplicación
     APP_ENV: str = "development"
     DEBUG: bool = True
@@ -15,6 +23,105 @@ class Settings(BaseSettings):
     # Configuración de tiempo de espera y reintentos
     REQUEST_TIMEOUT: int = 30
     MAX_RETRIES: int = 3
+    RETRY_BACKOFF_BASE: float = 0.25
+    RETRY_BACKOFF_MAX: float = 8.0
+    # Presupuesto total por solicitud entrante (segundos, 0 para desactivar)
+    REQUEST_DEADLINE_SECONDS: float = 25.0
+    # Encabezado con el que el cliente indica su propio plazo (segundos); no amplía el anterior
+    REQUEST_DEADLINE_HEADER: str = "X-Request-Timeout"
+    # Cancelar las llamadas pendientes a Pipedrive si el cliente se desconecta
+    CANCEL_ON_DISCONNECT: bool = True
+
+    # Configuración del pool de conexiones HTTP hacia Pipedrive
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+
+    # Limitador de tasa del lado del cliente (cupo por token de Pipedrive)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" o "sqlite" (compartido entre workers)
+    RATE_LIMIT_CAPACITY: int = 20
+    RATE_LIMIT_WINDOW_SECONDS: float = 2.0
+    RATE_LIMIT_SQLITE_PATH: str = "rate_limit.db"
+
+    # Circuit breaker hacia Pipedrive
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_FAILURE_THRESHOLD: int = 5  # fallos consecutivos para abrir el circuito
+    CIRCUIT_RECOVERY_SECONDS: float = 30.0  # tiempo abierto antes de probar (half-open)
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = 1
+    CIRCUIT_SLOW_CALL_SECONDS: float = 10.0  # una respuesta más lenta cuenta como fallo
+
+    # Resolución de identificadores: búsqueda exacta por email o nombre
+    SEARCH_PAGE_SIZE: int = 10  # resultados por página de /persons/search
+    RESOLVE_FUZZY_FALLBACK: bool = True  # búsqueda difusa si la exacta no encuentra nada
+
+    # Campos de personas (GET /personFields): nombres visibles y validación en actualizaciones
+    PERSON_FIELDS_ENABLED: bool = True
+    PERSON_FIELDS_TTL_SECONDS: float = 3600.0
+    PERSON_FIELDS_REFRESH_SECONDS: float = 60.0  # recarga mínima ante un campo desconocido
+
+    # Caché de búsquedas de personas (TTL + LRU)
+    CACHE_ENABLED: bool = True
+    CACHE_TTL_SECONDS: float = 60.0
+    CACHE_MAX_ENTRIES: int = 10000
+    CONTACT_MAX_AGE_SECONDS: int = 30  # Cache-Control de GET /crm/contact/{identifier}
+
+    # Webhooks de Pipedrive: los cambios de personas actualizan la caché y la réplica
+    WEBHOOKS_ENABLED: bool = False
+    WEBHOOK_USER: str = ""  # credenciales HTTP Basic con las que Pipedrive llama al webhook
+    WEBHOOK_PASSWORD: str = ""
+    WEBHOOK_CACHE_TTL_SECONDS: float = 14400.0  # TTL de la caché mientras llegan los webhooks
+    WEBHOOK_DEDUP_TTL_SECONDS: float = 3600.0
+
+    # Réplica local de personas en SQLite
+    MIRROR_ENABLED: bool = False
+    MIRROR_PATH: str = "contacts_mirror.db"
+    MIRROR_PAGE_SIZE: int = 500
+    MIRROR_POLL_INTERVAL_SECONDS: float = 60.0
+    MIRROR_MAX_STALENESS_SECONDS: float = 300.0
+    MIRROR_FULL_SYNC_INTERVAL_SECONDS: float = 86400.0  # carga completa periódica que quita las personas eliminadas
+
+    # Operaciones por lotes
+    BATCH_CONCURRENCY: int = 10
+    # Importación NDJSON/CSV en streaming (POST /crm/contacts:import)
+    IMPORT_CONCURRENCY: int = 10
+    IMPORT_MAX_LINE_BYTES: int = 65536
+
+    # Pipeline de notas: orden por contacto y escrituras concurrentes entre contactos
+    NOTES_PIPELINE_ENABLED: bool = True
+    NOTES_CONCURRENCY: int = 10
+    NOTES_MERGE_MAX: int = 1  # > 1 une en un solo POST las notas seguidas de un mismo contacto
+    NOTES_MERGE_WINDOW_SECONDS: float = 0.0  # espera para acumular notas antes de unirlas
+
+    # Actualizaciones de contactos (PATCH /crm/contact)
+    UPDATE_SKIP_UNCHANGED: bool = True  # no enviar el PUT si los valores ya son los actuales
+    UPDATE_COALESCE_WINDOW_SECONDS: float = 0.0  # ventana para unir actualizaciones de una persona (0 = desactivado)
+
+    # Cola de trabajos asíncronos (Prefer: respond-async)
+    JOBS_ENABLED: bool = False
+    JOBS_DB_PATH: str = "jobs.db"
+    JOBS_WORKER_CONCURRENCY: int = 4
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_LEASE_SECONDS: float = 60.0
+    JOBS_POLL_INTERVAL_SECONDS: float = 1.0
+
+    # Idempotency-Key en endpoints POST
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_BACKEND: str = "memory"  # "memory" o "sqlite"
+    IDEMPOTENCY_DB_PATH: str = "idempotency.db"
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0
+    IDEMPOTENCY_LOCK_SECONDS: float = 60.0  # vigencia de la reserva de una clave en curso
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0  # espera por otra solicitud con la misma clave antes de responder 409
+
+    # Perfilado de solicitudes bajo demanda (desactivado: sin middleware ni costo)
+    PROFILING_ENABLED: bool = False
+    PROFILING_DIR: str = "profiles"
+    PROFILING_TOKEN: str = ""  # valor del encabezado PROFILING_HEADER que pide perfilar una solicitud
+    PROFILING_HEADER: str = "X-Profile"
+    PROFILING_SAMPLE_RATE: float = 0.0  # fracción de solicitudes /crm/* perfiladas al azar
+    PROFILING_INTERVAL_SECONDS: float = 0.005
+    PROFILING_MAX_CAPTURES: int = 50
 
     class Config:
         env_file = ".env"
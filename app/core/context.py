@@ -0,0 +1,35 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+class RequestTrace:
+    """Llamadas a Pipedrive realizadas durante la solicitud entrante actual"""
+    __slots__ = ("upstream_calls", "upstream_seconds")
+
+    def __init__(self):
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+
+    def record_upstream(self, seconds: float):
+        self.upstream_calls += 1
+        self.upstream_seconds += seconds
+
+    def add(self, other: "RequestTrace"):
+        """Sumar las llamadas de otra traza (p. ej. una escritura hecha en segundo plano)"""
+        self.upstream_calls += other.upstream_calls
+        self.upstream_seconds += other.upstream_seconds
+
+
+# Traza de la solicitud entrante actual (None fuera de una solicitud HTTP)
+request_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+# Instante (time.monotonic) en el que vence el presupuesto de la solicitud entrante actual
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def remaining_budget() -> Optional[float]:
+    """Segundos restantes del presupuesto de la solicitud actual, o None si no hay límite"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
@@ -22,4 +22,37 @@ class DuplicateContactException(CRMException):
 class ValidationException(CRMException):
     """Excepción lanzada para errores de validación de datos"""
     def __init__(self, field: str, message: str):
-        super().__init__(f"Error de validación en {field}: {message}", {"field": field})
\ No newline at end of file
+        super().__init__(f"Error de validación en {field}: {message}", {"field": field})
+
+class IdempotencyKeyMismatchException(CRMException):
+    """Excepción lanzada cuando se reutiliza una Idempotency-Key con una solicitud diferente"""
+    def __init__(self, idempotency_key: str):
+        self.idempotency_key = idempotency_key
+        message = "La Idempotency-Key ya se usó con una solicitud diferente"
+        super().__init__(message, {"idempotency_key": idempotency_key})
+
+class IdempotencyKeyInProgressException(CRMException):
+    """Excepción lanzada cuando otra solicitud con la misma Idempotency-Key sigue en curso"""
+    def __init__(self, idempotency_key: str):
+        self.idempotency_key = idempotency_key
+        message = "Otra solicitud con la misma Idempotency-Key está en curso. Intente de nuevo más tarde."
+        super().__init__(message, {"idempotency_key": idempotency_key})
+
+class CircuitOpenException(CRMException):
+    """Excepción lanzada cuando el circuit breaker hacia Pipedrive está abierto"""
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        message = "Pipedrive no está disponible temporalmente. Intente de nuevo más tarde."
+        super().__init__(message, {"retry_after": round(retry_after, 3)})
+
+class TenantNotFoundException(CRMException):
+    """Excepción lanzada cuando la solicitud no identifica un tenant configurado"""
+    def __init__(self, tenant: str = None):
+        self.tenant = tenant
+        message = f"Tenant desconocido: {tenant}" if tenant else "La solicitud no identifica un tenant"
+        super().__init__(message)
+
+class DeadlineExceededException(CRMException):
+    """Excepción lanzada cuando se agota el presupuesto de tiempo de la solicitud entrante"""
+    def __init__(self):
+        super().__init__("Se agotó el tiempo de la solicitud antes de completar las llamadas a Pipedrive")
@@ -0,0 +1,171 @@
+import re
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Buckets de latencia en segundos (de 5 ms a 30 s, el REQUEST_TIMEOUT por defecto)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def normalize_endpoint(endpoint: str) -> str:
+    """Reemplazar los IDs numéricos de la ruta para no crear una serie por persona"""
+    return _ID_SEGMENT.sub("/{id}", "/" + endpoint.lstrip("/"))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Contador monotónico con etiquetas"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Histograma con buckets fijos; observe() es O(log n) sobre los buckets"""
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Tuple[str, ...] = (),
+            buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # etiquetas -> [conteo por bucket (no acumulado, +Inf al final), suma]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                label_str = _format_labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+# Muestra de un gauge calculado al momento de exportar: (nombre, ayuda, [(etiquetas, valor)])
+GaugeSamples = Tuple[str, str, Iterable[Tuple[dict, float]]]
+
+
+def stats_gauges(prefix: str, stats: dict, documentation: str) -> Iterable[GaugeSamples]:
+    """Convertir los valores numéricos de un dict de stats() en gauges (los booleanos como 0/1)"""
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            yield f"{prefix}_{key}", f"{documentation}: {key}", [({}, value)]
+
+
+class MetricsRegistry:
+    """Registro de métricas exportado en formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], Iterable[GaugeSamples]]] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[GaugeSamples]]):
+        """Registrar una función que produce gauges al momento de exportar"""
+        self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Iterable[GaugeSamples]]):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    names, values = tuple(labels.keys()), tuple(labels.values())
+                    lines.append(f"{name}{_format_labels(names, values)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "crm_http_request_duration_seconds",
+    "Latencia de las solicitudes atendidas por la API",
+    ("method", "route", "status")
+)
+UPSTREAM_REQUEST_DURATION = REGISTRY.histogram(
+    "pipedrive_request_duration_seconds",
+    "Latencia de cada llamada HTTP a Pipedrive (incluye reintentos como llamadas separadas)",
+    ("method", "endpoint", "status")
+)
+UPSTREAM_CALLS_PER_REQUEST = REGISTRY.histogram(
+    "crm_pipedrive_calls_per_request",
+    "Cantidad de llamadas a Pipedrive por solicitud atendida",
+    ("route",),
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21)
+)
+CONTACT_UPDATES = REGISTRY.counter(
+    "crm_contact_updates_total",
+    "Actualizaciones de contactos por resultado (sent: se envió el PUT, unchanged: sin cambios)",
+    ("outcome",)
+)
+CRM_ERRORS = REGISTRY.counter(
+    "crm_errors_total",
+    "Errores de CRM devueltos al cliente (respuesta o elemento de un lote) por clase de excepción",
+    ("error",)
+)
@@ -0,0 +1,184 @@
+import asyncio
+import time
+from typing import Optional
+from app.core.config import settings
+from app.core.context import RequestTrace, request_deadline, request_trace
+from app.core.metrics import HTTP_REQUEST_DURATION, UPSTREAM_CALLS_PER_REQUEST
+from app.core.profiling import RequestProfiler
+
+
+# Clave del scope ASGI que indica que el cliente se desconectó antes de la respuesta
+CLIENT_DISCONNECTED = "crm.client_disconnected"
+
+
+def _header_deadline(scope) -> Optional[float]:
+    """Plazo en segundos indicado por el cliente en REQUEST_DEADLINE_HEADER"""
+    name = settings.REQUEST_DEADLINE_HEADER.lower().encode()
+    for key, value in scope.get("headers") or ():
+        if key == name:
+            try:
+                seconds = float(value)
+            except ValueError:
+                return None
+            return seconds if seconds > 0 else None
+    return None
+
+
+class RequestDeadlineMiddleware:
+    """
+    Middleware ASGI que asigna a cada solicitud un presupuesto total de tiempo.
+
+    El presupuesto es REQUEST_DEADLINE_SECONDS, o el plazo del encabezado
+    REQUEST_DEADLINE_HEADER si es menor. Cada llamada a Pipedrive acota su timeout
+    al tiempo restante y no se inicia una vez vencido el plazo.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budgets = [b for b in (settings.REQUEST_DEADLINE_SECONDS, _header_deadline(scope)) if b]
+        if not budgets:
+            await self.app(scope, receive, send)
+            return
+
+        token = request_deadline.set(time.monotonic() + min(budgets))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
+
+
+class ClientDisconnectMiddleware:
+    """
+    Middleware ASGI que cancela el procesamiento de la solicitud si el cliente se
+    desconecta antes de recibir la respuesta (p. ej. el nodo HTTP de n8n agotó su
+    timeout), para no seguir gastando cupo de Pipedrive en una respuesta que nadie leerá.
+
+    Los mensajes de 'receive' se leen en una tarea aparte y se entregan a la
+    aplicación a través de una cola de un elemento, que conserva la contrapresión
+    al leer el cuerpo en streaming.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.CANCEL_ON_DISCONNECT:
+            await self.app(scope, receive, send)
+            return
+
+        messages: asyncio.Queue = asyncio.Queue(maxsize=1)
+        response_complete = False
+
+        async def send_tracking(message):
+            nonlocal response_complete
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        app_task = asyncio.create_task(self.app(scope, messages.get, send_tracking))
+
+        async def pump():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    # Tras la respuesta completa (p. ej. tareas en segundo plano) no se cancela nada
+                    if not response_complete:
+                        scope[CLIENT_DISCONNECTED] = True
+                        app_task.cancel()
+                    await messages.put(message)
+                    return
+                await messages.put(message)
+
+        pump_task = asyncio.create_task(pump())
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            if not scope.get(CLIENT_DISCONNECTED):
+                raise
+        finally:
+            pump_task.cancel()
+            app_task.cancel()
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila las solicitudes marcadas con el encabezado
+    PROFILING_HEADER (con el valor de PROFILING_TOKEN) o elegidas al azar según
+    PROFILING_SAMPLE_RATE. Solo se agrega a la aplicación con PROFILING_ENABLED.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.wants(scope):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = None
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        capture = self.profiler.start(scope)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.profiler.finish(capture, status_code, request_trace.get())
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide la latencia por endpoint y las llamadas a Pipedrive
+    de cada solicitud. Agrega el encabezado Server-Timing a la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        trace = RequestTrace()
+        token = request_trace.set(trace)
+        status_code = None
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                timing = (
+                    f'app;dur={elapsed_ms:.1f}, '
+                    f'pipedrive;dur={trace.upstream_seconds * 1000:.1f};desc="{trace.upstream_calls} calls"'
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_trace.reset(token)
+            if status_code is None:
+                # 499: el cliente cerró la conexión antes de la respuesta (convención de nginx)
+                status_code = 499 if scope.get(CLIENT_DISCONNECTED) else 500
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start, scope["method"], route_path, str(status_code)
+            )
+            UPSTREAM_CALLS_PER_REQUEST.observe(trace.upstream_calls, route_path)
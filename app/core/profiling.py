@@ -0,0 +1,268 @@
+"""
+Perfilado de solicitudes bajo demanda.
+
+Un hilo toma muestras de la pila del hilo del bucle de eventos cada PROFILING_INTERVAL_SECONDS
+mientras dura una solicitud marcada. Cada muestra se atribuye a la solicitud si la tarea en
+ejecución es suya (la tarea de la solicitud o una creada en su contexto, p. ej. con
+asyncio.gather); si no, el bucle estaba esperando E/S o atendiendo otras tareas. El
+resultado se escribe en formato de pilas colapsadas (flamegraph.pl, speedscope) y en el
+formato JSON de speedscope.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.context import RequestTrace
+
+logger = logging.getLogger(__name__)
+
+IDLE_FRAME = "(bucle de eventos: esperando E/S)"
+OTHER_FRAME = "(otras tareas)"
+
+# Captura de la solicitud en curso; las tareas creadas en su contexto se le asocian
+_active_capture: ContextVar[Optional["Capture"]] = ContextVar("profile_capture", default=None)
+
+
+class Capture:
+    """Muestras de pila de una solicitud"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.tasks = set()
+        self.frames: List[dict] = []
+        self._frame_ids: Dict[tuple, int] = {}
+        self.samples: List[tuple] = []
+        self.running = 0
+        self.idle = 0
+        self.other = 0
+        self.sampler: Optional[_Sampler] = None
+        self.context_token = None
+
+    def _frame_id(self, key: tuple) -> int:
+        frame_id = self._frame_ids.get(key)
+        if frame_id is None:
+            frame_id = self._frame_ids[key] = len(self.frames)
+            name, file, line = key
+            self.frames.append({"name": name, "file": file, "line": line} if file else {"name": name})
+        return frame_id
+
+    def sample(self, frame, task: Optional[asyncio.Task]):
+        """Registrar una muestra (se llama desde el hilo del muestreador)"""
+        if task is not None and task in self.tasks:
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(self._frame_id((code.co_name, code.co_filename, code.co_firstlineno)))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(tuple(stack))
+            self.running += 1
+        elif task is None:
+            self.samples.append((self._frame_id((IDLE_FRAME, None, None)),))
+            self.idle += 1
+        else:
+            self.samples.append((self._frame_id((OTHER_FRAME, None, None)),))
+            self.other += 1
+
+    def collapsed(self) -> str:
+        """Pilas colapsadas: 'raíz;...;hoja cantidad' por línea"""
+        lines = []
+        for stack, count in Counter(self.samples).items():
+            names = []
+            for frame_id in stack:
+                frame = self.frames[frame_id]
+                file = frame.get("file")
+                names.append(f"{frame['name']} ({os.path.basename(file)}:{frame['line']})" if file else frame["name"])
+            lines.append(f"{';'.join(names)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, wall_ms: float) -> dict:
+        weight = wall_ms / len(self.samples) if self.samples else 0
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path}",
+            "exporter": "crm-api",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{self.method} {self.path}",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": wall_ms,
+                "samples": [list(stack) for stack in self.samples],
+                "weights": [weight] * len(self.samples)
+            }]
+        }
+
+
+class _Sampler(threading.Thread):
+    """Hilo que toma muestras de la pila del hilo del bucle de eventos"""
+
+    def __init__(self, capture: Capture, loop: asyncio.AbstractEventLoop, interval: float):
+        super().__init__(name="crm-profiler", daemon=True)
+        self.capture = capture
+        self.loop = loop
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            self.capture.sample(frame, asyncio.current_task(self.loop))
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop):
+    """Asociar a la captura activa las tareas creadas dentro de una solicitud perfilada"""
+    previous = loop.get_task_factory()
+    if getattr(previous, "_profiling", False):
+        return
+
+    def task_factory(loop, coro, **kwargs):
+        if previous is not None:
+            task = previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        capture = context.get(_active_capture) if context is not None else _active_capture.get()
+        if capture is not None:
+            capture.tasks.add(task)
+        return task
+
+    task_factory._profiling = True
+    loop.set_task_factory(task_factory)
+
+
+class RequestProfiler:
+    """
+    Decide qué solicitudes se perfilan (encabezado autorizado o muestreo aleatorio),
+    guarda las capturas en disco y conserva el resumen de las más recientes.
+    Se perfila una solicitud a la vez; las demás se atienden sin perfilar.
+    """
+
+    def __init__(
+            self,
+            directory: str = None,
+            sample_rate: float = None,
+            token: str = None,
+            interval: float = None,
+            max_captures: int = None
+    ):
+        self.directory = directory or settings.PROFILING_DIR
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.token = settings.PROFILING_TOKEN if token is None else token
+        self.interval = interval or settings.PROFILING_INTERVAL_SECONDS
+        self._header = settings.PROFILING_HEADER.lower().encode()
+        self._active: Optional[Capture] = None
+        self.captures: deque = deque(maxlen=max_captures or settings.PROFILING_MAX_CAPTURES)
+
+    def authorized(self, value: Optional[str]) -> bool:
+        """El valor del encabezado coincide con PROFILING_TOKEN (sin token, no se autoriza nada)"""
+        return bool(self.token and value and secrets.compare_digest(value.encode(), self.token.encode()))
+
+    def wants(self, scope) -> bool:
+        if self._active is not None or not scope["path"].startswith("/crm/"):
+            return False
+        for key, value in scope.get("headers") or ():
+            if key == self._header:
+                return self.authorized(value.decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, scope) -> Capture:
+        loop = asyncio.get_running_loop()
+        _install_task_factory(loop)
+        capture = Capture(scope["method"], scope["path"])
+        capture.tasks.add(asyncio.current_task())
+        capture.context_token = _active_capture.set(capture)
+        self._active = capture
+        capture.sampler = _Sampler(capture, loop, self.interval)
+        capture.sampler.start()
+        return capture
+
+    def finish(self, capture: Capture, status_code: Optional[int], trace: Optional[RequestTrace]) -> dict:
+        """Detener el muestreo, registrar el resumen y escribir los archivos en segundo plano"""
+        capture.sampler.stop()
+        wall_ms = (time.perf_counter() - capture.started) * 1000
+        _active_capture.reset(capture.context_token)
+        self._active = None
+        capture.tasks.clear()
+
+        total = len(capture.samples) or 1
+        base = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{capture.id}")
+        summary = {
+            "id": capture.id,
+            "method": capture.method,
+            "path": capture.path,
+            "status_code": status_code,
+            "started_at": capture.started_at,
+            "wall_ms": round(wall_ms, 2),
+            # CPU de la solicitud en el bucle (validación, JSON, lógica) según las muestras
+            "cpu_ms": round(wall_ms * capture.running / total, 2),
+            "idle_ms": round(wall_ms * capture.idle / total, 2),
+            "other_tasks_ms": round(wall_ms * capture.other / total, 2),
+            # Tiempo esperando a Pipedrive (suma de las llamadas, que pueden ser concurrentes)
+            "upstream_ms": round(trace.upstream_seconds * 1000, 2) if trace else None,
+            "upstream_calls": trace.upstream_calls if trace else None,
+            "samples": len(capture.samples),
+            "files": {"collapsed": f"{base}.collapsed.txt", "speedscope": f"{base}.speedscope.json"}
+        }
+        evicted = self.captures[0] if len(self.captures) == self.captures.maxlen else None
+        self.captures.append(summary)
+        asyncio.get_running_loop().run_in_executor(None, self._write, capture, summary, evicted)
+        return summary
+
+    def _write(self, capture: Capture, summary: dict, evicted: Optional[dict]):
+        if evicted:
+            self._remove_files(evicted)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(summary["files"]["collapsed"], "w", encoding="utf-8") as f:
+            f.write(capture.collapsed())
+        with open(summary["files"]["speedscope"], "w", encoding="utf-8") as f:
+            json.dump(capture.speedscope(summary["wall_ms"]), f)
+
+    @staticmethod
+    def _remove_files(summary: dict):
+        for path in summary["files"].values():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, capture_id: str) -> Optional[dict]:
+        return next((c for c in self.captures if c["id"] == capture_id), None)
+
+    def list(self) -> List[dict]:
+        """Capturas recientes, la más nueva primero"""
+        return list(reversed(self.captures))
+
+
+def create_request_profiler() -> Optional[RequestProfiler]:
+    """
+    Construir el perfilador, o None si está desactivado (sin middleware ni costo alguno).
+    Sin PROFILING_TOKEN no se activa: las capturas exponen el código y los datos de las solicitudes.
+    """
+    if not settings.PROFILING_ENABLED:
+        return None
+    if not settings.PROFILING_TOKEN:
+        logger.warning("PROFILING_ENABLED sin PROFILING_TOKEN: el perfilado queda desactivado")
+        return None
+    return RequestProfiler()
@@ -0,0 +1,17 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional; sin él se usa el módulo json estándar
+    orjson = None
+
+# Clase de respuesta por defecto de la aplicación
+DefaultJSONResponse = ORJSONResponse if orjson else JSONResponse
+
+
+def json_loads(data: bytes) -> Any:
+    """Decodificar JSON con orjson si está instalado"""
+    return orjson.loads(data) if orjson else json.loads(data)
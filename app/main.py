@@ -1,17 +1,129 @@
-from fastapi import FastAPI, status
+import asyncio
+import math
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Request, status
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from app.api.debug import debug_router
 from app.api.routes import crm_router
 from app.core.config import settings
-from app.core.exceptions import CRMException, ContactNotFoundException, DuplicateContactException
+from app.core.metrics import CRM_ERRORS, REGISTRY, stats_gauges
+from app.core.serialization import DefaultJSONResponse
+from app.core.middleware import (
+    ClientDisconnectMiddleware,
+    MetricsMiddleware,
+    ProfilingMiddleware,
+    RequestDeadlineMiddleware
+)
+from app.core.profiling import create_request_profiler
+from app.core.exceptions import (
+    CRMException,
+    CircuitOpenException,
+    ContactNotFoundException,
+    DeadlineExceededException,
+    DuplicateContactException,
+    IdempotencyKeyInProgressException,
+    IdempotencyKeyMismatchException,
+    TenantNotFoundException
+)
+from app.services.contact_mirror import ContactMirrorSync
+from app.services.http_client import create_http_client
+from app.services.idempotency import create_idempotency_manager
+from app.services.job_queue import create_job_queue
+from app.services.pipedrive_service import PipedriveService
+from app.services.tenants import create_tenant_registry
+from app.services.webhooks import create_webhook_processor
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Abre el pool HTTP compartido al iniciar y lo cierra al apagar la aplicación"""
+    http_client = create_http_client()
+    service = PipedriveService(client=http_client)
+    app.state.pipedrive_service = service
+
+    mirror_task = None
+    if service.mirror:
+        mirror_task = asyncio.create_task(ContactMirrorSync(service, service.mirror).run())
+
+    tenants = create_tenant_registry()
+    app.state.tenants = tenants
+    eviction_task = None
+    if tenants:
+        eviction_task = asyncio.create_task(tenants.run(settings.TENANT_EVICTION_INTERVAL_SECONDS))
+
+    idempotency = create_idempotency_manager()
+    app.state.idempotency = idempotency
+
+    webhooks = create_webhook_processor()
+    app.state.webhooks = webhooks
+
+    job_queue = create_job_queue(service, tenants)
+    app.state.job_queue = job_queue
+    if job_queue:
+        job_queue.start()
+
+    def collect_component_stats():
+        """Exponer las métricas de los componentes opcionales como gauges"""
+        if service.rate_limiter:
+            yield from stats_gauges("crm_rate_limiter", service.rate_limiter.stats(), "Limitador de tasa")
+        if service.cache:
+            yield from stats_gauges("crm_cache", service.cache.stats(), "Caché de personas")
+        if service.circuit_breaker:
+            yield from stats_gauges("crm_circuit_breaker", service.circuit_breaker.stats(), "Circuit breaker")
+        if service.note_pipeline:
+            yield from stats_gauges("crm_notes", service.note_pipeline.stats(), "Pipeline de notas")
+        if service.update_coalescer:
+            yield from stats_gauges("crm_updates", service.update_coalescer.stats(), "Combinación de actualizaciones")
+        if service.person_fields:
+            yield from stats_gauges("crm_person_fields", service.person_fields.stats(), "Campos de personas")
+        if service.mirror:
+            yield from stats_gauges("crm_mirror", service.mirror.stats(), "Réplica de contactos")
+        if webhooks:
+            yield from stats_gauges("crm_webhooks", webhooks.stats(), "Eventos de webhooks de Pipedrive")
+        if tenants:
+            yield from stats_gauges("crm_tenants", tenants.stats(), "Servicios de Pipedrive por tenant")
+        if job_queue:
+            jobs = job_queue.stats()
+            yield "crm_jobs_workers", "Workers de la cola de trabajos", [({}, jobs["workers"])]
+            yield "crm_jobs", "Trabajos por estado", [
+                ({"status": job_status}, count) for job_status, count in jobs["jobs"].items()
+            ]
+
+    REGISTRY.register_collector(collect_component_stats)
+
+    try:
+        yield
+    finally:
+        REGISTRY.unregister_collector(collect_component_stats)
+        if job_queue:
+            await job_queue.stop()
+            job_queue.store.close()
+        if idempotency:
+            idempotency.store.close()
+        if mirror_task:
+            mirror_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await mirror_task
+        if tenants:
+            eviction_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await eviction_task
+            await tenants.aclose()
+        await service.aclose()
+        await http_client.aclose()
 
 app = FastAPI(
     title="API - FASTAPI - Integración con Pipedrive CRM",
     description="API para integración con Pipedrive CRM mediante agente conversacional n8n",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=DefaultJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -22,10 +134,27 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestDeadlineMiddleware)
+app.add_middleware(ClientDisconnectMiddleware)
+# Sin PROFILING_ENABLED el middleware no se agrega: las solicitudes no pagan nada
+profiler = create_request_profiler()
+app.state.profiler = profiler
+if profiler:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+app.add_middleware(MetricsMiddleware)
 
 # Exception handlers
+# crm_errors_total cuenta las excepciones que producen la respuesta, no las que se manejan internamente
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_metrics_handler(request, exc: StarletteHTTPException):
+    # Las rutas traducen las excepciones de CRM a HTTPException dentro del except: se cuenta la original
+    if isinstance(exc.__context__, CRMException):
+        CRM_ERRORS.inc(type(exc.__context__).__name__)
+    return await http_exception_handler(request, exc)
+
 @app.exception_handler(CRMException)
 async def crm_exception_handler(request, exc: CRMException):
+    CRM_ERRORS.inc(type(exc).__name__)
     return JSONResponse(
         status_code=status.HTTP_400_BAD_REQUEST,
         content={
@@ -37,6 +166,7 @@ async def crm_exception_handler(request, exc: CRMException):
 
 @app.exception_handler(ContactNotFoundException)
 async def contact_not_found_handler(request, exc: ContactNotFoundException):
+    CRM_ERRORS.inc(type(exc).__name__)
     return JSONResponse(
         status_code=status.HTTP_404_NOT_FOUND,
         content={
@@ -48,6 +178,7 @@ async def contact_not_found_handler(request, exc: ContactNotFoundException):
 
 @app.exception_handler(DuplicateContactException)
 async def duplicate_contact_handler(request, exc: DuplicateContactException):
+    CRM_ERRORS.inc(type(exc).__name__)
     return JSONResponse(
         status_code=status.HTTP_409_CONFLICT,
         content={
@@ -57,14 +188,98 @@ async def duplicate_contact_handler(request, exc: DuplicateContactException):
         }
     )
 
+@app.exception_handler(IdempotencyKeyMismatchException)
+async def idempotency_key_mismatch_handler(request, exc: IdempotencyKeyMismatchException):
+    CRM_ERRORS.inc(type(exc).__name__)
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={
+            "success": False,
+            "error": exc.message,
+            "idempotency_key": exc.idempotency_key
+        }
+    )
+
+@app.exception_handler(IdempotencyKeyInProgressException)
+async def idempotency_key_in_progress_handler(request, exc: IdempotencyKeyInProgressException):
+    CRM_ERRORS.inc(type(exc).__name__)
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        headers={"Retry-After": "1"},
+        content={
+            "success": False,
+            "error": exc.message,
+            "idempotency_key": exc.idempotency_key
+        }
+    )
+
+@app.exception_handler(DeadlineExceededException)
+async def deadline_exceeded_handler(request, exc: DeadlineExceededException):
+    CRM_ERRORS.inc(type(exc).__name__)
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={
+            "success": False,
+            "error": exc.message
+        }
+    )
+
+@app.exception_handler(TenantNotFoundException)
+async def tenant_not_found_handler(request, exc: TenantNotFoundException):
+    CRM_ERRORS.inc(type(exc).__name__)
+    return JSONResponse(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        content={
+            "success": False,
+            "error": exc.message
+        }
+    )
+
+@app.exception_handler(CircuitOpenException)
+async def circuit_open_handler(request, exc: CircuitOpenException):
+    CRM_ERRORS.inc(type(exc).__name__)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+        content={
+            "success": False,
+            "error": exc.message,
+            "details": exc.details
+        }
+    )
+
 @app.get("/health", tags=["Health"])
-async def health_check():
-    return {
-        "status": "healthy",
+async def health_check(request: Request):
+    """Con el circuito hacia Pipedrive abierto responde 503 para que el balanceador pueda reaccionar"""
+    service = request.app.state.pipedrive_service
+    breaker = service.circuit_breaker.stats() if service.circuit_breaker else None
+    degraded = bool(breaker and breaker["open"])
+    content = {
+        "status": "degraded" if degraded else "healthy",
         "service": "API - FASTAPI - Integración con Pipedrive CRM",
         "version": "1.0.0",
-        "pipedrive_configured": bool(settings.PIPEDRIVE_API_TOKEN)
+        "pipedrive_configured": bool(settings.PIPEDRIVE_API_TOKEN),
+        "rate_limiter": service.rate_limiter.stats() if service.rate_limiter else None,
+        "cache": service.cache.stats() if service.cache else None,
+        "mirror": service.mirror.stats() if service.mirror else None,
+        "notes": service.note_pipeline.stats() if service.note_pipeline else None,
+        "person_fields": service.person_fields.stats() if service.person_fields else None,
+        "updates": service.update_coalescer.stats() if service.update_coalescer else None,
+        "jobs": request.app.state.job_queue.stats() if request.app.state.job_queue else None,
+        "tenants": request.app.state.tenants.stats() if request.app.state.tenants else None,
+        "webhooks": request.app.state.webhooks.stats() if request.app.state.webhooks else None,
+        "circuit_breaker": breaker
     }
+    if degraded:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=content)
+    return content
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 app.include_router(crm_router, prefix="/crm", tags=["CRM"])
+if profiler:
+    app.include_router(debug_router, prefix="/debug", tags=["Debug"])
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, field_validator
-from typing import Optional
+from typing import List, Optional
 import re
 
 class ContactCreate(BaseModel):
@@ -43,6 +43,31 @@ class ContactUpdate(BaseModel):
             }
         }
 
+class ContactUpsert(ContactCreate):
+    """Schema para crear o actualizar un contacto y agregarle notas en una sola solicitud"""
+    fields: dict = Field(default_factory=dict, description="Campos a actualizar (o a incluir al crear)")
+    notes: List[str] = Field(default_factory=list, max_length=50, description="Notas a agregar al contacto")
+
+    @field_validator('notes')
+    @classmethod
+    def validate_notes(cls, v):
+        if any(not note.strip() for note in v):
+            raise ValueError('Las notas no pueden estar vacías')
+        return v
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "name": "Falcao García",
+                "email": "falcao@verticcal.com",
+                "phone": "+57 300 123 4567",
+                "fields": {
+                    "Industria": "Tecnología"
+                },
+                "notes": ["Cliente interesado en plan Premium"]
+            }
+        }
+
 class ContactNote(BaseModel):
     """Schema para agregar una nota a un contacto"""
     contact_identifier: str = Field(..., description="Nombre, email o ID del contacto")
@@ -69,4 +94,60 @@ class NoteResponse(BaseModel):
     success: bool
     message: str
     note_id: Optional[int] = None
-    data: Optional[dict] = None
\ No newline at end of file
+    data: Optional[dict] = None
+
+class ContactBatchCreate(BaseModel):
+    """Schema para crear contactos por lotes"""
+    items: List[ContactCreate] = Field(..., min_length=1, max_length=1000, description="Contactos a crear")
+
+class ContactNoteBatch(BaseModel):
+    """Schema para agregar notas por lotes"""
+    items: List[ContactNote] = Field(..., min_length=1, max_length=1000, description="Notas a agregar")
+
+class ContactUpdateBatch(BaseModel):
+    """Schema para actualizar contactos por lotes"""
+    items: List[ContactUpdate] = Field(..., min_length=1, max_length=1000, description="Actualizaciones a aplicar")
+
+class BatchItemResult(BaseModel):
+    """Resultado de un elemento dentro de un lote"""
+    index: int
+    success: bool
+    status_code: int
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    details: Optional[dict] = None
+    duplicate_of: Optional[int] = None
+
+class BatchResponse(BaseModel):
+    """Schema para respuesta de operaciones por lotes"""
+    success: bool
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
+
+class JobAcceptedResponse(BaseModel):
+    """Schema para respuesta de una solicitud encolada (202)"""
+    success: bool
+    message: str
+    job_id: str
+    status: str
+    status_url: str
+
+class WebhookResponse(BaseModel):
+    """Schema para respuesta a un webhook de Pipedrive"""
+    success: bool
+    status: str
+
+
+class JobStatusResponse(BaseModel):
+    """Schema para consultar el estado de un trabajo"""
+    job_id: str
+    kind: str
+    status: str
+    attempts: int
+    created_at: float
+    updated_at: float
+    result: Optional[dict] = None
+    error: Optional[dict] = None
@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from app.core.config import settings
+from app.services.singleflight import SingleFlight
+
+_MISSING = object()
+
+
+class AsyncTTLCache:
+    """
+    Caché en memoria con expiración (TTL) y desalojo LRU.
+
+    Las consultas concurrentes de una misma clave ausente se agrupan: solo la
+    primera ejecuta el loader y las demás esperan su resultado. Los errores del
+    loader se propagan a todos los que esperan y no se almacenan.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._loads = SingleFlight()
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_served = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Obtener un valor vigente; las entradas expiradas cuentan como fallo"""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Obtener un valor aunque haya expirado. Las entradas expiradas se conservan
+        hasta que el LRU las desaloja o se invalidan, por lo que sirven de respaldo
+        cuando Pipedrive no está disponible.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self.stale_served += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Guardar un valor, desalojando el menos usado si se supera la capacidad"""
+        self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]):
+        """Eliminar todas las entradas que cumplan el predicado (clave, valor)"""
+        for key in [k for k, (v, _) in self._entries.items() if predicate(k, v)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """Obtener de caché o cargar con el loader, agrupando cargas concurrentes de la misma clave"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        async def load():
+            value = await loader()
+            self.set(key, value, ttl)
+            return value
+
+        return await self._loads.do(key, load)
+
+    def stats(self) -> dict:
+        """Métricas de la caché"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self._loads.coalesced,
+            "stale_served": self.stale_served
+        }
+
+
+def create_person_cache() -> Optional[AsyncTTLCache]:
+    """Construir la caché de personas configurada, o None si está desactivada"""
+    if not settings.CACHE_ENABLED:
+        return None
+    # Con los webhooks activos los cambios hechos en Pipedrive llegan por push y el TTL puede ser largo
+    ttl = settings.WEBHOOK_CACHE_TTL_SECONDS if settings.WEBHOOKS_ENABLED else settings.CACHE_TTL_SECONDS
+    return AsyncTTLCache(settings.CACHE_MAX_ENTRIES, ttl)
@@ -0,0 +1,128 @@
+import time
+from collections import deque
+from typing import Optional
+
+from app.core.config import settings
+from app.core.exceptions import CircuitOpenException
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para las llamadas a Pipedrive.
+
+    - closed: las llamadas pasan; tras N fallos consecutivos se abre.
+    - open: las llamadas fallan de inmediato con CircuitOpenException hasta que
+      pasa el tiempo de recuperación.
+    - half_open: se permiten unas pocas llamadas de prueba; si una tiene éxito
+      el circuito se cierra, si falla vuelve a abrirse.
+
+    Cuentan como fallo los errores de conexión, los 5xx y las respuestas más
+    lentas que slow_call_seconds.
+    """
+
+    def __init__(
+            self,
+            failure_threshold: int = 5,
+            recovery_seconds: float = 30.0,
+            half_open_max_calls: int = 1,
+            slow_call_seconds: float = 10.0
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.slow_call_seconds = slow_call_seconds
+        self._state = CIRCUIT_CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+        # Latencias recientes (segundos) para /health
+        self._latencies = deque(maxlen=100)
+
+    @property
+    def state(self) -> str:
+        if self._state == CIRCUIT_OPEN and time.monotonic() - self._opened_at >= self.recovery_seconds:
+            self._state = CIRCUIT_HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == CIRCUIT_OPEN
+
+    def before_call(self):
+        """Reservar el paso de una llamada o fallar de inmediato si el circuito no lo permite"""
+        state = self.state
+        if state == CIRCUIT_OPEN:
+            self.rejected += 1
+            raise CircuitOpenException(self.recovery_seconds - (time.monotonic() - self._opened_at))
+        if state == CIRCUIT_HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenException(self.recovery_seconds)
+            self._half_open_calls += 1
+
+    def record(self, elapsed: float, failed: bool):
+        """Registrar el resultado de una llamada que pasó por before_call()"""
+        self._latencies.append(elapsed)
+        if failed or elapsed >= self.slow_call_seconds:
+            self._on_failure()
+        else:
+            self._on_success()
+
+    def release(self):
+        """Liberar el paso de una llamada abandonada sin resultado (p. ej. cancelada)"""
+        if self._state == CIRCUIT_HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def _on_success(self):
+        self.consecutive_failures = 0
+        if self._state != CIRCUIT_CLOSED:
+            self._state = CIRCUIT_CLOSED
+            self._half_open_calls = 0
+
+    def _on_failure(self):
+        self.consecutive_failures += 1
+        if self._state == CIRCUIT_HALF_OPEN or (
+                self._state == CIRCUIT_CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self._state = CIRCUIT_OPEN
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+
+    def _latency_percentile(self, pct: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 6)
+
+    def stats(self) -> dict:
+        """Estado del circuito y latencia reciente de Pipedrive"""
+        state = self.state
+        return {
+            "state": state,
+            "open": state == CIRCUIT_OPEN,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "recent_calls": len(self._latencies),
+            "latency_p50_seconds": self._latency_percentile(50),
+            "latency_p95_seconds": self._latency_percentile(95)
+        }
+
+
+def create_circuit_breaker() -> Optional[CircuitBreaker]:
+    """Construir el circuit breaker configurado, o None si está desactivado"""
+    if not settings.CIRCUIT_BREAKER_ENABLED:
+        return None
+    return CircuitBreaker(
+        failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+        recovery_seconds=settings.CIRCUIT_RECOVERY_SECONDS,
+        half_open_max_calls=settings.CIRCUIT_HALF_OPEN_MAX_CALLS,
+        slow_call_seconds=settings.CIRCUIT_SLOW_CALL_SECONDS
+    )
@@ -0,0 +1,222 @@
+import asyncio
+import codecs
+import csv
+import json
+import time
+from typing import AsyncIterator, Optional, Tuple, Union
+
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.context import request_deadline
+from app.core.exceptions import CRMException
+from app.schemas.contact import BatchItemResult, ContactCreate
+from app.services import contact_operations
+from app.services.identifiers import normalize_identifier
+from app.services.pipedrive_service import PipedriveService
+from app.services.singleflight import SingleFlight
+
+# Formatos aceptados por POST /crm/contacts:import (media type -> formato)
+IMPORT_MEDIA_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+CSV_COLUMNS = ("name", "email", "phone")
+
+# Fila leída: (índice, datos) o (índice, resultado de error si no se pudo leer)
+Row = Tuple[int, Union[dict, BatchItemResult]]
+
+
+def _row_error(index: int, message: str, details: Optional[dict] = None) -> BatchItemResult:
+    return BatchItemResult(index=index, success=False, status_code=422, error=message, details=details)
+
+
+def _exceeds(text: str, max_bytes: int) -> bool:
+    """El texto codificado en UTF-8 ocupa más de max_bytes (sin codificarlo si no hace falta)"""
+    return len(text) > max_bytes or (len(text) * 4 > max_bytes and len(text.encode("utf-8")) > max_bytes)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Optional[str]]:
+    """
+    Dividir el cuerpo en líneas a medida que llega, sin acumular el archivo.
+    Una línea de más de max_line_bytes (en UTF-8) se descarta y se reporta como None.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    oversized = False
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if oversized or _exceeds(line, max_line_bytes):
+                oversized = False
+                yield None
+            else:
+                yield line.rstrip("\r")
+        if _exceeds(buffer, max_line_bytes):
+            oversized = True
+            buffer = ""
+    buffer += decoder.decode(b"", final=True)
+    if oversized or _exceeds(buffer, max_line_bytes):
+        yield None
+    elif buffer.strip():
+        yield buffer.rstrip("\r")
+
+
+async def ndjson_rows(lines: AsyncIterator[Optional[str]]) -> AsyncIterator[Row]:
+    index = 0
+    async for line in lines:
+        if line is None:
+            yield index, _row_error(index, "La fila supera el tamaño máximo permitido")
+        elif not line.strip():
+            continue
+        else:
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                data = _row_error(index, f"JSON inválido: {e.msg}")
+            if not isinstance(data, (dict, BatchItemResult)):
+                data = _row_error(index, "Cada línea debe ser un objeto JSON")
+            yield index, data
+        index += 1
+
+
+async def csv_rows(lines: AsyncIterator[Optional[str]], max_record_bytes: int = None) -> AsyncIterator[Row]:
+    """
+    Filas de un CSV con encabezado (name, email, phone); admite campos entre comillas con
+    saltos de línea. Un registro de más de max_record_bytes (p. ej. por una comilla sin
+    cerrar) se reporta como error y la lectura continúa en la línea siguiente.
+    """
+    max_record_bytes = max_record_bytes or settings.IMPORT_MAX_LINE_BYTES
+    header = None
+    index = 0
+    record = None
+    record_bytes = 0
+    async for line in lines:
+        line_bytes = len(line.encode("utf-8")) if line is not None else 0
+        if line is None or (record is not None and record_bytes + 1 + line_bytes > max_record_bytes):
+            record = None
+            if header is not None:
+                yield index, _row_error(index, "La fila supera el tamaño máximo permitido (¿comillas sin cerrar?)")
+                index += 1
+            continue
+
+        # Un número impar de comillas indica que el campo continúa en la línea siguiente
+        if record is None:
+            record, record_bytes = line, line_bytes
+        else:
+            record, record_bytes = f"{record}\n{line}", record_bytes + 1 + line_bytes
+        if record.count('"') % 2:
+            continue
+        values, record = next(csv.reader([record]), []), None
+        if not any(v.strip() for v in values):
+            continue
+
+        if header is None:
+            header = [v.strip().lower() for v in values]
+            continue
+        data = {
+            column: value.strip() or None
+            for column, value in zip(header, values)
+            if column in CSV_COLUMNS
+        }
+        yield index, data
+        index += 1
+
+    if record is not None and header is not None:
+        yield index, _row_error(index, "Comillas sin cerrar al final del archivo")
+
+
+def parse_rows(chunks: AsyncIterator[bytes], media_type: str) -> AsyncIterator[Row]:
+    lines = iter_lines(chunks, settings.IMPORT_MAX_LINE_BYTES)
+    if IMPORT_MEDIA_TYPES[media_type] == "csv":
+        return csv_rows(lines)
+    return ndjson_rows(lines)
+
+
+async def import_contacts(
+        service: PipedriveService,
+        rows: AsyncIterator[Row],
+        concurrency: int = None
+) -> AsyncIterator[str]:
+    """
+    Crear contactos fila por fila y producir un resultado NDJSON por fila, más un resumen final.
+
+    Las colas acotadas mantienen la memoria constante: si Pipedrive (o su límite de tasa)
+    frena a los workers, la cola de entrada se llena y se deja de leer el cuerpo de la
+    solicitud. Los resultados se emiten en orden de finalización, con el índice de la fila.
+    """
+    concurrency = concurrency or settings.IMPORT_CONCURRENCY
+    pending: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    # Filas concurrentes con el mismo email (o nombre) crean un solo contacto
+    flights = SingleFlight()
+
+    async def produce():
+        try:
+            async for row in rows:
+                await pending.put(row)
+        except Exception:
+            # Error leyendo el cuerpo: terminar los workers y propagarlo al final
+            await pending.put(None)
+            raise
+        await pending.put(None)
+
+    async def process(index: int, row: dict) -> BatchItemResult:
+        try:
+            contact = ContactCreate.model_validate(row)
+        except ValidationError as e:
+            return _row_error(index, "Fila inválida", {
+                "errors": [
+                    {"field": ".".join(str(part) for part in err["loc"]), "message": err["msg"]}
+                    for err in e.errors()
+                ]
+            })
+
+        if settings.REQUEST_DEADLINE_SECONDS:
+            # Cada fila tiene su propio presupuesto; la importación completa puede tardar mucho más
+            request_deadline.set(time.monotonic() + settings.REQUEST_DEADLINE_SECONDS)
+        key = f"email:{contact.email.lower()}" if contact.email else f"name:{normalize_identifier(contact.name)}"
+        try:
+            response = await flights.do(key, lambda: contact_operations.create_contact(service, contact))
+        except CRMException as e:
+            return contact_operations.error_result(index, e)
+        return BatchItemResult(index=index, success=True, status_code=201, result=response.model_dump())
+
+    async def work():
+        while True:
+            item = await pending.get()
+            if item is None:
+                # Dejar la marca de fin para los demás workers
+                pending.put_nowait(None)
+                await results.put(None)
+                return
+            index, row = item
+            result = row if isinstance(row, BatchItemResult) else await process(index, row)
+            await results.put(result)
+
+    producer = asyncio.create_task(produce())
+    workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+    total = failed = 0
+    try:
+        finished = 0
+        while finished < concurrency:
+            result = await results.get()
+            if result is None:
+                finished += 1
+                continue
+            total += 1
+            failed += 0 if result.success else 1
+            yield result.model_dump_json(exclude_none=True) + "\n"
+
+        # Propagar errores de lectura del cuerpo (p. ej. desconexión del cliente)
+        await producer
+        yield json.dumps({"summary": {"total": total, "succeeded": total - failed, "failed": failed}}) + "\n"
+    finally:
+        producer.cancel()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(producer, *workers, return_exceptions=True)
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import CRMException
+from app.services.identifiers import normalize_identifier
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS persons (
+    id INTEGER PRIMARY KEY,
+    name_norm TEXT NOT NULL,
+    update_time TEXT,
+    generation INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_persons_name_norm ON persons (name_norm);
+CREATE INDEX IF NOT EXISTS idx_persons_update_time ON persons (update_time);
+CREATE TABLE IF NOT EXISTS person_emails (
+    email_norm TEXT NOT NULL,
+    person_id INTEGER NOT NULL REFERENCES persons (id) ON DELETE CASCADE,
+    PRIMARY KEY (email_norm, person_id)
+);
+CREATE INDEX IF NOT EXISTS idx_person_emails_person ON person_emails (person_id);
+CREATE TABLE IF NOT EXISTS mirror_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _person_emails(person: dict) -> List[str]:
+    emails = person.get("email") or []
+    if isinstance(emails, str):
+        emails = [emails]
+    values = [e.get("value") if isinstance(e, dict) else e for e in emails]
+    return [normalize_identifier(v) for v in values if v]
+
+
+class ContactMirror:
+    """
+    Réplica local de las personas de Pipedrive en SQLite.
+
+    Indexa por ID, nombre normalizado y email normalizado para resolver
+    identificadores sin ir a la red. Las consultas son síncronas (microsegundos);
+    las cargas masivas y las escrituras de la API (write_through) se ejecutan en
+    hilos aparte, porque esperan el lock mientras otra escritura lo tiene.
+    """
+
+    def __init__(self, path: str, max_staleness: float):
+        self.path = path
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._syncing_generation: Optional[int] = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        # Conexión de solo lectura: con WAL las consultas no esperan a las cargas masivas
+        self._read = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # Un solo hilo aplica las escrituras de la API y los webhooks, en el orden en que llegan
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="contact-mirror")
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._read.close()
+        self._conn.close()
+
+    # Estado de sincronización
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self._read.execute("SELECT value FROM mirror_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value):
+        self._conn.execute(
+            "INSERT INTO mirror_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+
+    @property
+    def last_synced_at(self) -> Optional[float]:
+        """Instante (epoch) de la última sincronización completa o incremental exitosa"""
+        value = self._get_state("last_synced_at")
+        return float(value) if value else None
+
+    @property
+    def last_full_sync_at(self) -> Optional[float]:
+        """Instante (epoch) de la última sincronización completa, que elimina las personas borradas"""
+        value = self._get_state("last_full_sync_at")
+        return float(value) if value else None
+
+    @property
+    def watermark(self) -> Optional[str]:
+        """Mayor update_time visto por la sincronización con GET /persons"""
+        return self._get_state("watermark")
+
+    def is_fresh(self) -> bool:
+        last_synced_at = self.last_synced_at
+        return last_synced_at is not None and time.time() - last_synced_at <= self.max_staleness
+
+    def mark_synced(self):
+        with self._lock:
+            self._set_state("last_synced_at", time.time())
+
+    # Escritura
+
+    def upsert_many(
+            self,
+            persons: Iterable[dict],
+            generation: Optional[int] = None,
+            advance_watermark: bool = False
+    ):
+        """
+        Insertar o actualizar personas con sus emails indexados. Solo las páginas de la
+        sincronización avanzan la marca de agua: una escritura de la API o un webhook más
+        reciente que un cambio hecho en la interfaz de Pipedrive no debe ocultarlo.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                watermark = self.watermark or ""
+                for person in persons:
+                    if not person.get("id"):
+                        continue
+                    update_time = person.get("update_time") or ""
+                    if advance_watermark:
+                        watermark = max(watermark, update_time)
+                    self._conn.execute(
+                        "INSERT INTO persons (id, name_norm, update_time, generation, data) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (id) DO UPDATE SET name_norm = excluded.name_norm, "
+                        "update_time = excluded.update_time, generation = excluded.generation, data = excluded.data",
+                        (
+                            person["id"],
+                            normalize_identifier(person.get("name") or ""),
+                            update_time,
+                            generation or self._syncing_generation or self._current_generation(),
+                            json.dumps(person)
+                        )
+                    )
+                    self._conn.execute("DELETE FROM person_emails WHERE person_id = ?", (person["id"],))
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO person_emails (email_norm, person_id) VALUES (?, ?)",
+                        [(email, person["id"]) for email in _person_emails(person)]
+                    )
+                if watermark:
+                    self._set_state("watermark", watermark)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, person_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM persons WHERE id = ?", (person_id,))
+
+    async def write_through(self, person_id: int, person: Optional[dict]):
+        """
+        Reflejar una escritura de la API o un webhook (person=None: la persona se eliminó)
+        sin bloquear el bucle de eventos si una sincronización tiene el lock.
+        """
+        loop = asyncio.get_running_loop()
+        if person is None:
+            await loop.run_in_executor(self._writer, self.delete, person_id)
+        else:
+            await loop.run_in_executor(self._writer, self.upsert_many, [person])
+
+    def _current_generation(self) -> int:
+        return int(self._get_state("generation") or 0)
+
+    def begin_full_sync(self) -> int:
+        """Iniciar una generación nueva; al terminar se eliminan las personas no vistas"""
+        self._syncing_generation = self._current_generation() + 1
+        return self._syncing_generation
+
+    def finish_full_sync(self, generation: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM persons WHERE generation < ?", (generation,))
+            self._set_state("generation", generation)
+            now = time.time()
+            self._set_state("last_synced_at", now)
+            self._set_state("last_full_sync_at", now)
+        self._syncing_generation = None
+
+    # Lectura
+
+    def _rows_to_persons(self, rows) -> List[dict]:
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, person_id: int) -> Optional[dict]:
+        row = self._read.execute("SELECT data FROM persons WHERE id = ?", (person_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_email(self, email: str) -> List[dict]:
+        return self._rows_to_persons(self._read.execute(
+            "SELECT p.data FROM person_emails e JOIN persons p ON p.id = e.person_id "
+            "WHERE e.email_norm = ? ORDER BY p.id",
+            (normalize_identifier(email),)
+        ))
+
+    def find_by_name(self, name: str) -> List[dict]:
+        return self._rows_to_persons(self._read.execute(
+            "SELECT data FROM persons WHERE name_norm = ? ORDER BY id",
+            (normalize_identifier(name),)
+        ))
+
+    def lookup(self, identifier: str) -> List[dict]:
+        """Coincidencias exactas por ID, email o nombre, en ese orden"""
+        if identifier.isdigit():
+            person = self.get(int(identifier))
+            if person:
+                return [person]
+        matches = {p["id"]: p for p in self.find_by_email(identifier)}
+        for person in self.find_by_name(identifier):
+            matches.setdefault(person["id"], person)
+        return list(matches.values())
+
+    def stats(self) -> dict:
+        last_synced_at = self.last_synced_at
+        return {
+            "persons": self._read.execute("SELECT COUNT(*) FROM persons").fetchone()[0],
+            "watermark": self.watermark,
+            "last_sync_age_seconds": round(time.time() - last_synced_at, 3) if last_synced_at else None,
+            "fresh": self.is_fresh()
+        }
+
+
+class ContactMirrorSync:
+    """
+    Mantiene la réplica al día: carga inicial paginada con GET /persons y luego
+    sondeo incremental ordenando por update_time descendente hasta alcanzar la marca de agua.
+    GET /persons no informa las personas eliminadas, así que cada full_sync_interval
+    segundos se repite la carga completa para quitarlas de la réplica.
+    """
+
+    def __init__(
+            self,
+            service,
+            mirror: ContactMirror,
+            page_size: int = None,
+            interval: float = None,
+            full_sync_interval: float = None
+    ):
+        self.service = service
+        self.mirror = mirror
+        self.page_size = page_size or settings.MIRROR_PAGE_SIZE
+        self.interval = interval or settings.MIRROR_POLL_INTERVAL_SECONDS
+        self.full_sync_interval = full_sync_interval or settings.MIRROR_FULL_SYNC_INTERVAL_SECONDS
+
+    async def full_sync(self):
+        generation = self.mirror.begin_full_sync()
+        start = 0
+        while start is not None:
+            persons, start = await self.service.list_persons(start=start, limit=self.page_size)
+            await asyncio.to_thread(self.mirror.upsert_many, persons, generation, advance_watermark=True)
+        await asyncio.to_thread(self.mirror.finish_full_sync, generation)
+
+    async def incremental_sync(self):
+        watermark = self.mirror.watermark or ""
+        start = 0
+        while start is not None:
+            persons, start = await self.service.list_persons(
+                start=start,
+                limit=self.page_size,
+                sort="update_time DESC"
+            )
+            changed = [p for p in persons if (p.get("update_time") or "") >= watermark]
+            await asyncio.to_thread(self.mirror.upsert_many, changed, advance_watermark=True)
+            if len(changed) < len(persons):
+                break
+        self.mirror.mark_synced()
+
+    def full_sync_due(self) -> bool:
+        last_full_sync_at = self.mirror.last_full_sync_at
+        return last_full_sync_at is None or time.time() - last_full_sync_at >= self.full_sync_interval
+
+    async def run(self):
+        """Bucle de sincronización; se ejecuta como tarea en segundo plano durante el lifespan"""
+        while True:
+            try:
+                if self.full_sync_due():
+                    await self.full_sync()
+                else:
+                    await self.incremental_sync()
+            except CRMException as e:
+                logger.warning("Fallo la sincronización de la réplica de contactos: %s", e.message)
+            await asyncio.sleep(self.interval)
+
+
+def create_contact_mirror() -> Optional[ContactMirror]:
+    """Construir la réplica configurada, o None si está desactivada"""
+    if not settings.MIRROR_ENABLED:
+        return None
+    return ContactMirror(settings.MIRROR_PATH, settings.MIRROR_MAX_STALENESS_SECONDS)
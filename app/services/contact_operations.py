@@ -0,0 +1,453 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import CONTACT_UPDATES, CRM_ERRORS
+from app.core.exceptions import (
+    CRMException,
+    CircuitOpenException,
+    ContactNotFoundException,
+    DeadlineExceededException,
+    DuplicateContactException,
+    TenantNotFoundException,
+    ValidationException
+)
+from app.schemas.contact import (
+    BatchItemResult,
+    BatchResponse,
+    ContactCreate,
+    ContactNote,
+    ContactResponse,
+    ContactUpdate,
+    ContactUpsert,
+    NoteResponse
+)
+from app.services.identifiers import normalize_identifier
+from app.services.persons import changed_fields, person_etag, primary_value
+from app.services.pipedrive_service import PipedriveService
+
+T = TypeVar("T")
+
+
+async def create_contact(service: PipedriveService, contact: ContactCreate) -> ContactResponse:
+    """Crear un contacto, retornando el existente si ya hay uno con el mismo email o nombre"""
+    # Idempotencia: Verificar si el contacto ya existe
+    existing = await service.check_duplicate_contact(
+        contact.name,
+        contact.email
+    )
+
+    # Las respuestas se construyen sin validar (model_construct): los datos vienen de la proyección tipada
+    if existing:
+        return ContactResponse.model_construct(
+            success=True,
+            message=f"El contacto '{contact.name}' ya existe. Se retorna el contacto existente.",
+            contact_id=existing.get("id"),
+            contact_url=service.get_person_url(existing.get("id")),
+            data={
+                "id": existing.get("id"),
+                "name": existing.get("name"),
+                "email": primary_value(existing.get("email")),
+                "phone": primary_value(existing.get("phone")),
+                "is_new": False
+            }
+        )
+
+    # Preparar datos del nuevo contacto
+    person_data = {
+        "name": contact.name
+    }
+
+    if contact.email:
+        person_data["email"] = [{"value": contact.email}]
+
+    if contact.phone:
+        person_data["phone"] = [{"value": contact.phone}]
+
+    # Crear nuevo contacto en Pipedrive
+    result = await service.create_person(person_data)
+
+    return ContactResponse.model_construct(
+        success=True,
+        message=f"Contacto '{contact.name}' creado exitosamente en Pipedrive",
+        contact_id=result.get("id"),
+        contact_url=service.get_person_url(result.get("id")),
+        data={
+            "id": result.get("id"),
+            "name": result.get("name"),
+            "email": primary_value(result.get("email")),
+            "phone": primary_value(result.get("phone")),
+            "is_new": True
+        }
+    )
+
+
+async def add_contact_note(service: PipedriveService, note: ContactNote, wait: bool = True) -> NoteResponse:
+    """
+    Agregar una nota al contacto identificado por nombre, email o ID.
+    Con wait=False y el pipeline de notas activo, se retorna en cuanto la nota queda
+    en cola (el contacto ya se resolvió, así que 404 y 409 se siguen reportando).
+    """
+    # Encontrar contacto
+    contact = await service.find_contact_by_identifier(note.contact_identifier)
+
+    if not contact:
+        raise ContactNotFoundException(note.contact_identifier)
+
+    contact_id = contact.get("id")
+    contact_name = contact.get("name")
+
+    if not wait and service.note_pipeline:
+        service.note_pipeline.enqueue(contact_id, note.content)
+        return NoteResponse.model_construct(
+            success=True,
+            message=f"Nota en cola para el contacto '{contact_name}'",
+            note_id=None,
+            data={
+                "contact_id": contact_id,
+                "contact_name": contact_name,
+                "content": note.content
+            }
+        )
+
+    # Agregar nota al contacto
+    result = await service.add_note(contact_id, note.content)
+
+    return NoteResponse.model_construct(
+        success=True,
+        message=f"Nota agregada exitosamente al contacto '{contact_name}'",
+        note_id=result.get("id"),
+        data={
+            "note_id": result.get("id"),
+            "contact_id": contact_id,
+            "contact_name": contact_name,
+            "content": note.content,
+            "created_at": result.get("add_time")
+        }
+    )
+
+
+def _changes(service: PipedriveService, person: dict, fields: dict) -> dict:
+    """
+    Campos que cambian respecto a la persona ya obtenida. Con actualizaciones de la
+    persona en cola, esa persona ya no es el estado final y se envían todos.
+    """
+    pending = service.update_coalescer is not None and person.get("id") in service.update_coalescer
+    if not settings.UPDATE_SKIP_UNCHANGED or pending:
+        return fields
+    return changed_fields(person, fields)
+
+
+async def upsert_contact(service: PipedriveService, upsert: ContactUpsert) -> ContactResponse:
+    """
+    Crear el contacto (o tomar el existente con el mismo email o nombre), actualizar sus
+    campos y agregarle notas en una sola operación. La persona se resuelve una vez; al
+    crearla, los campos van en el mismo POST, y la actualización y las notas se envían
+    en paralelo (las notas conservan su orden). Cada escritura reporta su propio
+    resultado: si falla una nota, las demás y la actualización se conservan.
+    """
+    fields = upsert.fields
+    if fields and service.person_fields:
+        fields = await service.person_fields.resolve(fields)
+
+    existing = await service.check_duplicate_contact(upsert.name, upsert.email)
+    if existing:
+        person = existing
+        changes = _changes(service, existing, fields)
+        updated_fields = changes
+    else:
+        person_data = {"name": upsert.name}
+        if upsert.email:
+            person_data["email"] = [{"value": upsert.email}]
+        if upsert.phone:
+            person_data["phone"] = [{"value": upsert.phone}]
+        # Los campos indicados prevalecen sobre los datos de creación
+        person_data.update(fields)
+        person = await service.create_person(person_data)
+        changes = {}
+        updated_fields = fields
+
+    contact_id = person.get("id")
+    writes = [service.add_note(contact_id, content) for content in upsert.notes]
+    if changes:
+        CONTACT_UPDATES.inc("sent")
+        writes.insert(0, service.update_person(contact_id, changes))
+    elif existing and fields:
+        CONTACT_UPDATES.inc("unchanged")
+    outcomes = await asyncio.gather(*writes, return_exceptions=True)
+    for outcome in outcomes:
+        # Solo los errores de CRM se reportan por operación; el resto (p. ej. cancelación) se propaga
+        if isinstance(outcome, BaseException) and not isinstance(outcome, CRMException):
+            raise outcome
+
+    update = None
+    if changes:
+        outcome, outcomes = outcomes[0], outcomes[1:]
+        if isinstance(outcome, CRMException):
+            update = error_result(0, outcome)
+            updated_fields = {}
+        else:
+            person = outcome
+            update = BatchItemResult(index=0, success=True, status_code=200, result={"updated_fields": changes})
+
+    notes = [
+        error_result(index, outcome) if isinstance(outcome, CRMException) else BatchItemResult(
+            index=index,
+            success=True,
+            status_code=201,
+            result={"note_id": outcome.get("id"), "content": content}
+        )
+        for index, (outcome, content) in enumerate(zip(outcomes, upsert.notes))
+    ]
+    failed = sum(1 for result in [update, *notes] if result is not None and not result.success)
+
+    if not existing:
+        message = f"Contacto '{person.get('name')}' creado exitosamente en Pipedrive"
+    elif changes and update.success:
+        message = f"Contacto '{person.get('name')}' actualizado exitosamente"
+    elif changes:
+        message = f"No se pudo actualizar el contacto '{person.get('name')}'"
+    else:
+        message = f"El contacto '{person.get('name')}' ya existe"
+    if upsert.notes:
+        message += f"; {sum(1 for note in notes if note.success)} nota(s) agregada(s)"
+    if failed:
+        message += f"; {failed} operación(es) fallaron"
+
+    return ContactResponse.model_construct(
+        success=not failed,
+        message=message,
+        contact_id=contact_id,
+        contact_url=service.get_person_url(contact_id),
+        data={
+            "id": contact_id,
+            "name": person.get("name"),
+            "email": primary_value(person.get("email")),
+            "phone": primary_value(person.get("phone")),
+            "is_new": not existing,
+            "updated_fields": updated_fields,
+            "update_time": person.get("update_time"),
+            "update": update.model_dump() if update else None,
+            "notes": [note.model_dump() for note in notes]
+        }
+    )
+
+
+async def get_contact(service: PipedriveService, identifier: str) -> Tuple[ContactResponse, str]:
+    """Consultar el contacto identificado por nombre, email o ID; retorna la respuesta y su ETag"""
+    contact = await service.find_contact_by_identifier(identifier)
+
+    if not contact:
+        raise ContactNotFoundException(identifier)
+
+    contact_id = contact.get("id")
+    response = ContactResponse.model_construct(
+        success=True,
+        message=f"Contacto '{contact.get('name')}' encontrado",
+        contact_id=contact_id,
+        contact_url=service.get_person_url(contact_id),
+        data={
+            "id": contact_id,
+            "name": contact.get("name"),
+            "email": primary_value(contact.get("email")),
+            "phone": primary_value(contact.get("phone")),
+            "update_time": contact.get("update_time")
+        }
+    )
+    return response, person_etag(contact)
+
+
+async def update_contact(service: PipedriveService, update: ContactUpdate) -> ContactResponse:
+    """
+    Actualizar los campos del contacto identificado por nombre, email o ID.
+    Los campos pueden indicarse por su nombre visible en Pipedrive; se validan antes
+    de buscar el contacto, así que un campo inválido no llega a Pipedrive (si no se
+    pueden cargar los metadatos de los campos, se envían tal cual). Si los valores
+    coinciden con los actuales del contacto no se envía ningún PUT.
+    """
+    fields = update.fields
+    if service.person_fields:
+        fields = await service.person_fields.resolve(fields)
+
+    # Encontrar contacto
+    contact = await service.find_contact_by_identifier(update.contact_identifier)
+
+    if not contact:
+        raise ContactNotFoundException(update.contact_identifier)
+
+    contact_id = contact.get("id")
+    contact_name = contact.get("name")
+
+    changes = _changes(service, contact, fields)
+    if not changes:
+        CONTACT_UPDATES.inc("unchanged")
+        result = contact
+        message = f"Contacto '{contact_name}' sin cambios"
+    else:
+        CONTACT_UPDATES.inc("sent")
+        result = await service.update_person(contact_id, changes)
+        message = f"Contacto '{contact_name}' actualizado exitosamente"
+
+    return ContactResponse.model_construct(
+        success=True,
+        message=message,
+        contact_id=contact_id,
+        contact_url=service.get_person_url(contact_id),
+        data={
+            "id": result.get("id"),
+            "name": result.get("name"),
+            "updated_fields": update.fields,
+            "update_time": result.get("update_time")
+        }
+    )
+
+
+# Operaciones por lotes
+
+def error_result(index: int, exc: CRMException, count: bool = True) -> BatchItemResult:
+    """
+    Convertir una excepción de CRM en el resultado de un elemento del lote. Con count,
+    el error se cuenta en crm_errors_total porque llega al cliente en la respuesta.
+    """
+    if count:
+        CRM_ERRORS.inc(type(exc).__name__)
+    if isinstance(exc, ContactNotFoundException):
+        status_code = 404
+    elif isinstance(exc, DuplicateContactException):
+        status_code = 409
+    elif isinstance(exc, CircuitOpenException):
+        status_code = 503
+    elif isinstance(exc, DeadlineExceededException):
+        status_code = 504
+    elif isinstance(exc, TenantNotFoundException):
+        status_code = 401
+    elif isinstance(exc, ValidationException):
+        status_code = 422
+    else:
+        status_code = 400
+    return BatchItemResult(
+        index=index,
+        success=False,
+        status_code=status_code,
+        error=exc.message,
+        details=exc.details or None
+    )
+
+
+async def _run_batch(
+        items: List[T],
+        keys: List[Optional[int]],
+        operation: Callable[[T], Awaitable],
+        success_status: int,
+        concurrency: int
+) -> BatchResponse:
+    """
+    Ejecutar una operación sobre los elementos únicos de un lote con concurrencia acotada.
+    keys[i] es el índice del elemento original del que i es duplicado (None si es único).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Optional[BatchItemResult]] = [None] * len(items)
+
+    async def run_one(index: int):
+        async with semaphore:
+            try:
+                response = await operation(items[index])
+                results[index] = BatchItemResult(
+                    index=index,
+                    success=True,
+                    status_code=success_status,
+                    result=response.model_dump()
+                )
+            except CRMException as e:
+                results[index] = error_result(index, e)
+
+    await asyncio.gather(*(run_one(i) for i, key in enumerate(keys) if key is None))
+
+    # Los duplicados dentro del lote comparten el resultado del elemento original
+    for index, original in enumerate(keys):
+        if original is not None:
+            results[index] = results[original].model_copy(update={"index": index, "duplicate_of": original})
+
+    failed = sum(1 for r in results if not r.success)
+    return BatchResponse(
+        success=failed == 0,
+        total=len(items),
+        succeeded=len(items) - failed,
+        failed=failed,
+        results=results
+    )
+
+
+def _first_occurrence(keys_per_item: List[List[str]]) -> List[Optional[int]]:
+    """Para cada elemento, el índice del primero que comparte alguna de sus claves"""
+    seen = {}
+    duplicates = []
+    for index, keys in enumerate(keys_per_item):
+        original = next((seen[k] for k in keys if k in seen), None)
+        duplicates.append(original)
+        if original is None:
+            for key in keys:
+                seen[key] = index
+    return duplicates
+
+
+async def create_contacts_batch(
+        service: PipedriveService,
+        contacts: List[ContactCreate],
+        concurrency: int = None
+) -> BatchResponse:
+    """Crear varios contactos; los repetidos por email o nombre dentro del lote se crean una sola vez"""
+    keys = _first_occurrence([
+        [f"name:{normalize_identifier(c.name)}"] + ([f"email:{c.email.lower()}"] if c.email else [])
+        for c in contacts
+    ])
+    return await _run_batch(
+        contacts,
+        keys,
+        lambda contact: create_contact(service, contact),
+        201,
+        concurrency or settings.BATCH_CONCURRENCY
+    )
+
+
+async def add_contact_notes_batch(
+        service: PipedriveService,
+        notes: List[ContactNote],
+        concurrency: int = None
+) -> BatchResponse:
+    """Agregar varias notas; una nota idéntica para el mismo contacto se agrega una sola vez"""
+    keys = _first_occurrence([
+        [f"{normalize_identifier(n.contact_identifier)}\x00{n.content}"]
+        for n in notes
+    ])
+    return await _run_batch(
+        notes,
+        keys,
+        lambda note: add_contact_note(service, note),
+        201,
+        concurrency or settings.BATCH_CONCURRENCY
+    )
+
+
+async def update_contacts_batch(
+        service: PipedriveService,
+        updates: List[ContactUpdate],
+        concurrency: int = None
+) -> BatchResponse:
+    """
+    Actualizar varios contactos. Las actualizaciones del mismo identificador se
+    combinan en una sola (el último valor de cada campo prevalece).
+    """
+    keys = _first_occurrence([[normalize_identifier(u.contact_identifier)] for u in updates])
+    merged = [u.model_copy(update={"fields": dict(u.fields)}) for u in updates]
+    for index, original in enumerate(keys):
+        if original is not None:
+            merged[original].fields.update(updates[index].fields)
+
+    return await _run_batch(
+        merged,
+        keys,
+        lambda update: update_contact(service, update),
+        200,
+        concurrency or settings.BATCH_CONCURRENCY
+    )
@@ -0,0 +1,35 @@
+import httpx
+from app.core.config import settings
+
+
+def _http2_available() -> bool:
+    """Verifica si el paquete opcional 'h2' está instalado"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client(**overrides) -> httpx.AsyncClient:
+    """
+    Crea el cliente HTTP compartido por todo el proceso.
+
+    Mantiene conexiones keep-alive hacia Pipedrive para evitar un handshake
+    TCP+TLS por cada llamada. HTTP/2 solo se activa si 'h2' está disponible.
+    """
+    options = {
+        "timeout": settings.REQUEST_TIMEOUT,
+        "http2": settings.HTTP2_ENABLED and _http2_available(),
+        "limits": httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        ),
+        "headers": {
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+    }
+    options.update(overrides)
+    return httpx.AsyncClient(**options)
@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import IdempotencyKeyInProgressException, IdempotencyKeyMismatchException
+
+# status_code de un registro reservado cuya respuesta aún no existe
+PENDING_STATUS = 0
+
+_COLUMNS = "(key, fingerprint, status_code, body, expires_at, headers) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+@dataclass
+class IdempotencyRecord:
+    """Respuesta almacenada para una Idempotency-Key, o reserva de una solicitud en curso"""
+    fingerprint: str
+    status_code: int
+    body: dict
+    expires_at: float
+    # Encabezados de la respuesta que se repiten (p. ej. Location de un 202)
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def pending(self) -> bool:
+        return self.status_code == PENDING_STATUS
+
+
+def request_fingerprint(method: str, path: str, payload: dict) -> str:
+    """Huella del método, la ruta y el cuerpo canónico de la solicitud"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{method} {path}\n{canonical}".encode()).hexdigest()
+
+
+class IdempotencyStore(ABC):
+    """Interfaz de almacenamiento de respuestas idempotentes"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[IdempotencyRecord]:
+        """Registro vigente de la clave (respuesta o reserva), o None"""
+
+    @abstractmethod
+    async def claim(self, key: str, record: IdempotencyRecord) -> Optional[IdempotencyRecord]:
+        """
+        Guardar la reserva 'record' si la clave no tiene un registro vigente, de forma
+        atómica. Retorna None si la reserva quedó guardada o el registro existente si no.
+        """
+
+    @abstractmethod
+    async def save(self, key: str, record: IdempotencyRecord):
+        """Guardar la respuesta de la clave, reemplazando su reserva"""
+
+    @abstractmethod
+    async def release(self, key: str, record: IdempotencyRecord):
+        """Eliminar la reserva 'record' (si sigue siendo la vigente) para que la clave pueda reintentarse"""
+
+    def close(self):
+        """Liberar recursos del backend"""
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """Almacenamiento en memoria del proceso"""
+
+    def __init__(self):
+        self._records = {}
+
+    def _purge_expired(self, now: float):
+        for key in [k for k, r in self._records.items() if r.expires_at <= now]:
+            del self._records[key]
+
+    def _live(self, key: str) -> Optional[IdempotencyRecord]:
+        record = self._records.get(key)
+        if record and record.expires_at <= time.time():
+            del self._records[key]
+            return None
+        return record
+
+    async def get(self, key: str) -> Optional[IdempotencyRecord]:
+        return self._live(key)
+
+    async def claim(self, key: str, record: IdempotencyRecord) -> Optional[IdempotencyRecord]:
+        # Sin await entre la consulta y la escritura: atómico dentro del bucle de eventos
+        existing = self._live(key)
+        if existing:
+            return existing
+        self._purge_expired(time.time())
+        self._records[key] = record
+        return None
+
+    async def save(self, key: str, record: IdempotencyRecord):
+        self._records[key] = record
+
+    async def release(self, key: str, record: IdempotencyRecord):
+        if self._records.get(key) is record:
+            del self._records[key]
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    """
+    Almacenamiento persistente en SQLite; sobrevive reinicios y se comparte entre workers.
+    La reserva de una clave es una fila con status_code 0 insertada en una transacción
+    'BEGIN IMMEDIATE', así que solo un worker ejecuta cada solicitud.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+            "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, status_code INTEGER NOT NULL, "
+            "body TEXT NOT NULL, expires_at REAL NOT NULL, headers TEXT NOT NULL DEFAULT '{}')"
+        )
+        self._migrate()
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys (expires_at)"
+        )
+
+    def _migrate(self):
+        """Agregar columnas nuevas a bases de datos creadas por versiones anteriores"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(idempotency_keys)")}
+        if "headers" not in columns:
+            self._conn.execute("ALTER TABLE idempotency_keys ADD COLUMN headers TEXT NOT NULL DEFAULT '{}'")
+
+    def _select(self, key: str) -> Optional[IdempotencyRecord]:
+        row = self._conn.execute(
+            "SELECT fingerprint, status_code, body, expires_at, headers FROM idempotency_keys "
+            "WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        if not row:
+            return None
+        return IdempotencyRecord(row[0], row[1], json.loads(row[2]), row[3], json.loads(row[4]))
+
+    @staticmethod
+    def _row(key: str, record: IdempotencyRecord) -> tuple:
+        return (
+            key, record.fingerprint, record.status_code, json.dumps(record.body),
+            record.expires_at, json.dumps(record.headers)
+        )
+
+    def _get(self, key: str) -> Optional[IdempotencyRecord]:
+        with self._lock:
+            return self._select(key)
+
+    def _claim(self, key: str, record: IdempotencyRecord) -> Optional[IdempotencyRecord]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (time.time(),))
+                existing = self._select(key)
+                if existing is None:
+                    self._conn.execute(f"INSERT INTO idempotency_keys {_COLUMNS}", self._row(key, record))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return existing
+
+    def _save(self, key: str, record: IdempotencyRecord):
+        with self._lock:
+            self._conn.execute(f"INSERT OR REPLACE INTO idempotency_keys {_COLUMNS}", self._row(key, record))
+
+    def _release(self, key: str, record: IdempotencyRecord):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM idempotency_keys WHERE key = ? AND status_code = ? AND body = ?",
+                (key, PENDING_STATUS, json.dumps(record.body))
+            )
+
+    async def get(self, key: str) -> Optional[IdempotencyRecord]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def claim(self, key: str, record: IdempotencyRecord) -> Optional[IdempotencyRecord]:
+        return await asyncio.to_thread(self._claim, key, record)
+
+    async def save(self, key: str, record: IdempotencyRecord):
+        await asyncio.to_thread(self._save, key, record)
+
+    async def release(self, key: str, record: IdempotencyRecord):
+        await asyncio.to_thread(self._release, key, record)
+
+    def close(self):
+        self._conn.close()
+
+
+class IdempotencyManager:
+    """
+    Ejecuta una operación una sola vez por Idempotency-Key.
+
+    La clave se reserva en el almacenamiento antes de ejecutar la operación; una
+    solicitud con la misma clave (en este u otro worker) espera hasta wait_seconds a
+    que termine la primera y recibe su respuesta sin llamar a Pipedrive, o 409 si sigue
+    en curso. Solo se almacenan respuestas exitosas (2xx), de modo que un error puede
+    reintentarse con la misma clave. Una reserva abandonada (p. ej. el worker se cayó)
+    vence a los lock_seconds.
+    """
+
+    def __init__(
+            self,
+            store: IdempotencyStore,
+            ttl: float,
+            lock_seconds: float = None,
+            wait_seconds: float = None
+    ):
+        self.store = store
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds or settings.IDEMPOTENCY_LOCK_SECONDS
+        self.wait_seconds = settings.IDEMPOTENCY_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self.replays = 0
+
+    async def _claim(self, key: str, fingerprint: str, idempotency_key: str) -> Tuple[IdempotencyRecord, bool]:
+        """Reservar la clave. Retorna la reserva propia (False) o la respuesta almacenada (True)"""
+        reservation = IdempotencyRecord(
+            fingerprint, PENDING_STATUS, {"owner": uuid.uuid4().hex}, time.time() + self.lock_seconds
+        )
+        give_up_at = time.monotonic() + self.wait_seconds
+        delay = 0.01
+        while True:
+            existing = await self.store.claim(key, reservation)
+            if existing is None:
+                return reservation, False
+            if existing.fingerprint != fingerprint:
+                raise IdempotencyKeyMismatchException(idempotency_key)
+            if not existing.pending:
+                return existing, True
+
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                raise IdempotencyKeyInProgressException(idempotency_key)
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.25)
+
+    async def run(
+            self,
+            key: str,
+            fingerprint: str,
+            handler: Callable[[], Awaitable[Tuple[int, dict, Dict[str, str]]]],
+            scope: str = ""
+    ) -> Tuple[int, dict, Dict[str, str], bool]:
+        """
+        Retorna (status_code, body, headers, replayed). El handler retorna
+        (status_code, body, headers); los encabezados se almacenan con la respuesta.
+        El scope (p. ej. la ruta) evita que la misma clave choque entre endpoints.
+        """
+        idempotency_key, key = key, f"{scope}:{key}"
+        record, replayed = await self._claim(key, fingerprint, idempotency_key)
+        if replayed:
+            self.replays += 1
+            return record.status_code, record.body, record.headers, True
+
+        try:
+            status_code, body, headers = await handler()
+        except BaseException:
+            # La clave queda libre para reintentar; shield: liberar aunque se cancele la solicitud
+            await asyncio.shield(self.store.release(key, record))
+            raise
+
+        if 200 <= status_code < 300:
+            await self.store.save(
+                key, IdempotencyRecord(fingerprint, status_code, body, time.time() + self.ttl, headers)
+            )
+        else:
+            await self.store.release(key, record)
+        return status_code, body, headers, False
+
+
+def create_idempotency_manager() -> Optional[IdempotencyManager]:
+    """Construir el gestor de idempotencia configurado, o None si está desactivado"""
+    if not settings.IDEMPOTENCY_ENABLED:
+        return None
+    if settings.IDEMPOTENCY_BACKEND == "sqlite":
+        store = SQLiteIdempotencyStore(settings.IDEMPOTENCY_DB_PATH)
+    else:
+        store = InMemoryIdempotencyStore()
+    return IdempotencyManager(store, settings.IDEMPOTENCY_TTL_SECONDS)
@@ -0,0 +1,18 @@
+IDENTIFIER_ID = "id"
+IDENTIFIER_EMAIL = "email"
+IDENTIFIER_NAME = "name"
+
+
+def normalize_identifier(identifier: str) -> str:
+    """Normalizar un nombre, email o ID para usarlo como clave de búsqueda"""
+    return " ".join(identifier.split()).lower()
+
+
+def classify_identifier(identifier: str) -> str:
+    """Tipo de identificador: numérico es un ID, con '@' es un email y cualquier otro es un nombre"""
+    identifier = identifier.strip()
+    if identifier.isdigit():
+        return IDENTIFIER_ID
+    if "@" in identifier:
+        return IDENTIFIER_EMAIL
+    return IDENTIFIER_NAME
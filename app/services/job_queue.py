@@ -0,0 +1,299 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+from app.core.exceptions import (
+    CRMException,
+    CircuitOpenException,
+    ContactNotFoundException,
+    DuplicateContactException,
+    TenantNotFoundException,
+    ValidationException
+)
+from app.schemas.contact import ContactCreate, ContactNote, ContactUpdate, ContactUpsert
+from app.services import contact_operations
+from app.services.pipedrive_service import PipedriveService
+from app.services.tenants import TenantRegistry
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Tipo de trabajo -> (schema de entrada, operación)
+JOB_HANDLERS = {
+    "create_contact": (ContactCreate, contact_operations.create_contact),
+    "add_contact_note": (ContactNote, contact_operations.add_contact_note),
+    "update_contact": (ContactUpdate, contact_operations.update_contact),
+    "upsert_contact": (ContactUpsert, contact_operations.upsert_contact),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    tenant_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs (status, available_at);
+"""
+
+
+class JobStore:
+    """Almacenamiento durable de trabajos en SQLite"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Agregar columnas nuevas a bases de datos creadas por versiones anteriores"""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "tenant_id" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN tenant_id TEXT")
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["error"] = json.loads(job["error"]) if job["error"] else None
+        return job
+
+    def enqueue(self, kind: str, payload: dict, tenant_id: Optional[str] = None) -> dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at, updated_at, available_at, tenant_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), JOB_PENDING, now, now, now, tenant_id)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def claim(self, lease_seconds: float) -> Optional[dict]:
+        """
+        Tomar el siguiente trabajo disponible. También se reclaman los trabajos
+        'running' cuyo lease venció (el worker que los tenía se cayó).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE (status = ? AND available_at <= ?) "
+                    "OR (status = ? AND lease_until < ?) ORDER BY created_at LIMIT 1",
+                    (JOB_PENDING, now, JOB_RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (JOB_RUNNING, now + lease_seconds, now, row["id"])
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = self._to_dict(row)
+        job["status"] = JOB_RUNNING
+        job["attempts"] += 1
+        return job
+
+    def complete(self, job_id: str, result: dict):
+        self._finish(job_id, JOB_SUCCEEDED, result=json.dumps(result))
+
+    def fail(self, job_id: str, error: dict):
+        self._finish(job_id, JOB_FAILED, error=json.dumps(error))
+
+    def retry_later(self, job_id: str, error: dict, delay: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (JOB_PENDING, json.dumps(error), now + delay, now, job_id)
+            )
+
+    def _finish(self, job_id: str, status: str, result: str = None, error: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (status, result, error, time.time(), job_id)
+            )
+
+    def extend_lease(self, job_id: str, lease_seconds: float):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?",
+                (time.time() + lease_seconds, job_id, JOB_RUNNING)
+            )
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class JobQueue:
+    """
+    Cola de escrituras hacia Pipedrive con entrega 'at-least-once'.
+
+    Un trabajo solo se marca como terminado después de ejecutarse; si el proceso
+    se cae a mitad de camino, se vuelve a ejecutar al reiniciar.
+    """
+
+    def __init__(
+            self,
+            store: JobStore,
+            service: PipedriveService,
+            tenants: Optional[TenantRegistry] = None,
+            concurrency: int = None,
+            max_attempts: int = None,
+            lease_seconds: float = None,
+            poll_interval: float = None
+    ):
+        self.store = store
+        self.service = service
+        self.tenants = tenants
+        self.concurrency = concurrency or settings.JOBS_WORKER_CONCURRENCY
+        self.max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        self.lease_seconds = lease_seconds or settings.JOBS_LEASE_SECONDS
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL_SECONDS
+        self._wakeup = asyncio.Event()
+        self._workers = []
+
+    async def enqueue(self, kind: str, payload: dict, tenant_id: Optional[str] = None) -> dict:
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        job = await asyncio.to_thread(self.store.enqueue, kind, payload, tenant_id)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def start(self):
+        """
+        Lanzar los workers. Los trabajos que quedaron 'running' tras una caída se
+        retoman cuando vence su lease, sin interferir con otros procesos activos.
+        """
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self):
+        while True:
+            job = await asyncio.to_thread(self.store.claim, self.lease_seconds)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _heartbeat(self, job_id: str):
+        """Renovar el lease mientras el trabajo sigue en curso"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await asyncio.to_thread(self.store.extend_lease, job_id, self.lease_seconds)
+
+    async def _process(self, job: dict):
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            await self._execute(job)
+        finally:
+            heartbeat.cancel()
+
+    @asynccontextmanager
+    async def _service_for(self, job: dict) -> AsyncIterator[PipedriveService]:
+        """Servicio de la cuenta que encoló el trabajo"""
+        tenant_id = job["tenant_id"]
+        if tenant_id is None:
+            yield self.service
+            return
+        tenant = self.tenants.store.get(tenant_id) if self.tenants else None
+        if tenant is None:
+            raise TenantNotFoundException(tenant_id)
+        async with self.tenants.lease(tenant) as service:
+            yield service
+
+    async def _execute(self, job: dict):
+        schema, operation = JOB_HANDLERS[job["kind"]]
+        try:
+            async with self._service_for(job) as service:
+                response = await operation(service, schema.model_validate(job["payload"]))
+        except (
+                ContactNotFoundException, DuplicateContactException, TenantNotFoundException, ValidationException
+        ) as e:
+            # Errores definitivos: reintentar no cambiaría el resultado
+            await asyncio.to_thread(self.store.fail, job["id"], self._error(e, final=True))
+        except CRMException as e:
+            if job["attempts"] >= self.max_attempts:
+                await asyncio.to_thread(self.store.fail, job["id"], self._error(e, final=True))
+            else:
+                delay = self.service.retry_policy.backoff(job["attempts"])
+                if isinstance(e, CircuitOpenException):
+                    # No reintentar antes de que el circuito pueda volver a probar
+                    delay = max(delay, e.retry_after)
+                await asyncio.to_thread(self.store.retry_later, job["id"], self._error(e), delay)
+        except Exception as e:
+            logger.exception("Error inesperado procesando el trabajo %s", job["id"])
+            await asyncio.to_thread(self.store.fail, job["id"], {"error": str(e), "status_code": 500})
+        else:
+            await asyncio.to_thread(self.store.complete, job["id"], response.model_dump())
+
+    @staticmethod
+    def _error(exc: CRMException, final: bool = False) -> dict:
+        # Solo el fallo definitivo llega al cliente (estado del trabajo); los reintentos no se cuentan
+        result = contact_operations.error_result(0, exc, count=final)
+        return {"error": result.error, "status_code": result.status_code, "details": result.details}
+
+    def stats(self) -> dict:
+        return {"workers": len(self._workers), "jobs": self.store.counts()}
+
+
+def create_job_queue(service: PipedriveService, tenants: Optional[TenantRegistry] = None) -> Optional[JobQueue]:
+    """Construir la cola de trabajos configurada, o None si está desactivada"""
+    if not settings.JOBS_ENABLED:
+        return None
+    return JobQueue(JobStore(settings.JOBS_DB_PATH), service, tenants)
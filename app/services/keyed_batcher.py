@@ -0,0 +1,177 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Hashable, List, Optional
+
+from app.core.context import RequestTrace, request_deadline, request_trace
+from app.core.exceptions import CRMException, DeadlineExceededException
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedBatcher:
+    """
+    Base de las escrituras combinadas por clave (notas y actualizaciones de personas).
+
+    Cada clave tiene una cola; una tarea por clave la vacía en lotes de hasta max_batch
+    elementos (None: sin límite), esperando 'window' segundos a que se acumulen más, y
+    las claves distintas se escriben en paralelo, hasta 'concurrency' a la vez (None:
+    sin límite). Cada lote se escribe con el plazo más amplio de las solicitudes que lo
+    esperan y sus llamadas se suman a la traza de cada una (Server-Timing). Los
+    elementos cuyo plazo vence en la cola no se escriben.
+
+    Las subclases implementan _write_batch(key, items) y stats().
+    """
+
+    def __init__(self, window: float, max_batch: Optional[int] = None, concurrency: Optional[int] = None):
+        self.window = window
+        self.max_batch = max_batch
+        self._semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        self._queues: Dict[Hashable, deque] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.writes = 0
+        self.merged = 0
+        self.failed = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Hay elementos de la clave en cola o escribiéndose"""
+        return key in self._tasks
+
+    def enqueue(
+            self,
+            key: Hashable,
+            item: Any,
+            deadline: Optional[float] = None,
+            trace: Optional[RequestTrace] = None
+    ) -> asyncio.Future:
+        """
+        Encolar un elemento; el futuro se resuelve con el resultado de la escritura de su lote.
+        Si se indica un plazo (time.monotonic) y vence en la cola, el elemento no se escribe.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append((item, future, deadline, trace))
+        if key not in self._tasks:
+            # Contexto vacío: la escritura no hereda el plazo ni la traza de la solicitud que la inició;
+            # cada lote fija los suyos a partir de las solicitudes que lo esperan
+            self._tasks[key] = contextvars.Context().run(asyncio.create_task, self._drain(key))
+        return future
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """
+        Encolar un elemento y esperar su resultado.
+
+        Si el llamador se cancela (p. ej. el cliente se desconectó) mientras el elemento
+        sigue en cola, se retira sin escribirlo. Si su lote ya se está escribiendo, la
+        escritura termina igual: es deliberado, porque Pipedrive pudo haberla aceptado ya
+        y cortarla dejaría el resultado en duda para el resto del lote.
+        """
+        future = self.enqueue(key, item, request_deadline.get(), request_trace.get())
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self._withdraw(key, future)
+            raise
+
+    def _withdraw(self, key: Hashable, future: asyncio.Future):
+        """Retirar de la cola el elemento del futuro, si aún no se tomó para escribirlo"""
+        queue = self._queues.get(key)
+        for entry in queue or ():
+            if entry[1] is future:
+                queue.remove(entry)
+                future.cancel()
+                return
+
+    async def _drain(self, key: Hashable):
+        queue = self._queues[key]
+        try:
+            while queue:
+                if self.window and (self.max_batch is None or len(queue) < self.max_batch):
+                    await asyncio.sleep(self.window)
+                    if not queue:
+                        # Se retiraron todos los elementos mientras se esperaba
+                        break
+                size = len(queue) if self.max_batch is None else min(len(queue), self.max_batch)
+                await self._run_batch(key, [queue.popleft() for _ in range(size)])
+        finally:
+            # Solo quedan elementos en cola si la tarea se canceló (p. ej. al apagar)
+            if queue:
+                self._fail(list(queue), self._cancelled())
+            del self._queues[key]
+            del self._tasks[key]
+
+    async def _run_batch(self, key: Hashable, batch: list):
+        now = time.monotonic()
+        expired = [entry for entry in batch if entry[2] is not None and entry[2] <= now]
+        if expired:
+            self._fail(expired, DeadlineExceededException())
+            batch = [entry for entry in batch if entry not in expired]
+            if not batch:
+                return
+
+        # La escritura respeta el plazo más amplio de las solicitudes que la esperan
+        deadlines = [deadline for _, _, deadline, _ in batch]
+        request_deadline.set(None if None in deadlines else max(deadlines))
+        trace = RequestTrace()
+        request_trace.set(trace)
+        # Si la escritura se cancela, los llamadores reciben este error en vez de esperar para siempre
+        error: Optional[Exception] = self._cancelled()
+        try:
+            result = await self._limited_write(key, [item for item, _, _, _ in batch])
+            error = None
+        except Exception as e:
+            error = e
+            logger.warning("%s: no se pudo escribir el lote de %s (%d elementos): %s",
+                           type(self).__name__, key, len(batch), e)
+        finally:
+            self._attribute(batch, trace)
+            if error is not None:
+                self._fail(batch, error)
+        if error is not None:
+            return
+
+        self.writes += 1
+        self.merged += len(batch) - 1
+        for _, future, _, _ in batch:
+            if not future.done():
+                future.set_result(result)
+
+    async def _limited_write(self, key: Hashable, items: List[Any]) -> Any:
+        if self._semaphore is None:
+            return await self._write_batch(key, items)
+        async with self._semaphore:
+            return await self._write_batch(key, items)
+
+    async def _write_batch(self, key: Hashable, items: List[Any]) -> Any:
+        """Escribir los elementos de un lote, en orden de llegada"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _attribute(batch: list, trace: RequestTrace):
+        """Atribuir las llamadas de la escritura a cada solicitud que la espera"""
+        waiters = {id(waiter): waiter for _, _, _, waiter in batch if waiter is not None}
+        for waiter in waiters.values():
+            waiter.add(trace)
+
+    @staticmethod
+    def _cancelled() -> CRMException:
+        return CRMException("La escritura se canceló antes de completarse")
+
+    def _fail(self, batch: list, error: Exception):
+        self.failed += len(batch)
+        for _, future, _, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+                # Los elementos encolados sin esperar no tienen quién lea el error
+                future.exception()
+
+    def pending_keys(self) -> int:
+        return len(self._queues)
+
+    def pending_items(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def aclose(self):
+        """Esperar a que se escriban los elementos pendientes"""
+        await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
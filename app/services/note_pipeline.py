@@ -0,0 +1,52 @@
+from typing import Awaitable, Callable, List, Optional
+
+from app.core.config import settings
+from app.services.keyed_batcher import KeyedBatcher
+
+NoteWriter = Callable[[int, str], Awaitable[dict]]
+
+
+class NotePipeline(KeyedBatcher):
+    """
+    Escritura de notas con una cola por contacto.
+
+    Las notas de un mismo contacto se escriben en el orden en que se encolan; las de
+    contactos distintos se escriben en paralelo, hasta 'concurrency' a la vez. Con
+    max_merge > 1, las notas acumuladas para un contacto mientras se escribía la
+    anterior (o durante merge_window segundos) se unen en un solo POST /notes.
+    """
+
+    def __init__(
+            self,
+            write: NoteWriter,
+            concurrency: int = None,
+            max_merge: int = None,
+            merge_window: float = None,
+            separator: str = "\n\n"
+    ):
+        super().__init__(
+            settings.NOTES_MERGE_WINDOW_SECONDS if merge_window is None else merge_window,
+            max_batch=max_merge or settings.NOTES_MERGE_MAX,
+            concurrency=concurrency or settings.NOTES_CONCURRENCY
+        )
+        self._write = write
+        self.separator = separator
+
+    async def _write_batch(self, person_id: int, contents: List[str]) -> dict:
+        return await self._write(person_id, self.separator.join(contents))
+
+    def stats(self) -> dict:
+        return {
+            "contacts_pending": self.pending_keys(),
+            "notes_pending": self.pending_items(),
+            "written": self.writes,
+            "merged": self.merged,
+            "failed": self.failed
+        }
+
+
+def create_note_pipeline(write: NoteWriter) -> Optional[NotePipeline]:
+    """Construir el pipeline de notas configurado, o None si está desactivado"""
+    if not settings.NOTES_PIPELINE_ENABLED:
+        return None
+    return NotePipeline(write)
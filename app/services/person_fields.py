@@ -0,0 +1,204 @@
+import logging
+import time
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import CircuitOpenException, CRMException, DeadlineExceededException, ValidationException
+from app.services.identifiers import normalize_identifier
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+FieldLoader = Callable[[], Awaitable[List[dict]]]
+
+# Tipos de campo de Pipedrive cuyo valor es el ID de otra entidad
+_REFERENCE_TYPES = ("user", "org", "people")
+_TEXT_TYPES = ("varchar", "varchar_auto", "varchar_options", "text", "phone", "address", "time", "timerange")
+
+# Campos estándar que la API de personas acepta por su clave: no requieren los metadatos
+BUILTIN_FIELDS = frozenset(
+    ("name", "first_name", "last_name", "email", "phone", "org_id", "owner_id", "visible_to")
+)
+
+
+def _option_id(field: dict, value: Any) -> int:
+    """ID de una opción de un campo enum/set, dado su ID o su nombre"""
+    options = field.get("options") or []
+    for option in options:
+        if value == option.get("id") or str(value).strip() == str(option.get("id")):
+            return option["id"]
+    normalized = normalize_identifier(str(value))
+    for option in options:
+        if normalize_identifier(str(option.get("label", ""))) == normalized:
+            return option["id"]
+    labels = ", ".join(str(o.get("label")) for o in options)
+    raise ValidationException(field["name"], f"opción desconocida '{value}' (opciones: {labels})")
+
+
+def _as_int(field: dict, value: Any) -> int:
+    if isinstance(value, bool):
+        raise ValidationException(field["name"], "se esperaba un número entero")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValidationException(field["name"], "se esperaba un número entero")
+    if not number.is_integer():
+        raise ValidationException(field["name"], "se esperaba un número entero")
+    return int(number)
+
+
+def _as_number(field: dict, value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValidationException(field["name"], "se esperaba un número")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValidationException(field["name"], "se esperaba un número")
+
+
+def convert_value(field: dict, value: Any) -> Any:
+    """
+    Validar y convertir el valor de un campo según su tipo. Las opciones de los campos
+    enum y set se aceptan por nombre; el resto de validaciones solo aplica a los campos
+    personalizados (los estándar, como email o phone, admiten más formatos).
+    """
+    if value is None:
+        return None
+    field_type = field.get("field_type")
+    if field_type == "enum":
+        return _option_id(field, value)
+    if field_type == "set":
+        values = value.split(",") if isinstance(value, str) else value
+        if not isinstance(values, list):
+            values = [values]
+        return [_option_id(field, v) for v in values if str(v).strip()]
+    if not field.get("edit_flag"):
+        return value
+
+    if field_type == "int":
+        return _as_int(field, value)
+    if field_type in ("double", "monetary"):
+        return value if isinstance(value, dict) else _as_number(field, value)
+    if field_type in _REFERENCE_TYPES:
+        return _as_int(field, value)
+    if field_type == "date":
+        try:
+            return date.fromisoformat(str(value)).isoformat()
+        except ValueError:
+            raise ValidationException(field["name"], "se esperaba una fecha AAAA-MM-DD")
+    if field_type in _TEXT_TYPES and not isinstance(value, (str, int, float)):
+        raise ValidationException(field["name"], "se esperaba un texto")
+    return value
+
+
+class PersonFieldRegistry:
+    """
+    Metadatos de GET /personFields para aceptar los campos de una actualización por
+    su nombre visible ("Industria") además de su clave (hash de 40 caracteres en los
+    campos personalizados), y validar los valores antes de enviarlos a Pipedrive.
+
+    Se cargan al primer uso y se recargan al vencer el TTL, o antes si llega un campo
+    desconocido (p. ej. recién creado), como mucho una vez cada refresh_interval. Si
+    nunca se pudieron cargar, los campos se envían sin traducir y la carga se reintenta
+    como mucho una vez cada refresh_interval.
+    """
+
+    def __init__(self, load: FieldLoader, ttl: float = None, refresh_interval: float = None):
+        self._load = load
+        self.ttl = ttl or settings.PERSON_FIELDS_TTL_SECONDS
+        self.refresh_interval = (
+            settings.PERSON_FIELDS_REFRESH_SECONDS if refresh_interval is None else refresh_interval
+        )
+        self._by_key: Dict[str, dict] = {}
+        self._by_name: Dict[str, Optional[dict]] = {}
+        self._loaded_at: Optional[float] = None
+        self._failed_at: Optional[float] = None
+        self._flights = SingleFlight()
+        self.loads = 0
+        self.unresolved = 0
+
+    async def _ensure_loaded(self, force: bool = False):
+        if self._loaded_at is not None:
+            age = time.monotonic() - self._loaded_at
+            if age < self.ttl and not (force and age >= self.refresh_interval):
+                return
+        elif self._failed_at is not None and time.monotonic() - self._failed_at < self.refresh_interval:
+            raise CRMException("Los campos de personas de Pipedrive no están disponibles")
+        await self._flights.do("person_fields", self._reload)
+
+    async def _reload(self):
+        try:
+            fields = await self._load()
+        except (CircuitOpenException, DeadlineExceededException):
+            raise
+        except CRMException:
+            if self._loaded_at is None:
+                self._failed_at = time.monotonic()
+                raise
+            # Con metadatos previos se sigue trabajando con ellos hasta el próximo intento
+            logger.warning("No se pudieron recargar los campos de personas; se usan los anteriores")
+            self._loaded_at = time.monotonic() - self.ttl + self.refresh_interval
+            return
+
+        by_key, by_name = {}, {}
+        for field in fields:
+            by_key[field["key"]] = field
+            name = normalize_identifier(str(field.get("name", "")))
+            # Un nombre repetido en varios campos no identifica a ninguno
+            by_name[name] = None if name in by_name else field
+        self._by_key, self._by_name = by_key, by_name
+        self._loaded_at = time.monotonic()
+        self._failed_at = None
+        self.loads += 1
+
+    def _lookup(self, name: str) -> Optional[dict]:
+        return self._by_key.get(name) or self._by_name.get(normalize_identifier(name))
+
+    async def resolve(self, fields: dict) -> dict:
+        """
+        Traducir los nombres de campo a sus claves y las opciones a sus IDs.
+        Lanza ValidationException si un campo no existe o su valor no es válido. Los
+        campos estándar pasan sin cambios; si los metadatos no se pueden cargar, todos.
+        """
+        if all(name in BUILTIN_FIELDS for name in fields):
+            return dict(fields)
+        try:
+            await self._ensure_loaded()
+        except (CircuitOpenException, DeadlineExceededException):
+            raise
+        except CRMException as e:
+            self.unresolved += 1
+            logger.warning("Campos de personas no disponibles; se envían sin traducir: %s", e)
+            return dict(fields)
+        if any(name not in BUILTIN_FIELDS and self._lookup(name) is None for name in fields):
+            await self._ensure_loaded(force=True)
+
+        resolved = {}
+        for name, value in fields.items():
+            if name in BUILTIN_FIELDS:
+                resolved[name] = value
+                continue
+            field = self._lookup(name)
+            if field is None:
+                normalized = normalize_identifier(name)
+                if normalized in self._by_name:
+                    raise ValidationException(name, "hay varios campos con ese nombre; use su clave")
+                raise ValidationException(name, "el campo no existe en Pipedrive")
+            resolved[field["key"]] = convert_value(field, value)
+        return resolved
+
+    def stats(self) -> dict:
+        return {
+            "fields": len(self._by_key),
+            "loads": self.loads,
+            "unresolved": self.unresolved,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None
+        }
+
+
+def create_person_field_registry(load: FieldLoader) -> Optional[PersonFieldRegistry]:
+    """Construir el registro de campos de personas, o None si está desactivado"""
+    if not settings.PERSON_FIELDS_ENABLED:
+        return None
+    return PersonFieldRegistry(load)
@@ -0,0 +1,168 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, TypedDict
+
+# Clave de un campo personalizado de Pipedrive: hash de 40 caracteres hexadecimales
+_CUSTOM_FIELD_KEY = re.compile(r"^[0-9a-f]{40}$")
+
+
+class ContactValue(TypedDict):
+    """Email o teléfono de una persona en el formato de Pipedrive"""
+    value: str
+    primary: bool
+
+
+class Person(TypedDict, total=False):
+    """
+    Proyección de una persona de Pipedrive con solo los campos que usa la API.
+    Las personas de Pipedrive traen decenas de campos (organización, conteos,
+    campos personalizados...); la caché y la réplica guardan solo esta proyección.
+    custom_fields guarda los campos personalizados (por su clave) para detectar las
+    actualizaciones sin cambios; falta si la persona viene de una búsqueda.
+    """
+    id: int
+    name: Optional[str]
+    email: List[ContactValue]
+    phone: List[ContactValue]
+    update_time: Optional[str]
+    custom_fields: Dict[str, Any]
+
+
+def _contact_values(values) -> List[ContactValue]:
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    result = []
+    for item in values:
+        if isinstance(item, dict):
+            if item.get("value"):
+                result.append({"value": item["value"], "primary": bool(item.get("primary"))})
+        elif item:
+            result.append({"value": item, "primary": not result})
+    return result
+
+
+def project_person(data: dict) -> Person:
+    """Reducir una persona de persons/{id} (o de la lista de personas) a su proyección"""
+    return {
+        "id": data.get("id"),
+        "name": data.get("name"),
+        "email": _contact_values(data.get("email")),
+        "phone": _contact_values(data.get("phone")),
+        "update_time": data.get("update_time"),
+        "custom_fields": {key: value for key, value in data.items() if is_custom_field(key)}
+    }
+
+
+def is_custom_field(key: str) -> bool:
+    return bool(_CUSTOM_FIELD_KEY.match(key))
+
+
+def person_from_search_item(item: dict) -> Person:
+    """Construir la proyección a partir de un resultado de persons/search"""
+    return {
+        "id": item.get("id"),
+        "name": item.get("name"),
+        "email": _contact_values(item.get("emails")),
+        "phone": _contact_values(item.get("phones"))
+    }
+
+
+def primary_value(values: Optional[List[ContactValue]]) -> Optional[str]:
+    """Valor principal (o el primero) de una lista de emails o teléfonos"""
+    if not values:
+        return None
+    return next((v["value"] for v in values if v.get("primary")), values[0]["value"])
+
+
+def parse_update_time(value: Optional[str]) -> Optional[datetime]:
+    """
+    update_time de Pipedrive como fecha UTC comparable. La API y los webhooks v1 usan
+    'AAAA-MM-DD HH:MM:SS' y los webhooks v2 ISO 8601 ('AAAA-MM-DDTHH:MM:SSZ'), que no
+    se pueden comparar como texto. Retorna None si falta o no se reconoce.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def person_etag(person: Person) -> str:
+    """
+    ETag de la proyección de una persona. Cambia con update_time de Pipedrive y,
+    dentro del mismo segundo, con el nombre, los emails o los teléfonos.
+    """
+    digest = hashlib.sha1(repr((
+        person.get("name"),
+        [v["value"] for v in person.get("email") or []],
+        [v["value"] for v in person.get("phone") or []]
+    )).encode()).hexdigest()[:8]
+    update_time = "".join(c for c in person.get("update_time") or "" if c.isdigit())
+    return f'"{person.get("id")}-{update_time}-{digest}"'
+
+
+def _value_set(values: List[ContactValue]) -> list:
+    return sorted((v["value"], v["primary"]) for v in values)
+
+
+def _scalar(value: Any) -> Any:
+    """Valor de un campo personalizado comparable entre lo enviado y lo que retorna Pipedrive"""
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        number = float(value)
+    else:
+        return value
+    # 40, 40.0 y "40" son el mismo valor; los IDs de opción llegan como número o texto
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+def _custom_value(value: Any) -> Any:
+    """Normalizar un campo personalizado; los de tipo set llegan como lista o como '11,12'"""
+    if isinstance(value, (list, tuple, set)):
+        return frozenset(_scalar(v) for v in value if _scalar(v) is not None) or None
+    return _scalar(value)
+
+
+def _same_custom_value(sent: Any, current: Any) -> bool:
+    sent, current = _custom_value(sent), _custom_value(current)
+    if isinstance(sent, frozenset) and isinstance(current, str):
+        current = _custom_value(current.split(","))
+    elif isinstance(current, frozenset) and isinstance(sent, str):
+        sent = _custom_value(sent.split(","))
+    return sent == current
+
+
+def changed_fields(person: Person, fields: dict) -> dict:
+    """
+    Campos de una actualización que modifican a la persona. Se comparan el nombre, los
+    emails, los teléfonos y los campos personalizados (si la persona los trae); cualquier
+    otro se considera cambiado.
+    """
+    custom_fields = person.get("custom_fields")
+    changed = {}
+    for key, value in fields.items():
+        if key == "name":
+            unchanged = value == person.get("name")
+        elif key in ("email", "phone"):
+            unchanged = _value_set(_contact_values(value)) == _value_set(person.get(key) or [])
+        elif custom_fields is not None and is_custom_field(key):
+            unchanged = _same_custom_value(value, custom_fields.get(key))
+        else:
+            unchanged = False
+        if not unchanged:
+            changed[key] = value
+    return changed
@@ -1,19 +1,108 @@
+import asyncio
+import time
 import httpx
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List, Tuple
 from app.core.config import settings
+from app.core.context import remaining_budget, request_trace
+from app.core.metrics import UPSTREAM_REQUEST_DURATION, normalize_endpoint
+from app.core.serialization import json_loads
+from app.services.cache import AsyncTTLCache, create_person_cache
+from app.services.circuit_breaker import CircuitBreaker, create_circuit_breaker
+from app.services.contact_mirror import ContactMirror, create_contact_mirror
+from app.services.http_client import create_http_client
+from app.services.note_pipeline import NotePipeline, create_note_pipeline
+from app.services.person_fields import PersonFieldRegistry, create_person_field_registry
+from app.services.update_coalescer import UpdateCoalescer, create_update_coalescer
+from app.services.identifiers import IDENTIFIER_ID, classify_identifier, normalize_identifier
+from app.services.persons import Person, parse_update_time, person_from_search_item, project_person
+from app.services.rate_limiter import RateLimiter, create_rate_limiter
+from app.services.retry import RetryPolicy
+from app.services.singleflight import SingleFlight
 from app.core.exceptions import (
     CRMException,
+    CircuitOpenException,
     ContactNotFoundException,
+    DeadlineExceededException,
     DuplicateContactException
 )
 
+_MISSING = object()
+
 class PipedriveService:
     """Servicio para interactuar con la API de Pipedrive"""
 
-    def __init__(self):
-        self.base_url = settings.PIPEDRIVE_API_URL
-        self.api_token = settings.PIPEDRIVE_API_TOKEN
+    def __init__(
+            self,
+            client: Optional[httpx.AsyncClient] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            rate_limiter: Optional[RateLimiter] = None,
+            cache: Optional[AsyncTTLCache] = None,
+            mirror: Optional[ContactMirror] = None,
+            circuit_breaker: Optional[CircuitBreaker] = None,
+            api_token: Optional[str] = None,
+            base_url: Optional[str] = None,
+            tenant_id: Optional[str] = None
+    ):
+        # Por defecto la cuenta configurada en settings; el registro de tenants indica otra
+        self.tenant_id = tenant_id
+        self.base_url = base_url or settings.PIPEDRIVE_API_URL
+        self.api_token = api_token or settings.PIPEDRIVE_API_TOKEN
         self.timeout = settings.REQUEST_TIMEOUT
+        # Cliente compartido (pool keep-alive). Si no se inyecta, el servicio crea y cierra el suyo.
+        self._client = client or create_http_client()
+        self._owns_client = client is None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter or create_rate_limiter()
+        self.cache = cache or create_person_cache()
+        # La réplica local solo existe para la cuenta por defecto
+        self.mirror = mirror or (None if tenant_id else create_contact_mirror())
+        self.circuit_breaker = circuit_breaker or create_circuit_breaker()
+        # Agrupa lecturas concurrentes idénticas aunque la caché esté desactivada
+        self._flights = SingleFlight()
+        self.note_pipeline: Optional[NotePipeline] = create_note_pipeline(self._post_note)
+        # Metadatos de campos de personas; se cargan con la primera actualización
+        self.person_fields: Optional[PersonFieldRegistry] = create_person_field_registry(self.list_person_fields)
+        self.update_coalescer: Optional[UpdateCoalescer] = create_update_coalescer(self._put_person)
+
+    async def aclose(self):
+        """Liberar recursos; el cliente HTTP solo se cierra si fue creado por este servicio"""
+        if self.note_pipeline:
+            await self.note_pipeline.aclose()
+        if self.update_coalescer:
+            await self.update_coalescer.aclose()
+        if self.rate_limiter:
+            self.rate_limiter.close()
+        if self.mirror:
+            self.mirror.close()
+        if self._owns_client:
+            await self._client.aclose()
+
+    @staticmethod
+    def _person_key(person_id: int) -> tuple:
+        return ("person", int(person_id))
+
+    @staticmethod
+    def _identifier_key(identifier: str) -> tuple:
+        return ("identifier", normalize_identifier(identifier))
+
+    def _remember_identifier(self, identifier: str, matches: List[dict]):
+        """Asociar el identificador a la persona solo si la coincidencia exacta es única"""
+        if self.cache and len({m.get("id") for m in matches}) == 1:
+            self.cache.set(self._identifier_key(identifier), matches[0].get("id"))
+
+    def _invalidate_identifiers(self, person_data: dict):
+        """Invalidar las claves de identificador afectadas por el nombre o emails de una persona"""
+        terms = []
+        if person_data.get("name"):
+            terms.append(person_data["name"])
+        emails = person_data.get("email") or []
+        if isinstance(emails, str):
+            emails = [emails]
+        for email in emails:
+            terms.append(email.get("value", "") if isinstance(email, dict) else email)
+        for term in terms:
+            if term:
+                self.cache.invalidate(self._identifier_key(term))
 
     def _get_headers(self) -> dict:
         """Obtener encabezados comunes para las solicitudes"""
@@ -36,68 +125,252 @@ class PipedriveService:
             data: dict = None,
             params: dict = None
     ) -> dict:
-        """Hacer una solicitud HTTP a la API de Pipedrive"""
+        """
+        Hacer una solicitud HTTP a la API de Pipedrive.
+        Reintenta los fallos transitorios según la política de reintentos; un POST
+        solo se reintenta si la conexión falló antes de enviarlo.
+        """
         url = f"{self.base_url}/{endpoint}"
         request_params = self._get_params(params)
+        headers = self._get_headers()
 
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.request(
-                    method=method,
-                    url=url,
-                    json=data,
-                    params=request_params,
-                    headers=self._get_headers()
+        attempt = 0
+        while True:
+            try:
+                if self.rate_limiter:
+                    await self._acquire_rate_limit()
+
+                # Vencido el plazo no se inicia ninguna llamada (en particular, ninguna escritura)
+                timeout = self._call_timeout()
+
+                if self.circuit_breaker:
+                    self.circuit_breaker.before_call()
+
+                started = time.perf_counter()
+                try:
+                    response = await self._client.request(
+                        method=method,
+                        url=url,
+                        json=data,
+                        params=request_params,
+                        headers=headers,
+                        timeout=timeout
+                    )
+                except httpx.RequestError as e:
+                    # Un timeout acortado por el plazo de la solicitud no es una falla de Pipedrive
+                    shortened = isinstance(e, httpx.TimeoutException) and timeout < self.timeout
+                    self._record_upstream(
+                        method, endpoint, type(e).__name__, started, failed=None if shortened else True
+                    )
+                    if shortened:
+                        raise DeadlineExceededException()
+                    raise
+                except BaseException:
+                    if self.circuit_breaker:
+                        self.circuit_breaker.release()
+                    raise
+                self._record_upstream(
+                    method, endpoint, str(response.status_code), started, failed=response.status_code >= 500
                 )
 
-                response.raise_for_status()
-                return response.json()
+                if self.rate_limiter:
+                    await self.rate_limiter.update_from_headers(response)
 
-        except httpx.HTTPStatusError as e:
-            error_detail = e.response.text
-            raise CRMException(
-                f"Error en Pipedrive API: {e.response.status_code}",
-                {"detail": error_detail, "status_code": e.response.status_code}
-            )
-        except httpx.RequestError as e:
-            raise CRMException(
-                f"Error de conexión con Pipedrive: {str(e)}",
-                {"error_type": type(e).__name__}
-            )
+                response.raise_for_status()
+                return json_loads(response.content)
+
+            except httpx.HTTPStatusError as e:
+                delay = self.retry_policy.next_delay(method, attempt, response=e.response)
+                if delay is None:
+                    error_detail = e.response.text
+                    raise CRMException(
+                        f"Error en Pipedrive API: {e.response.status_code}",
+                        {"detail": error_detail, "status_code": e.response.status_code, "attempts": attempt + 1}
+                    )
+            except httpx.RequestError as e:
+                delay = self.retry_policy.next_delay(method, attempt, error=e)
+                if delay is None:
+                    raise CRMException(
+                        f"Error de conexión con Pipedrive: {str(e)}",
+                        {"error_type": type(e).__name__, "attempts": attempt + 1}
+                    )
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _acquire_rate_limit(self):
+        """Esperar turno en el limitador sin pasar del plazo de la solicitud"""
+        if remaining_budget() is None:
+            await self.rate_limiter.acquire()
+            return
+        try:
+            await asyncio.wait_for(self.rate_limiter.acquire(), self._call_timeout())
+        except asyncio.TimeoutError:
+            raise DeadlineExceededException()
+
+    def _call_timeout(self) -> float:
+        """Timeout de la siguiente llamada: el configurado, acotado al presupuesto restante de la solicitud"""
+        budget = remaining_budget()
+        if budget is None:
+            return self.timeout
+        if budget <= 0:
+            raise DeadlineExceededException()
+        return min(self.timeout, budget)
+
+    def _record_upstream(self, method: str, endpoint: str, status: str, started: float, failed: Optional[bool]):
+        """
+        Registrar el resultado de una llamada a Pipedrive en las métricas, la traza y el
+        circuit breaker. failed=None indica una llamada sin resultado sobre la salud de
+        Pipedrive (p. ej. cortada por el plazo): solo libera su paso por el circuito.
+        """
+        elapsed = time.perf_counter() - started
+        UPSTREAM_REQUEST_DURATION.observe(elapsed, method, normalize_endpoint(endpoint), status)
+        if self.circuit_breaker:
+            if failed is None:
+                self.circuit_breaker.release()
+            else:
+                self.circuit_breaker.record(elapsed, failed)
+        trace = request_trace.get()
+        if trace is not None:
+            trace.record_upstream(elapsed)
+
+    async def search_persons(
+            self,
+            term: str,
+            fields: str = "name,email",
+            exact_match: bool = False,
+            limit: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Buscar personas por término en los campos indicados; las búsquedas idénticas
+        concurrentes se agrupan. Las páginas se piden a medida que se necesitan,
+        hasta reunir 'limit' resultados (todos si es None).
+        """
+        key = ("search", term, fields, exact_match, limit)
+        return await self._flights.do(key, lambda: self._search_persons(term, fields, exact_match, limit))
 
-    async def search_persons(self, term: str) -> List[dict]:
-        """Buscar personas por término (nombre o email)"""
+    async def _search_persons(self, term: str, fields: str, exact_match: bool, limit: Optional[int]) -> List[dict]:
+        results = []
         try:
+            async for page in self._search_pages(term, fields, exact_match, limit):
+                results.extend(page)
+        except (CircuitOpenException, DeadlineExceededException):
+            raise
+        except CRMException:
+            return []
+        return results[:limit] if limit is not None else results
+
+    async def _search_pages(
+            self,
+            term: str,
+            fields: str,
+            exact_match: bool,
+            limit: Optional[int]
+    ) -> AsyncIterator[List[dict]]:
+        """Páginas de resultados de /persons/search; se detiene al llegar a 'limit'"""
+        start, fetched = 0, 0
+        while start is not None and (limit is None or fetched < limit):
+            page_size = settings.SEARCH_PAGE_SIZE if limit is None else min(limit - fetched, settings.SEARCH_PAGE_SIZE)
             response = await self._make_request(
                 "GET",
                 "persons/search",
-                params={"term": term, "fields": "name,email", "exact_match": "false"}
+                params={
+                    "term": term,
+                    "fields": fields,
+                    "exact_match": "true" if exact_match else "false",
+                    "start": start,
+                    "limit": page_size
+                }
             )
+            if not response.get("success") or not response.get("data"):
+                return
+            items = [item.get("item", {}) for item in response["data"].get("items", [])]
+            fetched += len(items)
+            yield items
 
-            if response.get("success") and response.get("data"):
-                items = response["data"].get("items", [])
-                return [item.get("item", {}) for item in items]
-            return []
-
-        except CRMException:
-            return []
+            pagination = (response.get("additional_data") or {}).get("pagination") or {}
+            start = pagination.get("next_start") if pagination.get("more_items_in_collection") else None
 
-    async def find_contact_by_identifier(self, identifier: str) -> Optional[dict]:
+    async def find_contact_by_identifier(self, identifier: str) -> Optional[Person]:
         """
         Encuentra un contacto por nombre, email o ID. Maneja desambiguación y errores.
         Retorna un objeto persona completo si se encuentra un único contacto.
+        Con la caché activa, el identificador normalizado se asocia al ID de la persona
+        solo si la resolución fue exacta (ID, email o nombre completo): una coincidencia
+        difusa no identifica a la persona y check_duplicate_contact usa la misma clave.
         """
-        #  Intentar buscar por ID primero
-        if identifier.isdigit():
-            try:
-                return await self.get_person(int(identifier))
-            except ContactNotFoundException:
-                # Si no se encuentra por ID, continuar con búsqueda por nombre/email
-                pass
+        key = self._identifier_key(identifier)
+        if self.cache:
+            person_id = self.cache.get(key, _MISSING)
+            if person_id is not _MISSING:
+                return await self.get_person(person_id)
 
-        # Buscar por nombre o email
-        results = await self.search_persons(identifier)
+        try:
+            person, exact = await self._flights.do(key, lambda: self._resolve_identifier(identifier))
+        except CircuitOpenException:
+            person_id = self.cache.get_stale(key, _MISSING) if self.cache else _MISSING
+            if person_id is _MISSING:
+                raise
+            return await self.get_person(person_id)
+
+        if self.cache and person is not None and exact:
+            self.cache.set(key, person.get("id"))
+        return person
+
+    async def _get_or_load_cached(self, key: tuple, loader):
+        """Cargar a través de la caché; con el circuito abierto, servir el valor expirado si existe"""
+        try:
+            return await self.cache.get_or_load(key, loader)
+        except CircuitOpenException:
+            value = self.cache.get_stale(key, _MISSING)
+            if value is _MISSING:
+                raise
+            return value
+
+    def _mirror_usable(self) -> bool:
+        """La réplica se usa si está al día, o aunque esté atrasada mientras Pipedrive no responde"""
+        return self.mirror.is_fresh() or bool(self.circuit_breaker and self.circuit_breaker.is_open)
+
+    async def _resolve_identifier(self, identifier: str) -> Tuple[Optional[Person], bool]:
+        """
+        Resolver un identificador contra la réplica local o Pipedrive, sin pasar por la caché.
+        Retorna la persona y si la coincidencia fue exacta (False si salió de la búsqueda difusa).
+        """
+        if self.mirror and self._mirror_usable():
+            matches = self.mirror.lookup(identifier)
+            if len(matches) == 1:
+                return matches[0], True
+            if len(matches) > 1:
+                raise DuplicateContactException([
+                    {
+                        "id": p.get("id"),
+                        "name": p.get("name"),
+                        "email": (p.get("email") or [{}])[0].get("value")
+                    }
+                    for p in matches
+                ])
+            # Sin coincidencias en la réplica: consultar Pipedrive
 
+        kind = classify_identifier(identifier)
+        if kind == IDENTIFIER_ID:
+            try:
+                return await self.get_person(int(identifier)), True
+            except ContactNotFoundException:
+                if not settings.RESOLVE_FUZZY_FALLBACK:
+                    raise
+        else:
+            # Búsqueda exacta solo en el campo que corresponde al identificador
+            matches = await self.search_persons(
+                identifier.strip(), fields=kind, exact_match=True, limit=settings.SEARCH_PAGE_SIZE
+            )
+            person = await self._single_match(matches)
+            if person is not None:
+                return person, True
+            if not settings.RESOLVE_FUZZY_FALLBACK:
+                raise ContactNotFoundException(identifier)
+
+        # Respaldo: búsqueda difusa por nombre o email; basta una página para decidir
+        results = await self.search_persons(identifier, limit=settings.SEARCH_PAGE_SIZE)
         if not results:
             raise ContactNotFoundException(identifier)
 
@@ -109,56 +382,117 @@ class PipedriveService:
             if is_email_match or is_name_match:
                 exact_matches.append(r)
 
-        # Procesar coincidencias exactas
-        if exact_matches:
-            unique_exact_matches = list({m['id']: m for m in exact_matches}.values())
-            if len(unique_exact_matches) == 1:
-                return await self.get_person(unique_exact_matches[0]["id"])
-            elif len(unique_exact_matches) > 1:
-                raise DuplicateContactException([
-                    {"id": r.get("id"), "name": r.get("name"), "email": r.get("emails")[0] if r.get("emails") else None}
-                    for r in unique_exact_matches
-                ])
-
         # Si no hay coincidencias exactas, manejar resultados parciales
-        if len(results) == 1:
-            return await self.get_person(results[0]["id"])
+        return await self._single_match(exact_matches or results), bool(exact_matches)
 
-        if len(results) > 1:
+    async def _single_match(self, matches: List[dict]) -> Optional[Person]:
+        """La persona si hay un único resultado, DuplicateContactException si hay varios y None si no hay"""
+        unique = list({m["id"]: m for m in matches}.values())
+        if len(unique) > 1:
             raise DuplicateContactException([
                 {"id": r.get("id"), "name": r.get("name"), "email": r.get("emails")[0] if r.get("emails") else None}
-                for r in results
+                for r in unique
             ])
+        if unique:
+            return await self.get_person(unique[0]["id"])
+        return None
 
-        return None # No se encontró ningún contacto único
-
-    async def check_duplicate_contact(self, name: str, email: Optional[str]) -> Optional[dict]:
-        """Revisar si existe un contacto duplicado por nombre o email"""
-        found_person_id = None
+    async def check_duplicate_contact(self, name: str, email: Optional[str]) -> Optional[Person]:
+        """
+        Revisar si existe un contacto duplicado por nombre o email.
+        Las búsquedas por email y por nombre se lanzan en paralelo; las coincidencias
+        por email tienen prioridad. Si el resultado de la búsqueda ya trae los datos
+        necesarios, se evita la consulta adicional de la persona.
+        """
+        if self.cache:
+            # Con email, solo su clave decide: la coincidencia por email tiene prioridad, así que si
+            # no está en caché hay que buscarla aunque el nombre sí esté
+            person_id = self.cache.get(self._identifier_key(email or name))
+            if person_id is not None:
+                return await self.get_person(person_id)
+
+        if self.mirror and self.mirror.is_fresh():
+            matches = (self.mirror.find_by_email(email) if email else []) or self.mirror.find_by_name(name)
+            if matches:
+                return matches[0]
+
+        # Búsquedas exactas; dos resultados bastan para saber si la coincidencia es única
         if email:
-            results = await self.search_persons(email)
-            for r in results:
-                if r.get("emails") and any(e.lower() == email.lower() for e in r["emails"]):
-                    found_person_id = r.get("id")
-                    break
-
-        if not found_person_id:
-            results = await self.search_persons(name)
-            for r in results:
-                if r.get("name", "").lower() == name.lower():
-                    found_person_id = r.get("id")
-                    break
-
-        if found_person_id:
-            try:
-                return await self.get_person(found_person_id)
-            except ContactNotFoundException:
-                return None
+            email_results, name_results = await asyncio.gather(
+                self.search_persons(email, fields="email", exact_match=True, limit=2),
+                self.search_persons(name, fields="name", exact_match=True, limit=2)
+            )
+        else:
+            email_results, name_results = [], await self.search_persons(name, fields="name", exact_match=True, limit=2)
 
-        return None
+        email_matches = [
+            r for r in email_results
+            if r.get("emails") and any(e.lower() == email.lower() for e in r["emails"])
+        ]
+        name_matches = [r for r in name_results if r.get("name", "").lower() == name.lower()]
+
+        if email_matches:
+            self._remember_identifier(email, email_matches)
+        if name_matches:
+            self._remember_identifier(name, name_matches)
+
+        matches = email_matches or name_matches
+        if not matches:
+            return None
 
-    async def create_person(self, person_data: dict) -> dict:
-        """Crear una persona en Pipedrive"""
+        found = matches[0]
+        if self._is_complete_search_item(found):
+            return person_from_search_item(found)
+
+        try:
+            return await self.get_person(found.get("id"))
+        except ContactNotFoundException:
+            return None
+
+    @staticmethod
+    def _is_complete_search_item(item: dict) -> bool:
+        """Un resultado de búsqueda basta si trae ID, nombre, emails y teléfonos"""
+        return all(key in item for key in ("id", "name", "emails", "phones"))
+
+    async def list_persons(
+            self,
+            start: int = 0,
+            limit: int = 500,
+            sort: Optional[str] = None
+    ) -> Tuple[List[Person], Optional[int]]:
+        """
+        Listar una página de personas.
+        Retorna las personas y el 'start' de la siguiente página (None si no hay más).
+        """
+        params = {"start": start, "limit": limit}
+        if sort:
+            params["sort"] = sort
+
+        response = await self._make_request("GET", "persons", params=params)
+        if not response.get("success"):
+            raise CRMException("No se pudo listar los contactos de Pipedrive", response)
+
+        pagination = (response.get("additional_data") or {}).get("pagination") or {}
+        next_start = pagination.get("next_start") if pagination.get("more_items_in_collection") else None
+        return [project_person(p) for p in response.get("data") or []], next_start
+
+    async def list_person_fields(self) -> List[dict]:
+        """Listar los campos de personas (estándar y personalizados) con sus opciones"""
+        fields, start = [], 0
+        while start is not None:
+            response = await self._make_request("GET", "personFields", params={"start": start, "limit": 500})
+            if not response.get("success"):
+                raise CRMException("No se pudo obtener los campos de personas de Pipedrive", response)
+            fields.extend(response.get("data") or [])
+            pagination = (response.get("additional_data") or {}).get("pagination") or {}
+            start = pagination.get("next_start") if pagination.get("more_items_in_collection") else None
+        return fields
+
+    async def create_person(self, person_data: dict) -> Person:
+        """
+        Crear una persona en Pipedrive.
+        La creación no se reintenta una vez enviada para evitar contactos duplicados.
+        """
         response = await self._make_request(
             "POST",
             "persons",
@@ -168,22 +502,52 @@ class PipedriveService:
         if not response.get("success"):
             raise CRMException("No se pudo crear el contacto en Pipedrive", response)
 
-        return response.get("data", {})
+        person = project_person(response.get("data") or {})
+        if self.mirror:
+            await self.mirror.write_through(person.get("id"), person)
+        if self.cache:
+            # Un contacto nuevo puede volver ambiguos nombres o emails ya resueltos
+            self._invalidate_identifiers(person_data)
+            self.cache.set(self._person_key(person.get("id")), person)
+        return person
+
+    async def get_person(self, person_id: int) -> Person:
+        """Obtener una persona por ID (desde la caché si está activa)"""
+        if self.cache:
+            return await self._get_or_load_cached(
+                self._person_key(person_id),
+                lambda: self._fetch_person(person_id)
+            )
+        return await self._flights.do(self._person_key(person_id), lambda: self._fetch_person(person_id))
 
-    async def get_person(self, person_id: int) -> dict:
-        """Obtener una persona por ID"""
-        response = await self._make_request(
-            "GET",
-            f"persons/{person_id}"
-        )
+    async def _fetch_person(self, person_id: int) -> Person:
+        """Obtener una persona por ID directamente de Pipedrive"""
+        try:
+            response = await self._make_request(
+                "GET",
+                f"persons/{person_id}"
+            )
+        except CRMException as e:
+            # Pipedrive responde 404 a un ID inexistente
+            if e.details.get("status_code") == 404:
+                raise ContactNotFoundException(str(person_id))
+            raise
 
         if not response.get("success"):
             raise ContactNotFoundException(str(person_id))
 
-        return response.get("data", {})
+        return project_person(response.get("data") or {})
+
+    async def update_person(self, person_id: int, update_data: dict) -> Person:
+        """
+        Actualizar una persona por ID. Con la ventana de combinación activa, las
+        actualizaciones de la misma persona que llegan juntas se envían en un solo PUT.
+        """
+        if self.update_coalescer:
+            return await self.update_coalescer.submit(person_id, update_data)
+        return await self._put_person(person_id, update_data)
 
-    async def update_person(self, person_id: int, update_data: dict) -> dict:
-        """Actualizar una persona por ID"""
+    async def _put_person(self, person_id: int, update_data: dict) -> Person:
         response = await self._make_request(
             "PUT",
             f"persons/{person_id}",
@@ -196,10 +560,26 @@ class PipedriveService:
                 response
             )
 
-        return response.get("data", {})
+        person = project_person(response.get("data") or {})
+        if self.mirror:
+            await self.mirror.write_through(person_id, person)
+        if self.cache:
+            # Write-through: la respuesta del PUT trae la persona actualizada
+            self.cache.invalidate_where(lambda key, value: key[0] == "identifier" and value == person_id)
+            self._invalidate_identifiers(update_data)
+            self.cache.set(self._person_key(person_id), person)
+        return person
 
     async def add_note(self, person_id: int, content: str) -> dict:
-        """Agregar una nota a una persona"""
+        """
+        Agregar una nota a una persona. Con el pipeline de notas activo, la nota se
+        escribe después de las notas pendientes del mismo contacto.
+        """
+        if self.note_pipeline:
+            return await self.note_pipeline.submit(person_id, content)
+        return await self._post_note(person_id, content)
+
+    async def _post_note(self, person_id: int, content: str) -> dict:
         note_data = {
             "content": content,
             "person_id": person_id
@@ -217,8 +597,57 @@ class PipedriveService:
                 response
             )
 
+        if self.cache:
+            # La persona cambia (notes_count, last_activity...) al agregar una nota
+            self.cache.invalidate(self._person_key(person_id))
         return response.get("data", {})
 
+    async def apply_person_change(
+            self,
+            person_id: int,
+            current: Optional[dict],
+            previous: Optional[dict] = None
+    ) -> bool:
+        """
+        Aplicar a la caché y la réplica un cambio de persona hecho en Pipedrive (webhook).
+        current=None indica que la persona se eliminó. Retorna False si el cambio es más
+        antiguo que la versión ya conocida.
+        """
+        person = project_person(current) if current else None
+        if person and self.cache:
+            cached = self.cache.get(self._person_key(person_id))
+            known = parse_update_time(cached.get("update_time")) if cached else None
+            incoming = parse_update_time(person.get("update_time"))
+            if known and incoming and known > incoming:
+                return False
+
+        if self.cache:
+            # El nombre o los emails pueden haber cambiado: los identificadores se resuelven de nuevo
+            self.cache.invalidate_where(lambda key, value: key[0] == "identifier" and value == person_id)
+            for data in (previous, person):
+                if data:
+                    self._invalidate_identifiers(data)
+            if person:
+                self.cache.set(self._person_key(person_id), person)
+            else:
+                self.cache.invalidate(self._person_key(person_id))
+        if self.mirror:
+            # Después de la caché: un evento que llegue mientras se escribe la réplica ya ve esta versión
+            await self.mirror.write_through(person_id, person)
+        return True
+
+    async def list_webhooks(self) -> List[dict]:
+        """Listar los webhooks registrados en la cuenta"""
+        response = await self._make_request("GET", "webhooks")
+        return response.get("data") or []
+
+    async def create_webhook(self, webhook_data: dict) -> dict:
+        """Registrar un webhook"""
+        response = await self._make_request("POST", "webhooks", data=webhook_data)
+        if not response.get("success"):
+            raise CRMException("No se pudo registrar el webhook en Pipedrive", response)
+        return response.get("data") or {}
+
     def get_person_url(self, person_id: int) -> str:
         """Obtener la URL del contacto en Pipedrive"""
         return f"https://app.pipedrive.com/person/{person_id}"
\ No newline at end of file
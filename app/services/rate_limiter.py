@@ -0,0 +1,241 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import httpx
+from app.core.config import settings
+
+
+def _header_float(headers: httpx.Headers, name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class RateLimiter(ABC):
+    """
+    Limitador de tasa tipo token bucket para las llamadas a Pipedrive.
+
+    La capacidad inicial se ajusta con los encabezados X-RateLimit-* de cada
+    respuesta. Los llamadores esperan en orden de llegada (FIFO) en lugar de
+    disparar solicitudes que Pipedrive rechazaría con 429.
+    """
+
+    backend = "base"
+
+    def __init__(self, capacity: float, window: float):
+        self.capacity = float(capacity)
+        self.window = window
+        self._lock = asyncio.Lock()
+        # Métricas
+        self.queue_depth = 0
+        self.acquired_total = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def refill_rate(self) -> float:
+        """Tokens por segundo"""
+        return self.capacity / self.window
+
+    @abstractmethod
+    async def _try_acquire(self) -> float:
+        """Consumir un token. Retorna 0 si se obtuvo o los segundos a esperar si no"""
+
+    @abstractmethod
+    async def _apply_limits(self, limit: Optional[float], remaining: Optional[float], block_for: Optional[float]):
+        """Aplicar el estado de cupo reportado por Pipedrive"""
+
+    async def acquire(self):
+        """Esperar turno y consumir un token antes de llamar a Pipedrive"""
+        start = time.monotonic()
+        self.queue_depth += 1
+        try:
+            # asyncio.Lock despierta a los que esperan en orden de llegada
+            async with self._lock:
+                while True:
+                    wait = await self._try_acquire()
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+        finally:
+            self.queue_depth -= 1
+
+        waited = time.monotonic() - start
+        self.acquired_total += 1
+        self.wait_seconds_total += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    async def update_from_headers(self, response: httpx.Response):
+        """Sincronizar el bucket con los encabezados de cupo de la respuesta de Pipedrive"""
+        headers = response.headers
+        limit = _header_float(headers, "X-RateLimit-Limit")
+        remaining = _header_float(headers, "X-RateLimit-Remaining")
+        reset = _header_float(headers, "X-RateLimit-Reset")
+
+        block_for = None
+        if response.status_code == 429:
+            block_for = _header_float(headers, "Retry-After") or reset or self.window
+        elif remaining == 0 and reset:
+            block_for = reset
+
+        if limit is None and remaining is None and block_for is None:
+            return
+        await self._apply_limits(limit, remaining, block_for)
+
+    def close(self):
+        """Liberar recursos del backend"""
+
+    def stats(self) -> dict:
+        """Métricas del limitador"""
+        return {
+            "backend": self.backend,
+            "capacity": self.capacity,
+            "queue_depth": self.queue_depth,
+            "acquired_total": self.acquired_total,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "max_wait_seconds": round(self.max_wait_seconds, 6)
+        }
+
+
+class InMemoryRateLimiter(RateLimiter):
+    """Token bucket local al proceso"""
+
+    backend = "memory"
+
+    def __init__(self, capacity: float, window: float):
+        super().__init__(capacity, window)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    async def _try_acquire(self) -> float:
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.refill_rate
+
+    async def _apply_limits(self, limit, remaining, block_for):
+        now = time.monotonic()
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            # Pipedrive conoce el consumo de todos los procesos que comparten el token
+            self.tokens = min(self.tokens, remaining)
+        if block_for:
+            self.tokens = 0
+            self._blocked_until = max(self._blocked_until, now + block_for)
+
+    def stats(self) -> dict:
+        result = super().stats()
+        result["tokens"] = round(self.tokens, 3)
+        return result
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """
+    Token bucket compartido entre workers de uvicorn mediante un archivo SQLite.
+    Cada consumo de token es una transacción 'BEGIN IMMEDIATE' sobre una única fila.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, capacity: float, window: float, path: str, name: str = "pipedrive"):
+        super().__init__(capacity, window)
+        self.path = path
+        self.name = name
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "name TEXT PRIMARY KEY, capacity REAL, tokens REAL, updated REAL, blocked_until REAL)"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO rate_limit_buckets VALUES (?, ?, ?, ?, 0)",
+            (name, self.capacity, self.capacity, time.time())
+        )
+
+    def _transaction(self, apply) -> float:
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                capacity, tokens, updated, blocked_until = self._conn.execute(
+                    "SELECT capacity, tokens, updated, blocked_until FROM rate_limit_buckets WHERE name = ?",
+                    (self.name,)
+                ).fetchone()
+                now = time.time()
+                self.capacity = capacity
+                tokens = min(capacity, tokens + (now - updated) * capacity / self.window)
+                capacity, tokens, blocked_until, result = apply(now, capacity, tokens, blocked_until)
+                self._conn.execute(
+                    "UPDATE rate_limit_buckets SET capacity = ?, tokens = ?, updated = ?, blocked_until = ? "
+                    "WHERE name = ?",
+                    (capacity, tokens, now, blocked_until, self.name)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.capacity = capacity
+        return result
+
+    def _take(self, now, capacity, tokens, blocked_until):
+        if now < blocked_until:
+            return capacity, tokens, blocked_until, blocked_until - now
+        if tokens >= 1:
+            return capacity, tokens - 1, blocked_until, 0
+        return capacity, tokens, blocked_until, (1 - tokens) * self.window / capacity
+
+    async def _try_acquire(self) -> float:
+        return await asyncio.to_thread(self._transaction, self._take)
+
+    async def _apply_limits(self, limit, remaining, block_for):
+        def apply(now, capacity, tokens, blocked_until):
+            if limit:
+                capacity = limit
+            if remaining is not None:
+                tokens = min(tokens, remaining)
+            if block_for:
+                tokens = 0
+                blocked_until = max(blocked_until, now + block_for)
+            return capacity, tokens, blocked_until, 0
+
+        await asyncio.to_thread(self._transaction, apply)
+
+    def close(self):
+        self._conn.close()
+
+
+def create_rate_limiter(name: str = "pipedrive", capacity: Optional[float] = None) -> Optional[RateLimiter]:
+    """
+    Construir el limitador configurado, o None si está desactivado.
+    Cada cuenta de Pipedrive (token) debe tener su propio nombre de cupo.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    capacity = capacity or settings.RATE_LIMIT_CAPACITY
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteRateLimiter(
+            capacity,
+            settings.RATE_LIMIT_WINDOW_SECONDS,
+            settings.RATE_LIMIT_SQLITE_PATH,
+            name
+        )
+    return InMemoryRateLimiter(capacity, settings.RATE_LIMIT_WINDOW_SECONDS)
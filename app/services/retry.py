@@ -0,0 +1,105 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+from app.core.config import settings
+from app.core.context import remaining_budget
+
+# Códigos de estado de Pipedrive que indican un fallo transitorio
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Métodos que pueden repetirse sin riesgo de efectos duplicados
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Errores en los que la solicitud nunca llegó a Pipedrive, seguros para cualquier método
+CONNECTION_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    """
+    Obtener la espera indicada por Pipedrive en segundos.
+
+    Usa Retry-After (segundos o fecha HTTP) y, si no existe, X-RateLimit-Reset
+    cuando X-RateLimit-Remaining indica que el cupo está agotado.
+    """
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max(0.0, retry_at.timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    if headers.get("X-RateLimit-Remaining") == "0" and headers.get("X-RateLimit-Reset"):
+        try:
+            return max(0.0, float(headers["X-RateLimit-Reset"]))
+        except ValueError:
+            pass
+
+    return None
+
+
+class RetryPolicy:
+    """Reglas de reintento con backoff exponencial y jitter para las llamadas a Pipedrive"""
+
+    def __init__(
+            self,
+            max_retries: int = None,
+            backoff_base: float = None,
+            backoff_max: float = None
+    ):
+        self.max_retries = settings.MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = settings.RETRY_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = settings.RETRY_BACKOFF_MAX if backoff_max is None else backoff_max
+
+    def is_retryable_method(self, method: str) -> bool:
+        """
+        Un POST no se reintenta una vez enviado: Pipedrive no deduplica las creaciones
+        (ignora Idempotency-Key) y un timeout de lectura puede ocultar una escritura hecha.
+        """
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def backoff(self, attempt: int) -> float:
+        """Backoff exponencial con 'full jitter'"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def next_delay(
+            self,
+            method: str,
+            attempt: int,
+            response: Optional[httpx.Response] = None,
+            error: Optional[Exception] = None
+    ) -> Optional[float]:
+        """
+        Calcular la espera antes del siguiente intento.
+        Retorna None si la falla no debe reintentarse.
+        """
+        if attempt >= self.max_retries:
+            return None
+
+        if response is not None:
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                return None
+            if not self.is_retryable_method(method):
+                return None
+            delay = parse_retry_after(response.headers)
+            if delay is None:
+                delay = self.backoff(attempt)
+        elif isinstance(error, CONNECTION_ERRORS):
+            delay = self.backoff(attempt)
+        elif isinstance(error, httpx.TransportError) and self.is_retryable_method(method):
+            delay = self.backoff(attempt)
+        else:
+            return None
+
+        # No esperar más allá del presupuesto de la solicitud entrante
+        budget = remaining_budget()
+        if budget is not None and delay >= budget:
+            return None
+
+        return delay
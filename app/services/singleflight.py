@@ -0,0 +1,58 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.core.context import remaining_budget
+from app.core.exceptions import DeadlineExceededException
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave: solo la primera ejecuta la
+    función y las demás esperan su resultado. Las excepciones (p. ej.
+    DuplicateContactException) también se comparten, salvo el vencimiento del plazo
+    de la llamada original: quien espera con presupuesto propio la repite. Nada se
+    almacena: al terminar la llamada, la siguiente con la misma clave vuelve a ejecutarse.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}
+        self.coalesced = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Si se canceló la llamada original (y no este llamador), intentar de nuevo
+                if not inflight.cancelled():
+                    raise
+            except DeadlineExceededException:
+                # El plazo vencido es el de la llamada original; si a este llamador le queda tiempo, intentar de nuevo
+                budget = remaining_budget()
+                if budget is not None and budget <= 0:
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Evitar el aviso "exception was never retrieved" si nadie más esperaba
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
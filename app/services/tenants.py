@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.core.exceptions import TenantNotFoundException
+from app.services.http_client import create_http_client
+from app.services.pipedrive_service import PipedriveService
+from app.services.rate_limiter import create_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class TenantConfig:
+    """Cuenta de Pipedrive de un tenant"""
+    tenant_id: str
+    api_token: str
+    api_url: str
+    rate_limit_capacity: Optional[float] = None
+    # Credenciales HTTP Basic con las que la cuenta de Pipedrive llama al webhook
+    webhook_user: Optional[str] = None
+    webhook_password: Optional[str] = None
+
+
+class TenantConfigStore:
+    """
+    Configuración de tenants en un archivo JSON:
+
+        {"acme": {"api_token": "...", "api_url": "https://acme.pipedrive.com/api/v1",
+                  "api_keys": ["..."], "rate_limit_capacity": 40,
+                  "webhook_user": "...", "webhook_password": "..."}}
+
+    El archivo se lee al primer uso y se vuelve a leer cuando cambia, sin reiniciar.
+    Las API keys se indexan por su hash SHA-256.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._tenants: Dict[str, TenantConfig] = {}
+        self._api_keys: Dict[str, str] = {}
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            self._mtime, self._tenants, self._api_keys = None, {}, {}
+            return
+        if mtime == self._mtime:
+            return
+
+        with open(self.path, encoding="utf-8") as f:
+            raw = json.load(f)
+        tenants, api_keys = {}, {}
+        for tenant_id, entry in raw.items():
+            tenants[tenant_id] = TenantConfig(
+                tenant_id=tenant_id,
+                api_token=entry["api_token"],
+                api_url=entry.get("api_url") or settings.PIPEDRIVE_API_URL,
+                rate_limit_capacity=entry.get("rate_limit_capacity"),
+                webhook_user=entry.get("webhook_user"),
+                webhook_password=entry.get("webhook_password")
+            )
+            for api_key in entry.get("api_keys") or []:
+                api_keys[_hash_api_key(api_key)] = tenant_id
+        self._mtime, self._tenants, self._api_keys = mtime, tenants, api_keys
+
+    def get(self, tenant_id: str) -> Optional[TenantConfig]:
+        self._refresh()
+        return self._tenants.get(tenant_id)
+
+    def get_by_api_key(self, api_key: str) -> Optional[TenantConfig]:
+        self._refresh()
+        tenant_id = self._api_keys.get(_hash_api_key(api_key))
+        return self._tenants.get(tenant_id) if tenant_id else None
+
+
+class _ActiveTenant:
+    """Servicio abierto de un tenant con su pool HTTP y sus usos en curso"""
+    __slots__ = ("config", "service", "client", "leases", "last_used", "retired")
+
+    def __init__(self, config: TenantConfig):
+        self.config = config
+        self.client = create_http_client()
+        self.service = PipedriveService(
+            client=self.client,
+            rate_limiter=create_rate_limiter(f"tenant:{config.tenant_id}", config.rate_limit_capacity),
+            api_token=config.api_token,
+            base_url=config.api_url,
+            tenant_id=config.tenant_id
+        )
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self.retired = False
+
+    async def aclose(self):
+        await self.service.aclose()
+        await self.client.aclose()
+
+
+class TenantRegistry:
+    """
+    Servicios de Pipedrive por tenant, creados al primer uso y cerrados tras
+    TENANT_IDLE_SECONDS sin solicitudes. Cada tenant tiene su token, URL, pool
+    de conexiones, cupo del limitador, caché y circuit breaker.
+    """
+
+    def __init__(self, store: TenantConfigStore, idle_seconds: float):
+        self.store = store
+        self.idle_seconds = idle_seconds
+        self._active: Dict[str, _ActiveTenant] = {}
+        self.loaded_total = 0
+        self.evicted_total = 0
+
+    def resolve(self, tenant_id: Optional[str] = None, api_key: Optional[str] = None) -> TenantConfig:
+        """Identificar el tenant por API key o por su ID"""
+        if api_key:
+            config = self.store.get_by_api_key(api_key)
+            if config is None:
+                raise TenantNotFoundException()
+            if tenant_id and tenant_id != config.tenant_id:
+                raise TenantNotFoundException(tenant_id)
+            return config
+        if tenant_id:
+            config = self.store.get(tenant_id)
+            if config is None:
+                raise TenantNotFoundException(tenant_id)
+            return config
+        raise TenantNotFoundException()
+
+    def _activate(self, config: TenantConfig) -> _ActiveTenant:
+        active = self._active.get(config.tenant_id)
+        if active is not None and active.config != config:
+            # La configuración cambió (p. ej. token rotado): el servicio anterior se
+            # cierra cuando terminen las solicitudes que lo usan
+            active.retired = True
+            del self._active[config.tenant_id]
+            if active.leases == 0:
+                asyncio.create_task(active.aclose())
+            active = None
+        if active is None:
+            active = self._active[config.tenant_id] = _ActiveTenant(config)
+            self.loaded_total += 1
+        return active
+
+    @asynccontextmanager
+    async def lease(self, config: TenantConfig) -> AsyncIterator[PipedriveService]:
+        """Usar el servicio del tenant; mientras haya usos en curso no se cierra"""
+        active = self._activate(config)
+        active.leases += 1
+        try:
+            yield active.service
+        finally:
+            active.leases -= 1
+            active.last_used = time.monotonic()
+            if active.retired and active.leases == 0:
+                await active.aclose()
+
+    def get_active(self, tenant_id: str) -> Optional[PipedriveService]:
+        """Servicio ya abierto del tenant, sin crearlo ni renovar su uso"""
+        active = self._active.get(tenant_id)
+        return active.service if active else None
+
+    async def evict_idle(self) -> int:
+        """Cerrar los servicios sin uso durante idle_seconds"""
+        now = time.monotonic()
+        idle = [
+            tenant_id for tenant_id, active in self._active.items()
+            if active.leases == 0 and now - active.last_used >= self.idle_seconds
+        ]
+        for tenant_id in idle:
+            active = self._active.pop(tenant_id)
+            self.evicted_total += 1
+            await active.aclose()
+        return len(idle)
+
+    async def run(self, interval: float):
+        """Bucle de desalojo de tenants inactivos"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception:
+                logger.exception("Error cerrando tenants inactivos")
+
+    async def aclose(self):
+        active, self._active = list(self._active.values()), {}
+        for tenant in active:
+            await tenant.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._active),
+            "in_use": sum(1 for a in self._active.values() if a.leases),
+            "loaded_total": self.loaded_total,
+            "evicted_total": self.evicted_total
+        }
+
+
+def create_tenant_registry() -> Optional[TenantRegistry]:
+    """Construir el registro de tenants, o None si la aplicación atiende una sola cuenta"""
+    if not settings.TENANTS_ENABLED:
+        return None
+    return TenantRegistry(TenantConfigStore(settings.TENANTS_CONFIG_PATH), settings.TENANT_IDLE_SECONDS)
+
+
+def tenant_scope(tenant_id: Optional[str], scope: str) -> str:
+    """Prefijar una clave con el tenant para que no se compartan entre cuentas"""
+    return f"{tenant_id}:{scope}" if tenant_id else scope
@@ -0,0 +1,43 @@
+from typing import Awaitable, Callable, List, Optional
+
+from app.core.config import settings
+from app.services.keyed_batcher import KeyedBatcher
+
+PersonWriter = Callable[[int, dict], Awaitable[dict]]
+
+
+class UpdateCoalescer(KeyedBatcher):
+    """
+    Une las actualizaciones de una misma persona que llegan dentro de 'window' segundos
+    en un solo PUT persons/{id}. Los campos se combinan en orden de llegada (el último
+    valor de cada campo prevalece) y todos los llamadores reciben la persona resultante.
+
+    Las escrituras de una persona son secuenciales: lo que llega mientras se envía un
+    PUT se combina en el siguiente.
+    """
+
+    def __init__(self, write: PersonWriter, window: float = None):
+        super().__init__(settings.UPDATE_COALESCE_WINDOW_SECONDS if window is None else window)
+        self._write = write
+
+    async def _write_batch(self, person_id: int, updates: List[dict]) -> dict:
+        fields = {}
+        for update in updates:
+            fields.update(update)
+        return await self._write(person_id, fields)
+
+    def stats(self) -> dict:
+        return {
+            "persons_pending": self.pending_keys(),
+            "updates_pending": self.pending_items(),
+            "writes": self.writes,
+            "merged": self.merged,
+            "failed": self.failed
+        }
+
+
+def create_update_coalescer(write: PersonWriter) -> Optional[UpdateCoalescer]:
+    """Construir el combinador de actualizaciones, o None si la ventana es 0 (desactivado)"""
+    if settings.UPDATE_COALESCE_WINDOW_SECONDS <= 0:
+        return None
+    return UpdateCoalescer(write)
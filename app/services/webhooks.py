@@ -0,0 +1,213 @@
+"""
+Webhooks de personas de Pipedrive.
+
+Pipedrive notifica las altas, cambios, eliminaciones y fusiones de personas hechas
+fuera de la API (p. ej. en su interfaz). Los eventos se deduplican y se aplican a la
+caché y la réplica del servicio, que así pueden conservar los datos por horas.
+
+Registrar el webhook (idempotente; no duplica uno existente):
+    python -m app.services.webhooks https://mi-api.com/crm/webhooks/pipedrive
+    python -m app.services.webhooks https://mi-api.com/crm/webhooks/pipedrive --tenant acme
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from urllib.parse import urlencode
+
+from app.core.config import settings
+from app.services.cache import AsyncTTLCache
+from app.services.pipedrive_service import PipedriveService
+from app.services.tenants import TenantConfig, TenantConfigStore
+
+WEBHOOK_APPLIED = "applied"
+WEBHOOK_DUPLICATE = "duplicate"
+WEBHOOK_STALE = "stale"
+WEBHOOK_IGNORED = "ignored"
+
+# Acciones de la versión 1 y 2 de los webhooks
+_DELETE_ACTIONS = ("deleted", "delete")
+_PERSON_ACTIONS = ("added", "updated", "merged", "create", "change", "merge") + _DELETE_ACTIONS
+
+
+@dataclass
+class PersonEvent:
+    """Evento de persona normalizado"""
+    event_id: str
+    action: str
+    person_id: int
+    current: Optional[dict]
+    previous: Optional[dict]
+    merged_id: Optional[int] = None
+
+
+def _person_v2(data: Optional[dict]) -> Optional[dict]:
+    """Los webhooks v2 usan 'emails' y 'phones'; el resto del código espera 'email' y 'phone'"""
+    if not data:
+        return None
+    person = dict(data)
+    if "emails" in person:
+        person["email"] = person.pop("emails")
+    if "phones" in person:
+        person["phone"] = person.pop("phones")
+    return person
+
+
+def _merged_id(data: Optional[dict], person_id: int) -> Optional[int]:
+    merged_id = (data or {}).get("merge_what_id")
+    if not merged_id or int(merged_id) == person_id:
+        return None
+    return int(merged_id)
+
+
+def parse_person_event(payload: dict) -> Optional[PersonEvent]:
+    """Normalizar un evento de webhook; retorna None si no es un evento de persona"""
+    meta = payload.get("meta") or {}
+    if "entity" in meta:
+        # Versión 2: meta.id identifica el evento
+        if meta.get("entity") != "person" or meta.get("action") not in _PERSON_ACTIONS:
+            return None
+        person_id = int(meta["entity_id"])
+        data = payload.get("data") or {}
+        return PersonEvent(
+            event_id=str(meta.get("id") or f"{person_id}:{meta.get('action')}:{meta.get('timestamp')}"),
+            action=meta["action"],
+            person_id=person_id,
+            current=None if meta["action"] in _DELETE_ACTIONS else _person_v2(data),
+            previous=_person_v2(payload.get("previous")),
+            # En una fusión la persona que queda trae merge_what_id, la que desaparece
+            merged_id=_merged_id(data, person_id)
+        )
+
+    # Versión 1: meta.id es el ID de la persona
+    if meta.get("object") != "person" or meta.get("action") not in _PERSON_ACTIONS:
+        return None
+    person_id = int(meta["id"])
+    current = payload.get("current")
+    timestamp = meta.get("timestamp_micro") or meta.get("timestamp")
+    return PersonEvent(
+        event_id=f"{meta.get('webhook_id')}:{person_id}:{meta['action']}:{timestamp}",
+        action=meta["action"],
+        person_id=person_id,
+        current=None if meta["action"] in _DELETE_ACTIONS else current,
+        previous=payload.get("previous"),
+        # En una fusión 'current' es la persona que queda; merge_what_id la que desaparece
+        merged_id=_merged_id(current, person_id) if meta["action"] == "merged" else None
+    )
+
+
+class PipedriveWebhookProcessor:
+    """Deduplica los eventos (Pipedrive reintenta las entregas) y los aplica al servicio"""
+
+    def __init__(self, dedup_ttl: float = None, max_entries: int = 10000):
+        self._seen = AsyncTTLCache(max_entries, dedup_ttl or settings.WEBHOOK_DEDUP_TTL_SECONDS)
+        self.received = 0
+        self.applied = 0
+        self.duplicates = 0
+        self.stale = 0
+        self.ignored = 0
+
+    async def process(self, payload: dict, service: Optional[PipedriveService], scope: str = "") -> str:
+        """
+        Aplicar un evento. Sin servicio (p. ej. un tenant sin servicio abierto) no hay
+        nada en caché que actualizar y el evento se ignora.
+        """
+        self.received += 1
+        event = parse_person_event(payload)
+        if event is None or service is None:
+            self.ignored += 1
+            return WEBHOOK_IGNORED
+
+        key = (scope, event.event_id)
+        if self._seen.get(key):
+            self.duplicates += 1
+            return WEBHOOK_DUPLICATE
+
+        if event.merged_id:
+            await service.apply_person_change(event.merged_id, None)
+        applied = await service.apply_person_change(event.person_id, event.current, event.previous)
+        # Se marca como visto solo si se aplicó: si falla, la reentrega de Pipedrive se procesa
+        self._seen.set(key, True)
+        if not applied:
+            self.stale += 1
+            return WEBHOOK_STALE
+        self.applied += 1
+        return WEBHOOK_APPLIED
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "applied": self.applied,
+            "duplicates": self.duplicates,
+            "stale": self.stale,
+            "ignored": self.ignored
+        }
+
+
+def create_webhook_processor() -> Optional[PipedriveWebhookProcessor]:
+    """Construir el procesador de webhooks, o None si están desactivados"""
+    if not settings.WEBHOOKS_ENABLED:
+        return None
+    return PipedriveWebhookProcessor()
+
+
+def webhook_credentials(tenant: Optional[TenantConfig] = None) -> Tuple[str, str]:
+    """Usuario y contraseña HTTP Basic del webhook de un tenant, o de la cuenta por defecto"""
+    if tenant is None:
+        return settings.WEBHOOK_USER, settings.WEBHOOK_PASSWORD
+    return tenant.webhook_user or "", tenant.webhook_password or ""
+
+
+async def ensure_person_webhook(
+        service: PipedriveService,
+        subscription_url: str,
+        tenant: Optional[TenantConfig] = None
+) -> dict:
+    """
+    Registrar el webhook de personas si no existe uno activo con la misma URL, con las
+    credenciales del tenant (o de la cuenta por defecto). Retorna el webhook existente o el creado.
+    """
+    for webhook in await service.list_webhooks():
+        if (
+                webhook.get("subscription_url") == subscription_url
+                and webhook.get("event_object") in ("person", "*")
+                and webhook.get("event_action") == "*"
+                and webhook.get("is_active", True)
+        ):
+            return webhook
+
+    user, password = webhook_credentials(tenant)
+    return await service.create_webhook({
+        "subscription_url": subscription_url,
+        "event_action": "*",
+        "event_object": "person",
+        "http_auth_user": user or None,
+        "http_auth_password": password or None,
+        "version": "1.0"
+    })
+
+
+async def _register(subscription_url: str, tenant_id: Optional[str]):
+    tenant = None
+    if tenant_id:
+        tenant = TenantConfigStore(settings.TENANTS_CONFIG_PATH).get(tenant_id)
+        if tenant is None:
+            raise SystemExit(f"Tenant desconocido: {tenant_id}")
+        service = PipedriveService(api_token=tenant.api_token, base_url=tenant.api_url, tenant_id=tenant_id)
+        subscription_url = f"{subscription_url}?{urlencode({'tenant': tenant_id})}"
+    else:
+        service = PipedriveService()
+    try:
+        webhook = await ensure_person_webhook(service, subscription_url, tenant)
+    finally:
+        await service.aclose()
+    print(f"Webhook {webhook.get('id')}: {webhook.get('event_action')}.{webhook.get('event_object')} -> "
+          f"{webhook.get('subscription_url')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("subscription_url", help="URL pública de POST /crm/webhooks/pipedrive")
+    parser.add_argument("--tenant", help="registrar el webhook en la cuenta de un tenant")
+    args = parser.parse_args()
+    asyncio.run(_register(args.subscription_url, args.tenant))
@@ -0,0 +1,86 @@
+"""
+Compara el rendimiento de una importación de contactos usando POST /crm/contact
+elemento por elemento frente a POST /crm/contacts:batch.
+
+La API corre en proceso (ASGITransport) y Pipedrive se simula con el mock sobre TCP.
+
+Uso:
+    python -m benchmarks.bench_batch --rows 10000 --concurrency 20 --batch-size 500
+"""
+import argparse
+import asyncio
+import os
+import time
+
+HOST = "127.0.0.1"
+PORT = 8766
+
+os.environ.setdefault("PIPEDRIVE_API_TOKEN", "benchmark-token")
+os.environ["PIPEDRIVE_API_URL"] = f"http://{HOST}:{PORT}/v1"
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.main import app  # noqa: E402
+from benchmarks.mock_pipedrive import MockPipedriveServer, MockPipedriveState  # noqa: E402
+
+
+def make_rows(prefix: str, total: int) -> list:
+    return [
+        {"name": f"{prefix} {i}", "email": f"{prefix.lower()}{i}@importacion.com", "phone": f"+57 310 {i:07d}"}
+        for i in range(total)
+    ]
+
+
+async def import_single(client: httpx.AsyncClient, rows: list, concurrency: int) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def one(row: dict):
+        nonlocal failures
+        async with semaphore:
+            response = await client.post("/crm/contact", json=row)
+            if response.status_code != 201:
+                failures += 1
+
+    await asyncio.gather(*(one(row) for row in rows))
+    return failures
+
+
+async def import_batch(client: httpx.AsyncClient, rows: list, batch_size: int) -> int:
+    failures = 0
+    for start in range(0, len(rows), batch_size):
+        response = await client.post("/crm/contacts:batch", json={"items": rows[start:start + batch_size]})
+        failures += response.json()["failed"]
+    return failures
+
+
+async def main(rows: int, concurrency: int, batch_size: int):
+    # Misma concurrencia hacia Pipedrive en ambos modos
+    settings.BATCH_CONCURRENCY = concurrency
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=None) as client:
+            print(f"{'modo':<12}{'filas':>8}{'segundos':>10}{'filas/s':>10}{'fallos':>8}")
+            for label, run in (
+                ("individual", lambda data: import_single(client, data, concurrency)),
+                ("lote", lambda data: import_batch(client, data, batch_size))
+            ):
+                data = make_rows(label.capitalize(), rows)
+                start = time.perf_counter()
+                failures = await run(data)
+                elapsed = time.perf_counter() - start
+                print(f"{label:<12}{rows:>8}{elapsed:>10.2f}{rows / elapsed:>10.1f}{failures:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="latencia simulada de Pipedrive (s)")
+    args = parser.parse_args()
+
+    with MockPipedriveServer(MockPipedriveState(latency=args.latency), HOST, PORT):
+        asyncio.run(main(args.rows, args.concurrency, args.batch_size))
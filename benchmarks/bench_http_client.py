@@ -0,0 +1,87 @@
+"""
+Compara la latencia de PipedriveService con un cliente HTTP por llamada
+frente al cliente compartido con keep-alive.
+
+Uso:
+    python -m benchmarks.bench_http_client --requests 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+os.environ.setdefault("PIPEDRIVE_API_TOKEN", "benchmark-token")
+os.environ["PIPEDRIVE_API_URL"] = f"http://{HOST}:{PORT}/v1"
+# El mock no impone cupo; el limitador distorsionaría la medición de latencia
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from app.services.http_client import create_http_client  # noqa: E402
+from app.services.pipedrive_service import PipedriveService  # noqa: E402
+from benchmarks.mock_pipedrive import MockPipedriveServer, MockPipedriveState  # noqa: E402
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(make_call, total: int, concurrency: int) -> list:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await make_call(i)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies
+
+
+async def main(total: int, concurrency: int, dataset: int):
+    async def per_call_client(i: int):
+        # Comportamiento anterior: un AsyncClient nuevo en cada solicitud
+        service = PipedriveService()
+        try:
+            await service.get_person(i % dataset + 1)
+        finally:
+            await service.aclose()
+
+    shared_client = create_http_client()
+    shared_service = PipedriveService(client=shared_client)
+
+    async def pooled_client(i: int):
+        await shared_service.get_person(i % dataset + 1)
+
+    results = {}
+    for label, call in (("cliente por llamada", per_call_client), ("cliente compartido", pooled_client)):
+        await run(call, min(total, 50), concurrency)  # calentamiento
+        results[label] = await run(call, total, concurrency)
+
+    await shared_client.aclose()
+
+    print(f"{'modo':<22}{'p50 (ms)':>10}{'p99 (ms)':>10}{'media (ms)':>12}")
+    for label, samples in results.items():
+        print(
+            f"{label:<22}{percentile(samples, 50):>10.2f}{percentile(samples, 99):>10.2f}"
+            f"{statistics.mean(samples):>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--dataset", type=int, default=100)
+    args = parser.parse_args()
+
+    state = MockPipedriveState()
+    state.seed(args.dataset)
+    with MockPipedriveServer(state, HOST, PORT):
+        asyncio.run(main(args.requests, args.concurrency, args.dataset))
@@ -0,0 +1,70 @@
+"""
+Mide el costo de la instrumentación: MetricsMiddleware sobre una app ASGI trivial
+y el costo de observe() en los histogramas.
+
+Uso:
+    python -m benchmarks.bench_metrics_overhead --iterations 200000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("PIPEDRIVE_API_TOKEN", "benchmark-token")
+
+from app.core.metrics import Histogram, normalize_endpoint  # noqa: E402
+from app.core.middleware import MetricsMiddleware  # noqa: E402
+
+
+async def trivial_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def time_asgi(app, iterations: int) -> float:
+    """Microsegundos por solicitud"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        scope = {"type": "http", "method": "GET", "path": "/crm/contact", "headers": []}
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def time_observe(iterations: int) -> float:
+    """Microsegundos por observe() incluyendo la normalización del endpoint"""
+    histogram = Histogram("bench_seconds", "bench", ("method", "endpoint", "status"))
+    start = time.perf_counter()
+    for i in range(iterations):
+        histogram.observe(0.042, "GET", normalize_endpoint(f"persons/{i % 1000}"), "200")
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main(iterations: int):
+    # Calentamiento
+    await time_asgi(trivial_app, 1000)
+    await time_asgi(MetricsMiddleware(trivial_app), 1000)
+
+    bare = await time_asgi(trivial_app, iterations)
+    instrumented = await time_asgi(MetricsMiddleware(trivial_app), iterations)
+    observe = time_observe(iterations)
+
+    print(f"{'escenario':<28}{'µs/solicitud':>14}")
+    print(f"{'app sin middleware':<28}{bare:>14.2f}")
+    print(f"{'app con MetricsMiddleware':<28}{instrumented:>14.2f}")
+    print(f"{'sobrecosto del middleware':<28}{instrumented - bare:>14.2f}")
+    print(f"{'observe() por llamada':<28}{observe:>14.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
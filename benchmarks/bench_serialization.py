@@ -0,0 +1,143 @@
+"""
+Compara el costo de CPU por solicitud del camino de serialización anterior
+(json estándar, persona completa, validación de response_model) con el actual
+(orjson, proyección de persona, model_construct y respuesta directa).
+
+Uso:
+    python -m benchmarks.bench_serialization --iterations 20000 --rps 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("PIPEDRIVE_API_TOKEN", "benchmark-token")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from app.core.serialization import DefaultJSONResponse, json_loads  # noqa: E402
+from app.schemas.contact import ContactResponse  # noqa: E402
+from app.services.persons import primary_value, project_person  # noqa: E402
+
+
+def pipedrive_person(person_id: int) -> dict:
+    """Persona con la forma y el tamaño aproximados de GET /v1/persons/{id}"""
+    person = {
+        "id": person_id,
+        "company_id": 1234567,
+        "owner_id": {"id": 42, "name": "Agente", "email": "agente@empresa.com", "has_pic": 0,
+                     "pic_hash": None, "active_flag": True, "value": 42},
+        "org_id": {"name": "Empresa S.A.S.", "people_count": 12, "owner_id": 42,
+                   "address": "Calle 100 # 10-20, Bogotá", "active_flag": True, "cc_email": "empresa@pipedrive.com",
+                   "value": 987},
+        "name": f"Contacto {person_id}",
+        "first_name": "Contacto",
+        "last_name": str(person_id),
+        "open_deals_count": 2, "related_open_deals_count": 0, "closed_deals_count": 5,
+        "related_closed_deals_count": 0, "participant_open_deals_count": 0,
+        "participant_closed_deals_count": 0, "email_messages_count": 31, "activities_count": 14,
+        "done_activities_count": 12, "undone_activities_count": 2, "files_count": 3, "notes_count": 8,
+        "followers_count": 1, "won_deals_count": 4, "related_won_deals_count": 0, "lost_deals_count": 1,
+        "related_lost_deals_count": 0, "active_flag": True,
+        "phone": [{"label": "work", "value": f"+57 300 {person_id:07d}", "primary": True},
+                  {"label": "mobile", "value": f"+57 310 {person_id:07d}", "primary": False}],
+        "email": [{"label": "work", "value": f"contacto{person_id}@ejemplo.com", "primary": True},
+                  {"label": "home", "value": f"personal{person_id}@correo.com", "primary": False}],
+        "first_char": "c", "update_time": "2026-01-15 10:20:30", "delete_time": None,
+        "add_time": "2024-03-02 08:00:00", "visible_to": "3", "picture_id": None,
+        "next_activity_date": "2026-02-01", "next_activity_time": None, "next_activity_id": 5561,
+        "last_activity_id": 5560, "last_activity_date": "2026-01-14",
+        "last_incoming_mail_time": "2026-01-10 09:00:00", "last_outgoing_mail_time": "2026-01-11 15:30:00",
+        "label": 5, "label_ids": [5, 7], "org_name": "Empresa S.A.S.", "owner_name": "Agente",
+        "cc_email": "empresa@pipedrive.com", "im": [{"value": "", "primary": True}],
+        "postal_address": "Calle 100 # 10-20", "postal_address_locality": "Bogotá",
+        "postal_address_country": "Colombia", "birthday": None, "job_title": "Gerente de compras",
+        "marketing_status": "subscribed",
+    }
+    # Campos personalizados (claves hash de 40 caracteres)
+    for i in range(30):
+        person[f"{i:040x}"] = f"valor personalizado {i} del contacto {person_id}"
+    return person
+
+
+async def run_old(body: bytes, field) -> bytes:
+    person = json.loads(body)["data"]
+    model = ContactResponse(
+        success=True,
+        message=f"Contacto '{person['name']}' actualizado exitosamente",
+        contact_id=person["id"],
+        contact_url=f"https://app.pipedrive.com/person/{person['id']}",
+        data={
+            "id": person.get("id"),
+            "name": person.get("name"),
+            "email": person.get("email", [{}])[0].get("value") if person.get("email") else None,
+            "phone": person.get("phone", [{}])[0].get("value") if person.get("phone") else None,
+            "update_time": person.get("update_time")
+        }
+    )
+    # Lo que hace FastAPI con response_model al retornar el modelo
+    content = await serialize_response(field=field, response_content=model)
+    return JSONResponse(content=content).body
+
+
+async def run_new(body: bytes) -> bytes:
+    person = project_person(json_loads(body)["data"])
+    model = ContactResponse.model_construct(
+        success=True,
+        message=f"Contacto '{person['name']}' actualizado exitosamente",
+        contact_id=person["id"],
+        contact_url=f"https://app.pipedrive.com/person/{person['id']}",
+        data={
+            "id": person.get("id"),
+            "name": person.get("name"),
+            "email": primary_value(person.get("email")),
+            "phone": primary_value(person.get("phone")),
+            "update_time": person.get("update_time")
+        }
+    )
+    return DefaultJSONResponse(content=model.model_dump()).body
+
+
+async def measure(fn, bodies: list, iterations: int) -> float:
+    """Microsegundos de CPU por solicitud"""
+    start = time.process_time()
+    for i in range(iterations):
+        await fn(bodies[i % len(bodies)])
+    return (time.process_time() - start) / iterations * 1e6
+
+
+async def main(iterations: int, rps: int):
+    bodies = [json.dumps({"success": True, "data": pipedrive_person(i)}).encode() for i in range(1, 101)]
+    field = create_response_field(name="response", type_=ContactResponse)
+
+    async def old(body):
+        return await run_old(body, field)
+
+    assert json.loads(await old(bodies[0])) == json.loads(await run_new(bodies[0]))
+
+    # Calentamiento
+    await measure(old, bodies, 500)
+    await measure(run_new, bodies, 500)
+
+    before = await measure(old, bodies, iterations)
+    after = await measure(run_new, bodies, iterations)
+
+    full = pipedrive_person(1)
+    print(f"{'camino':<12}{'µs CPU/solicitud':>18}{f'ms CPU/s a {rps} rps':>24}")
+    print(f"{'anterior':<12}{before:>18.1f}{before * rps / 1000:>24.1f}")
+    print(f"{'actual':<12}{after:>18.1f}{after * rps / 1000:>24.1f}")
+    print(f"\nAhorro: {before - after:.1f} µs por solicitud ({(before - after) / before:.0%}), "
+          f"{(before - after) * rps / 1000:.1f} ms de CPU por segundo a {rps} rps")
+    print(f"Tamaño de la persona en caché (JSON): completa {len(json.dumps(full))} B, "
+          f"proyección {len(json.dumps(project_person(full)))} B")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--rps", type=int, default=500, help="tasa para expresar el ahorro en ms de CPU por segundo")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.rps))
@@ -0,0 +1,231 @@
+"""
+Prueba de carga de la API contra el mock de Pipedrive.
+
+Ejecuta POST /crm/contact, POST /crm/contact/note y PATCH /crm/contact con
+niveles fijos de concurrencia y reporta throughput, latencia p50/p95/p99 y
+llamadas a Pipedrive por solicitud (leídas del encabezado Server-Timing).
+Los resultados se guardan en JSON para comparar corridas y detectar regresiones.
+
+La API corre en proceso (ASGITransport) y Pipedrive se simula con el mock sobre TCP.
+
+Uso:
+    python -m benchmarks.load_test --concurrency 1 10 50 --requests 500 --output resultados.json
+    python -m benchmarks.load_test --output nuevo.json --compare resultados.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+HOST = "127.0.0.1"
+PORT = 8767
+
+os.environ.setdefault("PIPEDRIVE_API_TOKEN", "benchmark-token")
+os.environ["PIPEDRIVE_API_URL"] = f"http://{HOST}:{PORT}/v1"
+# El mock no impone cupo; el limitador distorsionaría la medición de latencia
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+from benchmarks.mock_pipedrive import MockPipedriveServer, MockPipedriveState  # noqa: E402
+
+SCENARIOS = ("create_contact", "add_note", "update_contact")
+
+_UPSTREAM_CALLS = re.compile(r'pipedrive;dur=[\d.]+;desc="(\d+) calls"')
+
+# Métricas donde un aumento es una regresión (el resto: una disminución)
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "upstream_calls_per_request", "error_rate")
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def upstream_calls(response: httpx.Response) -> int:
+    match = _UPSTREAM_CALLS.search(response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else 0
+
+
+class Workload:
+    """Genera las solicitudes de cada escenario sobre el dataset del mock"""
+
+    def __init__(self, dataset: int, seed: int):
+        self.dataset = dataset
+        self._random = random.Random(seed)
+        self._created = 0
+
+    def existing_email(self) -> str:
+        return f"contacto{self._random.randrange(self.dataset)}@ejemplo.com"
+
+    def request(self, scenario: str) -> tuple:
+        if scenario == "create_contact":
+            # Mitad contactos nuevos, mitad ya existentes (camino de idempotencia)
+            if self._random.random() < 0.5:
+                self._created += 1
+                n = self._created
+                return "POST", "/crm/contact", {
+                    "name": f"Carga {n}", "email": f"carga{n}@ejemplo.com", "phone": f"+57 310 {n:07d}"
+                }
+            i = self._random.randrange(self.dataset)
+            return "POST", "/crm/contact", {"name": f"Contacto {i}", "email": f"contacto{i}@ejemplo.com"}
+        if scenario == "add_note":
+            return "POST", "/crm/contact/note", {
+                "contact_identifier": self.existing_email(), "content": "Nota de prueba de carga"
+            }
+        return "PATCH", "/crm/contact", {
+            "contact_identifier": self.existing_email(),
+            "fields": {"phone": f"+57 320 {self._random.randrange(10 ** 7):07d}"}
+        }
+
+
+async def run_level(
+        client: httpx.AsyncClient,
+        workload: Workload,
+        scenario: str,
+        concurrency: int,
+        total: int
+) -> dict:
+    latencies = []
+    calls = []
+    errors = 0
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        method, path, body = workload.request(scenario)
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append((time.perf_counter() - start) * 1000)
+        calls.append(upstream_calls(response))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code >= 400:
+            errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": total,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "upstream_calls_per_request": round(sum(calls) / total, 3),
+        "error_rate": round(errors / total, 4),
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())}
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocida"
+
+
+def print_results(results: list):
+    print(f"{'escenario':<16}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'llamadas':>10}{'errores':>9}")
+    for r in results:
+        print(f"{r['scenario']:<16}{r['concurrency']:>6}{r['throughput_rps']:>10.1f}{r['p50_ms']:>10.2f}"
+              f"{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['upstream_calls_per_request']:>10.2f}"
+              f"{r['error_rate']:>9.2%}")
+
+
+def compare(current: list, baseline: list, threshold: float) -> bool:
+    """Imprimir la variación frente a una corrida anterior; retorna True si hay regresiones"""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline}
+    regressions = False
+    print(f"\nComparación (umbral de regresión {threshold:.0%}):")
+    for r in current:
+        base = previous.get((r["scenario"], r["concurrency"]))
+        if base is None:
+            continue
+        for metric in ("throughput_rps",) + LOWER_IS_BETTER:
+            old, new = base[metric], r[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            regressions = regressions or worse
+            flag = "  REGRESIÓN" if worse else ""
+            print(f"  {r['scenario']:<16}c={r['concurrency']:<4}{metric:<28}{old:>10}{new:>10}{change:>+9.1%}{flag}")
+    return regressions
+
+
+async def main(args) -> list:
+    workload = Workload(args.dataset, args.seed)
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=None) as client:
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    results.append(await run_level(client, workload, scenario, concurrency, args.requests))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=500, help="solicitudes por escenario y concurrencia")
+    parser.add_argument("--dataset", type=int, default=10000, help="personas precargadas en el mock")
+    parser.add_argument("--latency", type=float, default=0.02, help="latencia simulada de Pipedrive (s)")
+    parser.add_argument("--jitter", type=float, default=0.005, help="variación de la latencia (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 503 del mock")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=0.10, help="variación tolerada antes de marcar regresión")
+    args = parser.parse_args()
+
+    state = MockPipedriveState(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    state.seed(args.dataset)
+    with MockPipedriveServer(state, HOST, PORT):
+        results = asyncio.run(main(args))
+
+    print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "dataset": args.dataset,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+            "mock_requests": state.requests
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline["results"], args.threshold):
+            sys.exit(1)
@@ -0,0 +1,300 @@
+"""
+Servidor simulado de la API v1 de Pipedrive para benchmarks locales.
+
+Implementa solo los endpoints que usa PipedriveService:
+persons/search, persons (GET/POST), persons/{id} (GET/PUT), personFields, notes y webhooks (GET/POST).
+La latencia, su variación y la tasa de errores 5xx son configurables.
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+_ID_SEGMENT = re.compile(r"/\d+")
+
+
+class MockPipedriveState:
+    """Almacenamiento en memoria de personas y notas"""
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            seed: Optional[int] = None
+    ):
+        self.latency = latency
+        # Variación uniforme de la latencia (+/- jitter segundos)
+        self.jitter = jitter
+        # Fracción de solicitudes que responden 503
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        # Solicitudes recibidas por "MÉTODO ruta"
+        self.requests = {}
+        self.persons = {}
+        self.notes = {}
+        self.webhooks = []
+        self.person_fields = [
+            {"id": 1, "key": "name", "name": "Nombre", "field_type": "varchar", "edit_flag": False},
+            {"id": 2, "key": "email", "name": "Correo electrónico", "field_type": "varchar", "edit_flag": False},
+            {"id": 3, "key": "phone", "name": "Teléfono", "field_type": "phone", "edit_flag": False},
+            {"id": 4, "key": "org_id", "name": "Organización", "field_type": "org", "edit_flag": False},
+            {"id": 5, "key": "owner_id", "name": "Propietario", "field_type": "user", "edit_flag": False},
+            {"id": 6, "key": "label", "name": "Etiqueta", "field_type": "enum", "edit_flag": False,
+             "options": [{"id": 1, "label": "Cliente"}, {"id": 2, "label": "Prospecto"}]},
+            {"id": 7, "key": "5f3a0d1c9e8b7a6f5e4d3c2b1a0f9e8d7c6b5a49", "name": "Industria",
+             "field_type": "enum", "edit_flag": True,
+             "options": [{"id": 11, "label": "Tecnología"}, {"id": 12, "label": "Salud"}]},
+            {"id": 8, "key": "a1b2c3d4e5f60718293a4b5c6d7e8f9012345678", "name": "Empleados",
+             "field_type": "int", "edit_flag": True},
+        ]
+        # Índice de palabras -> IDs para que la búsqueda no recorra todo el dataset
+        self._words = {}
+        self._next_person_id = 1
+        self._next_note_id = 1
+
+    def _now(self) -> str:
+        return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+    def add_person(self, name: str, email: Optional[str] = None, phone: Optional[str] = None) -> dict:
+        person_id = self._next_person_id
+        self._next_person_id += 1
+        person = {
+            "id": person_id,
+            "name": name,
+            "email": [{"value": email, "primary": True}] if email else [],
+            "phone": [{"value": phone, "primary": True}] if phone else [],
+            "add_time": self._now(),
+            "update_time": self._now()
+        }
+        self.persons[person_id] = person
+        self.index_person(person)
+        return person
+
+    @staticmethod
+    def _tokens(text: str) -> set:
+        return set(re.findall(r"[\w]+", text.lower()))
+
+    def index_person(self, person: dict):
+        text = " ".join([person["name"]] + [e["value"] for e in person["email"]])
+        for word in self._tokens(text):
+            self._words.setdefault(word, set()).add(person["id"])
+
+    def candidates(self, term: str) -> list:
+        """Personas que contienen todas las palabras del término"""
+        words = self._tokens(term)
+        if not words:
+            return []
+        ids = set.intersection(*(self._words.get(w, set()) for w in words))
+        return [self.persons[i] for i in sorted(ids) if i in self.persons]
+
+    def record_request(self, method: str, path: str):
+        key = f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def seed(self, size: int):
+        for i in range(size):
+            self.add_person(f"Contacto {i}", f"contacto{i}@ejemplo.com", f"+57 300 {i:07d}")
+
+
+def create_mock_app(state: MockPipedriveState) -> FastAPI:
+    """Crea la aplicación ASGI que imita a Pipedrive"""
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def simulate_failures(request: Request, call_next):
+        state.record_request(request.method, request.url.path)
+        if state.error_rate and state._random.random() < state.error_rate:
+            await simulate_latency()
+            return JSONResponse(status_code=503, content={"success": False, "error": "Service unavailable"})
+        return await call_next(request)
+
+    async def simulate_latency():
+        delay = state.latency
+        if state.jitter:
+            delay += state._random.uniform(-state.jitter, state.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @app.get("/v1/persons/search")
+    async def search_persons(
+            term: str,
+            fields: str = "name,email",
+            exact_match: str = "false",
+            start: int = 0,
+            limit: int = 100
+    ):
+        await simulate_latency()
+        term_lower = term.lower()
+        items = []
+        for person in state.candidates(term):
+            emails = [e["value"] for e in person["email"]]
+            candidates = []
+            if "name" in fields:
+                candidates.append(person["name"])
+            if "email" in fields:
+                candidates.extend(emails)
+            if exact_match == "true":
+                matched = any(c.lower() == term_lower for c in candidates)
+            else:
+                matched = any(term_lower in c.lower() for c in candidates)
+            if matched:
+                items.append({
+                    "result_score": 1.0,
+                    "item": {
+                        "id": person["id"],
+                        "type": "person",
+                        "name": person["name"],
+                        "emails": emails,
+                        "phones": [p["value"] for p in person["phone"]]
+                    }
+                })
+        more = start + limit < len(items)
+        return {
+            "success": True,
+            "data": {"items": items[start:start + limit]},
+            "additional_data": {
+                "pagination": {
+                    "start": start,
+                    "limit": limit,
+                    "more_items_in_collection": more,
+                    "next_start": start + limit if more else None
+                }
+            }
+        }
+
+    @app.get("/v1/persons")
+    async def list_persons(start: int = 0, limit: int = 100, sort: Optional[str] = None):
+        await simulate_latency()
+        persons = list(state.persons.values())
+        if sort == "update_time DESC":
+            persons.sort(key=lambda p: (p["update_time"], p["id"]), reverse=True)
+        page = persons[start:start + limit]
+        more = start + limit < len(persons)
+        return {
+            "success": True,
+            "data": page,
+            "additional_data": {
+                "pagination": {
+                    "start": start,
+                    "limit": limit,
+                    "more_items_in_collection": more,
+                    "next_start": start + limit if more else None
+                }
+            }
+        }
+
+    @app.get("/v1/persons/{person_id}")
+    async def get_person(person_id: int):
+        await simulate_latency()
+        person = state.persons.get(person_id)
+        if not person:
+            return JSONResponse(status_code=404, content={"success": False, "error": "Person not found"})
+        return {"success": True, "data": person}
+
+    @app.post("/v1/persons")
+    async def create_person(request: Request):
+        await simulate_latency()
+        body = await request.json()
+        email = (body.get("email") or [{}])[0].get("value")
+        phone = (body.get("phone") or [{}])[0].get("value")
+        person = state.add_person(body["name"], email, phone)
+        # Campos adicionales (p. ej. personalizados) incluidos en la creación
+        person.update({k: v for k, v in body.items() if k not in ("name", "email", "phone")})
+        return JSONResponse(status_code=201, content={"success": True, "data": person})
+
+    @app.put("/v1/persons/{person_id}")
+    async def update_person(person_id: int, request: Request):
+        await simulate_latency()
+        person = state.persons.get(person_id)
+        if not person:
+            return JSONResponse(status_code=404, content={"success": False, "error": "Person not found"})
+        body = await request.json()
+        for key in ("email", "phone"):
+            if isinstance(body.get(key), str):
+                body[key] = [{"value": body[key], "primary": True}]
+        person.update(body)
+        person["update_time"] = state._now()
+        state.index_person(person)
+        return {"success": True, "data": person}
+
+    @app.get("/v1/personFields")
+    async def list_person_fields(start: int = 0, limit: int = 100):
+        await simulate_latency()
+        page = state.person_fields[start:start + limit]
+        more = start + limit < len(state.person_fields)
+        return {
+            "success": True,
+            "data": page,
+            "additional_data": {"pagination": {
+                "start": start, "limit": limit, "more_items_in_collection": more,
+                **({"next_start": start + limit} if more else {})
+            }}
+        }
+
+    @app.post("/v1/notes")
+    async def add_note(request: Request):
+        await simulate_latency()
+        body = await request.json()
+        note_id = state._next_note_id
+        state._next_note_id += 1
+        note = {
+            "id": note_id,
+            "content": body["content"],
+            "person_id": body["person_id"],
+            "add_time": state._now()
+        }
+        state.notes[note_id] = note
+        return JSONResponse(status_code=201, content={"success": True, "data": note})
+
+    @app.get("/v1/webhooks")
+    async def list_webhooks():
+        await simulate_latency()
+        return {"success": True, "data": state.webhooks}
+
+    @app.post("/v1/webhooks")
+    async def create_webhook(request: Request):
+        await simulate_latency()
+        body = await request.json()
+        webhook = {"id": len(state.webhooks) + 1, "is_active": True, **body}
+        state.webhooks.append(webhook)
+        return JSONResponse(status_code=201, content={"success": True, "data": webhook})
+
+    return app
+
+
+class MockPipedriveServer:
+    """Ejecuta el mock en un hilo con uvicorn sobre un puerto TCP real"""
+
+    def __init__(self, state: MockPipedriveState, host: str = "127.0.0.1", port: int = 8765):
+        self.state = state
+        self.host = host
+        self.port = port
+        config = uvicorn.Config(create_mock_app(state), host=host, port=port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join()
@@ -0,0 +1,52 @@
+"""
+Fixtures comunes: Pipedrive se simula con benchmarks/mock_pipedrive.py sobre un puerto
+TCP libre, igual que en las pruebas de carga.
+"""
+import os
+import socket
+
+# La configuración se lee al importar la aplicación
+os.environ.setdefault("PIPEDRIVE_API_TOKEN", "test-token")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from benchmarks.mock_pipedrive import MockPipedriveServer, MockPipedriveState  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def pipedrive_state() -> MockPipedriveState:
+    """Estado del mock; cada prueba puede ajustar la latencia o agregar personas"""
+    return MockPipedriveState(seed=1)
+
+
+@pytest.fixture
+def pipedrive(pipedrive_state, monkeypatch):
+    """Mock de Pipedrive en ejecución; la configuración apunta a él"""
+    with MockPipedriveServer(pipedrive_state, port=free_port()) as server:
+        monkeypatch.setattr(settings, "PIPEDRIVE_API_URL", server.base_url)
+        yield server
+
+
+@pytest.fixture
+async def api(pipedrive):
+    """Cliente HTTP de la API en proceso, con el lifespan completo"""
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+            yield client
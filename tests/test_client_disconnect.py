@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.middleware import CLIENT_DISCONNECTED, ClientDisconnectMiddleware
+from app.services.note_pipeline import NotePipeline
+
+pytestmark = pytest.mark.anyio
+
+
+def http_scope() -> dict:
+    return {"type": "http", "method": "POST", "path": "/crm/contact/note", "headers": []}
+
+
+def disconnecting_receive(disconnect: asyncio.Event):
+    """Entrega el cuerpo y, cuando se indica, la desconexión del cliente"""
+    messages = [{"type": "http.request", "body": b"{}", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+async def test_disconnect_cancels_the_request(monkeypatch):
+    monkeypatch.setattr(settings, "CANCEL_ON_DISCONNECT", True)
+    started, disconnect = asyncio.Event(), asyncio.Event()
+    cancelled = False
+    sent = []
+
+    async def app(scope, receive, send):
+        nonlocal cancelled
+        await receive()
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    async def send(message):
+        sent.append(message)
+
+    scope = http_scope()
+    call = asyncio.ensure_future(ClientDisconnectMiddleware(app)(scope, disconnecting_receive(disconnect), send))
+    await started.wait()
+    disconnect.set()
+    await asyncio.wait_for(call, 1)
+
+    assert cancelled
+    assert scope[CLIENT_DISCONNECTED] is True
+    assert sent == []
+
+
+async def test_disconnect_withdraws_queued_notes(monkeypatch):
+    monkeypatch.setattr(settings, "CANCEL_ON_DISCONNECT", True)
+    writing, release, disconnect = asyncio.Event(), asyncio.Event(), asyncio.Event()
+    written = []
+
+    async def write(person_id, content):
+        writing.set()
+        await release.wait()
+        written.append(content)
+        return {"id": len(written), "content": content}
+
+    pipeline = NotePipeline(write, concurrency=1, max_merge=1, merge_window=0)
+    # Otra solicitud ocupa la escritura del contacto
+    first = asyncio.ensure_future(pipeline.submit(7, "primera"))
+    await writing.wait()
+
+    async def app(scope, receive, send):
+        await receive()
+        await pipeline.submit(7, "segunda")
+
+    async def send(message):
+        pass
+
+    call = asyncio.ensure_future(
+        ClientDisconnectMiddleware(app)(http_scope(), disconnecting_receive(disconnect), send)
+    )
+    await asyncio.sleep(0.01)
+    assert pipeline.stats()["notes_pending"] == 1
+    disconnect.set()
+    await asyncio.wait_for(call, 1)
+
+    # La nota en cola se retira; la que ya se estaba escribiendo termina
+    assert pipeline.stats()["notes_pending"] == 0
+    release.set()
+    assert (await first)["content"] == "primera"
+    await pipeline.aclose()
+    assert written == ["primera"]
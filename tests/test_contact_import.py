@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services.contact_import import csv_rows, iter_lines
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def collect(rows) -> list:
+    return [row async for row in rows]
+
+
+async def test_unterminated_quote_is_reported_and_reading_resumes():
+    filler = [f"Relleno {i},relleno{i}@ejemplo.com" for i in range(10)]
+    body = "\n".join(
+        ["name,email", "Uno,uno@ejemplo.com", '"Dos,dos@ejemplo.com'] + filler + ["Tres,tres@ejemplo.com"]
+    ).encode()
+
+    rows = await collect(csv_rows(iter_lines(chunks(body), 1024), max_record_bytes=200))
+
+    assert rows[0] == (0, {"name": "Uno", "email": "uno@ejemplo.com"})
+    index, error = rows[1]
+    assert (index, error.status_code) == (1, 422)
+    # Tras el error la lectura sigue en la línea siguiente y las filas posteriores se importan
+    assert rows[-1] == (len(rows) - 1, {"name": "Tres", "email": "tres@ejemplo.com"})
+    assert all(isinstance(data, dict) for _, data in rows[2:])
+
+
+async def test_unterminated_quote_at_end_is_reported():
+    body = 'name,email\nUno,uno@ejemplo.com\n"Dos,dos@ejemplo.com\n'.encode()
+
+    rows = await collect(csv_rows(iter_lines(chunks(body), 1024)))
+
+    assert len(rows) == 2
+    assert rows[1][1].status_code == 422
+
+
+async def test_record_limit_counts_encoded_bytes():
+    # 60 caracteres, 120 bytes en UTF-8
+    body = ("name\n" + "ñ" * 60 + "\nAna\n").encode()
+
+    rows = await collect(csv_rows(iter_lines(chunks(body), 100)))
+
+    assert rows[0][1].status_code == 422
+    assert rows[1] == (1, {"name": "Ana"})
+
+
+async def test_import_route_keeps_importing_after_a_broken_row(api, pipedrive_state, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_MAX_LINE_BYTES", 200)
+    filler = "\n".join(f"Relleno {i},relleno{i}@ejemplo.com" for i in range(10))
+    body = f'name,email\nUno,uno@ejemplo.com\n"Dos,dos@ejemplo.com\n{filler}\nTres,tres@ejemplo.com\n'
+
+    response = await api.post("/crm/contacts:import", content=body.encode(), headers={"Content-Type": "text/csv"})
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    summary = lines[-1]["summary"]
+    assert summary["failed"] == 1
+    assert summary["succeeded"] == summary["total"] - 1
+    names = {person["name"] for person in pipedrive_state.persons.values()}
+    assert {"Uno", "Tres"} <= names
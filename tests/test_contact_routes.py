@@ -0,0 +1,51 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_unknown_id_returns_404(api, pipedrive_state):
+    response = await api.get("/crm/contact/99999")
+
+    assert response.status_code == 404
+    assert pipedrive_state.requests.get("GET /v1/persons/{id}") == 1
+
+
+async def test_update_unknown_id_returns_404(api, pipedrive_state):
+    response = await api.patch("/crm/contact", json={"contact_identifier": "99999", "fields": {"name": "Nadie"}})
+
+    assert response.status_code == 404
+    assert not pipedrive_state.requests.get("PUT /v1/persons/{id}")
+
+
+async def test_matching_etag_returns_304(api, pipedrive_state):
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+
+    response = await api.get(f"/crm/contact/{person['id']}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "max-age" in response.headers["cache-control"]
+
+    not_modified = await api.get(f"/crm/contact/{person['id']}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    # Comparación débil: W/"..." también coincide
+    weak = await api.get(f"/crm/contact/{person['id']}", headers={"If-None-Match": f"W/{etag}"})
+    assert weak.status_code == 304
+
+
+async def test_changed_contact_returns_new_etag(api, pipedrive_state):
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+    etag = (await api.get(f"/crm/contact/{person['id']}")).headers["etag"]
+
+    updated = await api.patch("/crm/contact", json={
+        "contact_identifier": str(person["id"]),
+        "fields": {"name": "Ana Pérez Gómez"}
+    })
+    assert updated.status_code == 200, updated.text
+
+    response = await api.get(f"/crm/contact/{person['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["data"]["name"] == "Ana Pérez Gómez"
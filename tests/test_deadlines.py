@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.context import request_deadline
+from app.core.exceptions import DeadlineExceededException
+from app.services.circuit_breaker import CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CircuitBreaker
+from app.services.note_pipeline import NotePipeline
+from app.services.pipedrive_service import PipedriveService
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def service(pipedrive):
+    service = PipedriveService(circuit_breaker=CircuitBreaker(failure_threshold=1, recovery_seconds=0.05))
+    yield service
+    await service.aclose()
+
+
+def writes(pipedrive_state) -> int:
+    return sum(count for call, count in pipedrive_state.requests.items() if call.split()[0] in ("POST", "PUT"))
+
+
+async def test_no_writes_after_the_deadline(service, pipedrive_state):
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+    request_deadline.set(time.monotonic() - 1)
+
+    with pytest.raises(DeadlineExceededException):
+        await service.create_person({"name": "Carlos Ruiz"})
+    with pytest.raises(DeadlineExceededException):
+        await service.update_person(person["id"], {"name": "Ana Gómez"})
+
+    assert writes(pipedrive_state) == 0
+
+
+async def test_note_expired_in_queue_is_not_written():
+    written = []
+    release = asyncio.Event()
+
+    async def write(person_id, content):
+        await release.wait()
+        written.append(content)
+        return {"id": len(written), "content": content}
+
+    pipeline = NotePipeline(write, concurrency=1, max_merge=1, merge_window=0)
+    first = pipeline.enqueue(7, "primera")
+    second = pipeline.enqueue(7, "segunda", deadline=time.monotonic() + 0.02)
+    await asyncio.sleep(0.05)
+    release.set()
+
+    assert (await first)["content"] == "primera"
+    with pytest.raises(DeadlineExceededException):
+        await second
+    assert written == ["primera"]
+    assert pipeline.stats()["failed"] == 1
+
+
+async def test_waiter_with_budget_outlives_the_leader_deadline(service, pipedrive_state):
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+    pipedrive_state.latency = 0.2
+
+    async def get(budget):
+        request_deadline.set(None if budget is None else time.monotonic() + budget)
+        return await service.get_person(person["id"])
+
+    leader = asyncio.ensure_future(get(0.05))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.ensure_future(get(None))
+
+    with pytest.raises(DeadlineExceededException):
+        await leader
+    assert (await waiter)["id"] == person["id"]
+
+
+async def test_deadline_timeout_does_not_close_the_circuit(service, pipedrive_state):
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+    breaker = service.circuit_breaker
+    breaker.record(0.0, True)
+    await asyncio.sleep(0.06)
+    assert breaker.state == CIRCUIT_HALF_OPEN
+
+    pipedrive_state.latency = 0.2
+    request_deadline.set(time.monotonic() + 0.05)
+    with pytest.raises(DeadlineExceededException):
+        await service.get_person(person["id"])
+
+    # La prueba se liberó sin resultado: el circuito sigue semiabierto y admite otra
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    request_deadline.set(None)
+    pipedrive_state.latency = 0.0
+    assert (await service.get_person(person["id"]))["id"] == person["id"]
+    assert breaker.state == CIRCUIT_CLOSED
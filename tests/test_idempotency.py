@@ -0,0 +1,72 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.idempotency import IdempotencyRecord, SQLiteIdempotencyStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def job_settings(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "JOBS_ENABLED", True)
+    monkeypatch.setattr(settings, "JOBS_DB_PATH", str(tmp_path / "jobs.db"))
+
+
+@pytest.fixture
+async def jobs_api(job_settings, api):
+    """Cliente de la API con la cola de trabajos activa"""
+    return api
+
+
+async def test_async_note_keeps_its_headers_on_replay(api, pipedrive_state):
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+    headers = {"Idempotency-Key": "nota-1", "Prefer": "respond-async"}
+    note = {"contact_identifier": str(person["id"]), "content": "Llamada de seguimiento"}
+
+    first = await api.post("/crm/contact/note", json=note, headers=headers)
+    replay = await api.post("/crm/contact/note", json=note, headers=headers)
+
+    assert first.status_code == replay.status_code == 202
+    assert first.headers["preference-applied"] == replay.headers["preference-applied"] == "respond-async"
+    assert "idempotent-replayed" not in first.headers
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert replay.json() == first.json()
+
+
+async def test_enqueued_job_keeps_location_on_replay(jobs_api):
+    headers = {"Idempotency-Key": "alta-1", "Prefer": "respond-async"}
+    contact = {"name": "Carlos Ruiz", "email": "carlos@ejemplo.com"}
+
+    first = await jobs_api.post("/crm/contact", json=contact, headers=headers)
+    replay = await jobs_api.post("/crm/contact", json=contact, headers=headers)
+
+    assert first.status_code == replay.status_code == 202
+    location = first.headers["location"]
+    assert location == first.json()["status_url"]
+    assert replay.headers["location"] == location
+    assert replay.headers["preference-applied"] == "respond-async"
+    assert replay.json()["job_id"] == first.json()["job_id"]
+
+
+async def test_sqlite_store_adds_the_headers_column(tmp_path):
+    path = str(tmp_path / "idempotency.db")
+    # Esquema de versiones anteriores, sin la columna de encabezados
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE idempotency_keys (key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+        "status_code INTEGER NOT NULL, body TEXT NOT NULL, expires_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO idempotency_keys VALUES ('vieja', 'f', 201, '{}', ?)", (time.time() + 60,))
+    conn.commit()
+    conn.close()
+
+    store = SQLiteIdempotencyStore(path)
+    try:
+        assert (await store.get("vieja")).headers == {}
+        await store.save("nueva", IdempotencyRecord("f", 202, {}, time.time() + 60, {"Location": "/crm/jobs/1"}))
+        assert (await store.get("nueva")).headers == {"Location": "/crm/jobs/1"}
+    finally:
+        store.close()
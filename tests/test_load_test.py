@@ -0,0 +1,36 @@
+import argparse
+
+import pytest
+
+from benchmarks import load_test
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_load_test_runs_a_scenario_against_the_mock(pipedrive, pipedrive_state):
+    pipedrive_state.seed(20)
+    args = argparse.Namespace(
+        scenarios=["update_contact"], concurrency=[4], requests=20, dataset=20, seed=1
+    )
+
+    results = await load_test.main(args)
+
+    assert len(results) == 1
+    result = results[0]
+    assert result["scenario"] == "update_contact"
+    assert result["requests"] == 20
+    assert result["error_rate"] == 0
+    assert result["status_codes"] == {"200": 20}
+    assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    # Server-Timing: resolución del contacto y PUT (o ninguno si no cambió)
+    assert result["upstream_calls_per_request"] > 0
+    assert pipedrive_state.requests.get("PUT /v1/persons/{id}")
+
+
+def test_compare_flags_regressions():
+    baseline = [{"scenario": "add_note", "concurrency": 1, "throughput_rps": 100, "p50_ms": 10, "p95_ms": 20,
+                 "p99_ms": 30, "upstream_calls_per_request": 2, "error_rate": 0}]
+    slower = [dict(baseline[0], p95_ms=30)]
+
+    assert load_test.compare(slower, baseline, 0.10)
+    assert not load_test.compare(baseline, baseline, 0.10)
@@ -0,0 +1,58 @@
+import pytest
+
+from app.core.metrics import CRM_ERRORS
+
+pytestmark = pytest.mark.anyio
+
+
+def errors() -> dict:
+    return dict(CRM_ERRORS._values)
+
+
+def increments(before: dict) -> dict:
+    after = errors()
+    return {labels: after[labels] - before.get(labels, 0.0) for labels in after if after[labels] != before.get(labels)}
+
+
+async def test_failed_request_counts_one_error(api):
+    before = errors()
+
+    response = await api.get("/crm/contact/99999")
+
+    assert response.status_code == 404
+    # _fetch_person y la búsqueda de respaldo manejan excepciones internas que no se cuentan
+    assert increments(before) == {("ContactNotFoundException",): 1.0}
+
+
+async def test_global_handler_counts_the_exception(api, pipedrive_state):
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+    before = errors()
+
+    response = await api.patch("/crm/contact", json={
+        "contact_identifier": str(person["id"]),
+        "fields": {"Industria": "Minería"}
+    })
+
+    assert response.status_code == 422
+    assert increments(before) == {("ValidationException",): 1.0}
+
+
+async def test_batch_counts_each_failed_item(api):
+    before = errors()
+
+    response = await api.post("/crm/contact/notes:batch", json={"items": [
+        {"contact_identifier": "99998", "content": "Uno"},
+        {"contact_identifier": "99999", "content": "Dos"}
+    ]})
+
+    assert response.status_code == 200
+    assert increments(before) == {("ContactNotFoundException",): 2.0}
+
+
+async def test_successful_request_counts_nothing(api, pipedrive_state):
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+    before = errors()
+
+    assert (await api.get(f"/crm/contact/{person['id']}")).status_code == 200
+    assert (await api.get("/crm/contact/ana@ejemplo.com")).status_code == 200
+    assert increments(before) == {}
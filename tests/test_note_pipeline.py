@@ -0,0 +1,94 @@
+import asyncio
+import re
+
+import pytest
+
+from app.core.context import RequestTrace, request_trace
+from app.core.exceptions import CRMException
+from app.services.note_pipeline import NotePipeline
+
+pytestmark = pytest.mark.anyio
+
+_UPSTREAM_CALLS = re.compile(r'pipedrive;dur=[\d.]+;desc="(\d+) calls"')
+
+
+async def test_merged_write_is_attributed_to_each_waiter():
+    async def write(person_id, content):
+        await asyncio.sleep(0.01)
+        request_trace.get().record_upstream(0.01)
+        return {"id": 1, "content": content}
+
+    pipeline = NotePipeline(write, concurrency=1, max_merge=5, merge_window=0.02)
+    traces = [RequestTrace() for _ in range(3)]
+
+    async def submit(trace, content):
+        request_trace.set(trace)
+        return await pipeline.submit(7, content)
+
+    notes = await asyncio.gather(*(submit(trace, f"nota {i}") for i, trace in enumerate(traces)))
+
+    assert pipeline.writes == 1
+    assert notes[0] == notes[1] == notes[2]
+    assert [trace.upstream_calls for trace in traces] == [1, 1, 1]
+
+
+async def test_note_write_appears_in_server_timing(api, pipedrive_state):
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+
+    response = await api.post("/crm/contact/note", json={
+        "contact_identifier": str(person["id"]),
+        "content": "Llamada de seguimiento"
+    })
+
+    assert response.status_code == 201, response.text
+    # GET persons/{id} y el POST /notes escrito por el pipeline
+    assert pipedrive_state.requests.get("POST /v1/notes") == 1
+    match = _UPSTREAM_CALLS.search(response.headers["server-timing"])
+    assert int(match.group(1)) == sum(pipedrive_state.requests.values())
+
+
+async def test_cancelled_batch_fails_its_submitters():
+    started = asyncio.Event()
+
+    async def write(person_id, content):
+        started.set()
+        await asyncio.sleep(10)
+
+    pipeline = NotePipeline(write, concurrency=1, max_merge=1, merge_window=0)
+    writing = asyncio.ensure_future(pipeline.submit(7, "primera"))
+    queued = asyncio.ensure_future(pipeline.submit(7, "segunda"))
+    await started.wait()
+
+    # Se cancela el lote en curso, como al apagar el servicio
+    pipeline._tasks[7].cancel()
+
+    for submitted in (writing, queued):
+        with pytest.raises(CRMException):
+            await asyncio.wait_for(submitted, 1)
+    assert pipeline.stats()["failed"] == 2
+    assert pipeline.stats()["contacts_pending"] == 0
+
+
+async def test_cancelled_submitter_keeps_its_write_once_started():
+    started, release = asyncio.Event(), asyncio.Event()
+    written = []
+
+    async def write(person_id, content):
+        started.set()
+        await release.wait()
+        written.append(content)
+        return {"id": len(written), "content": content}
+
+    pipeline = NotePipeline(write, concurrency=1, max_merge=1, merge_window=0)
+    writing = asyncio.ensure_future(pipeline.submit(7, "primera"))
+    queued = asyncio.ensure_future(pipeline.submit(7, "segunda"))
+    await started.wait()
+
+    writing.cancel()
+    queued.cancel()
+    release.set()
+    await pipeline.aclose()
+
+    # La nota que ya se estaba escribiendo se completa; la que seguía en cola no se escribe
+    assert written == ["primera"]
+    assert pipeline.stats()["failed"] == 0
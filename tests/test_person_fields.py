@@ -0,0 +1,63 @@
+import pytest
+
+from app.core.exceptions import CircuitOpenException, CRMException, ValidationException
+from app.services.person_fields import PersonFieldRegistry
+from benchmarks.mock_pipedrive import MockPipedriveState
+
+pytestmark = pytest.mark.anyio
+
+INDUSTRY = "5f3a0d1c9e8b7a6f5e4d3c2b1a0f9e8d7c6b5a49"
+EMPLOYEES = "a1b2c3d4e5f60718293a4b5c6d7e8f9012345678"
+
+
+class Loader:
+    """Carga de GET /personFields que cuenta las llamadas y puede fallar"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return MockPipedriveState().person_fields
+
+
+async def test_resolves_names_and_options():
+    registry = PersonFieldRegistry(Loader())
+
+    resolved = await registry.resolve({"Industria": "Salud", "Empleados": "40", "Nombre": "Ana"})
+
+    assert resolved == {INDUSTRY: 12, EMPLOYEES: 40, "name": "Ana"}
+    with pytest.raises(ValidationException):
+        await registry.resolve({"Industria": "Minería"})
+
+
+async def test_builtin_fields_skip_the_registry():
+    loader = Loader(CRMException("no disponible"))
+    registry = PersonFieldRegistry(loader)
+
+    fields = {"name": "Ana", "email": "ana@ejemplo.com", "visible_to": 3}
+
+    assert await registry.resolve(fields) == fields
+    assert loader.calls == 0
+
+
+async def test_unavailable_registry_passes_fields_through():
+    loader = Loader(CRMException("Error en Pipedrive API: 500"))
+    registry = PersonFieldRegistry(loader, refresh_interval=60)
+    fields = {"phone": "+57 300 0000000", INDUSTRY: 11}
+
+    assert await registry.resolve(fields) == fields
+    assert await registry.resolve(fields) == fields
+    # La carga fallida no se reintenta en cada solicitud
+    assert loader.calls == 1
+    assert registry.stats()["unresolved"] == 2
+
+
+async def test_circuit_open_is_not_masked():
+    registry = PersonFieldRegistry(Loader(CircuitOpenException(30)))
+
+    with pytest.raises(CircuitOpenException):
+        await registry.resolve({"Industria": "Salud"})
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.context import RequestTrace, request_trace
+from app.services.persons import changed_fields, person_from_search_item, project_person
+from app.services.update_coalescer import UpdateCoalescer
+
+pytestmark = pytest.mark.anyio
+
+INDUSTRY = "5f3a0d1c9e8b7a6f5e4d3c2b1a0f9e8d7c6b5a49"
+EMPLOYEES = "a1b2c3d4e5f60718293a4b5c6d7e8f9012345678"
+
+
+def pipedrive_person(**custom) -> dict:
+    return {
+        "id": 7,
+        "name": "Ana Pérez",
+        "email": [{"value": "ana@ejemplo.com", "primary": True}],
+        "phone": [],
+        "update_time": "2024-05-02 10:00:00",
+        "org_id": None,
+        "open_deals_count": 3,
+        **custom
+    }
+
+
+def test_projection_keeps_only_custom_fields():
+    person = project_person(pipedrive_person(**{INDUSTRY: "12", f"{EMPLOYEES}_currency": "COP"}))
+
+    assert person["custom_fields"] == {INDUSTRY: "12"}
+    assert "open_deals_count" not in person
+
+
+@pytest.mark.parametrize("current, sent", [
+    ("12", 12),
+    (12, "12"),
+    ("40", 40.0),
+    ("11,12", [12, 11]),
+    ([11, 12], "12,11"),
+    (None, ""),
+    ("", None),
+    (None, []),
+])
+def test_equal_custom_values_are_unchanged(current, sent):
+    person = project_person(pipedrive_person(**{INDUSTRY: current}))
+
+    assert changed_fields(person, {INDUSTRY: sent}) == {}
+
+
+@pytest.mark.parametrize("current, sent", [
+    ("12", 11),
+    ("11,12", [11]),
+    (None, "Tecnología"),
+    ("40", 41),
+])
+def test_different_custom_values_are_changed(current, sent):
+    person = project_person(pipedrive_person(**{INDUSTRY: current}))
+
+    assert changed_fields(person, {INDUSTRY: sent}) == {INDUSTRY: sent}
+
+
+def test_custom_fields_of_search_results_count_as_changed():
+    person = person_from_search_item({"id": 7, "name": "Ana Pérez", "emails": ["ana@ejemplo.com"]})
+
+    assert changed_fields(person, {INDUSTRY: 12, "name": "Ana Pérez"}) == {INDUSTRY: 12}
+
+
+async def test_repeated_custom_field_update_is_skipped(api, pipedrive_state, monkeypatch):
+    monkeypatch.setattr(settings, "UPDATE_SKIP_UNCHANGED", True)
+    person = pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+    update = {"contact_identifier": str(person["id"]), "fields": {"Industria": "Salud", "Empleados": "40"}}
+
+    first = await api.patch("/crm/contact", json=update)
+    second = await api.patch("/crm/contact", json=update)
+
+    assert first.status_code == second.status_code == 200
+    assert pipedrive_state.requests.get("PUT /v1/persons/{id}") == 1
+    assert "sin cambios" in second.json()["message"]
+
+
+async def test_coalesced_put_is_attributed_to_each_waiter():
+    async def write(person_id, fields):
+        await asyncio.sleep(0.01)
+        request_trace.get().record_upstream(0.01)
+        return {"id": person_id, **fields}
+
+    coalescer = UpdateCoalescer(write, window=0.02)
+    traces = [RequestTrace() for _ in range(3)]
+
+    async def submit(trace, fields):
+        request_trace.set(trace)
+        return await coalescer.submit(7, fields)
+
+    results = await asyncio.gather(*(submit(trace, {f"campo{i}": i}) for i, trace in enumerate(traces)))
+
+    assert coalescer.writes == 1
+    assert results[0] == {"id": 7, "campo0": 0, "campo1": 1, "campo2": 2}
+    assert [trace.upstream_calls for trace in traces] == [1, 1, 1]
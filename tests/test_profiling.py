@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.debug import debug_router
+from app.core.config import settings
+from app.core.middleware import ProfilingMiddleware
+from app.core.profiling import IDLE_FRAME, RequestProfiler, create_request_profiler
+
+pytestmark = pytest.mark.anyio
+
+TOKEN = "secreto"
+
+
+def busy_work(seconds: float) -> int:
+    total = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+@pytest.fixture
+async def profiled(tmp_path):
+    """Aplicación mínima con el middleware de perfilado y las rutas /debug"""
+    profiler = RequestProfiler(directory=str(tmp_path), sample_rate=0, token=TOKEN, interval=0.001)
+    app = FastAPI()
+
+    @app.get("/crm/work")
+    async def work():
+        busy_work(0.05)
+        await asyncio.sleep(0.02)
+        return {"ok": True}
+
+    app.state.profiler = profiler
+    app.include_router(debug_router, prefix="/debug")
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        yield client, profiler
+
+
+async def wait_for_file(path: str, timeout: float = 2.0):
+    # Los archivos se escriben en un hilo del executor después de la respuesta
+    end = time.monotonic() + timeout
+    while not os.path.exists(path) and time.monotonic() < end:
+        await asyncio.sleep(0.01)
+
+
+async def test_profiled_request_writes_collapsed_stacks(profiled):
+    client, profiler = profiled
+
+    response = await client.get("/crm/work", headers={settings.PROFILING_HEADER: TOKEN})
+    assert response.status_code == 200
+
+    [capture] = profiler.list()
+    assert capture["path"] == "/crm/work"
+    assert capture["samples"] > 0
+    path = capture["files"]["collapsed"]
+    await wait_for_file(path)
+    await wait_for_file(capture["files"]["speedscope"])
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    stacks = dict(line.rsplit(" ", 1) for line in lines)
+    assert all(count.isdigit() for count in stacks.values())
+    assert any("busy_work (test_profiling.py" in stack for stack in stacks)
+    assert any(stack == IDLE_FRAME for stack in stacks)
+
+    download = await client.get(
+        f"/debug/profiles/{capture['id']}/collapsed", headers={settings.PROFILING_HEADER: TOKEN}
+    )
+    assert download.status_code == 200
+    assert "busy_work" in download.text
+
+
+async def test_unmarked_request_is_not_profiled(profiled):
+    client, profiler = profiled
+
+    assert (await client.get("/crm/work")).status_code == 200
+    assert (await client.get("/crm/work", headers={settings.PROFILING_HEADER: "otro"})).status_code == 200
+    assert profiler.list() == []
+
+
+async def test_profiles_require_the_token(profiled):
+    client, _ = profiled
+
+    assert (await client.get("/debug/profiles")).status_code == 403
+    assert (await client.get("/debug/profiles", headers={settings.PROFILING_HEADER: "otro"})).status_code == 403
+    assert (await client.get("/debug/profiles", headers={settings.PROFILING_HEADER: TOKEN})).status_code == 200
+
+
+def test_profiling_without_token_stays_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "")
+
+    assert create_request_profiler() is None
+
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", TOKEN)
+    assert isinstance(create_request_profiler(), RequestProfiler)
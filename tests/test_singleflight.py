@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.exceptions import DuplicateContactException
+from app.services.cache import AsyncTTLCache
+from app.services.pipedrive_service import PipedriveService
+from app.services.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+CALLERS = 50
+
+
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "valor"
+
+    results = await asyncio.gather(*(flights.do("clave", load) for _ in range(CALLERS)))
+
+    assert calls == 1
+    assert results == ["valor"] * CALLERS
+    assert flights.coalesced == CALLERS - 1
+    assert "clave" not in flights
+
+
+async def test_errors_are_shared_and_not_kept():
+    flights = SingleFlight()
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        raise DuplicateContactException([{"id": 1}, {"id": 2}])
+
+    results = await asyncio.gather(*(flights.do("clave", fail) for _ in range(10)), return_exceptions=True)
+
+    assert calls == 1
+    assert all(isinstance(r, DuplicateContactException) for r in results)
+    with pytest.raises(DuplicateContactException):
+        await flights.do("clave", fail)
+    assert calls == 2
+
+
+async def test_waiter_takes_over_when_the_leader_is_cancelled():
+    flights = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    leader = asyncio.create_task(flights.do("clave", load))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flights.do("clave", load))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await waiter == 2
+    assert leader.cancelled()
+
+
+async def test_cache_loads_a_missing_key_once():
+    cache = AsyncTTLCache(max_entries=10, ttl=60)
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"id": 1}
+
+    results = await asyncio.gather(*(cache.get_or_load("persona", load) for _ in range(CALLERS)))
+
+    assert calls == 1
+    assert all(r == {"id": 1} for r in results)
+    assert cache.stats()["coalesced"] == CALLERS - 1
+
+
+@pytest.mark.parametrize("cache_enabled", [True, False])
+@pytest.mark.parametrize("identifier", ["contacto3@ejemplo.com", "Contacto 3", "4"])
+async def test_concurrent_lookups_make_one_upstream_call(
+        pipedrive, pipedrive_state, monkeypatch, cache_enabled, identifier
+):
+    monkeypatch.setattr(settings, "CACHE_ENABLED", cache_enabled)
+    pipedrive_state.seed(10)
+    pipedrive_state.latency = 0.05
+    service = PipedriveService()
+    try:
+        persons = await asyncio.gather(*(service.find_contact_by_identifier(identifier) for _ in range(CALLERS)))
+    finally:
+        await service.aclose()
+
+    assert len({p["id"] for p in persons}) == 1
+    if identifier.isdigit():
+        assert pipedrive_state.requests == {"GET /v1/persons/{id}": 1}
+    else:
+        assert pipedrive_state.requests == {"GET /v1/persons/search": 1, "GET /v1/persons/{id}": 1}
+
+
+async def test_concurrent_searches_make_one_upstream_call(pipedrive, pipedrive_state):
+    pipedrive_state.seed(10)
+    pipedrive_state.latency = 0.05
+    service = PipedriveService()
+    try:
+        results = await asyncio.gather(*(
+            service.search_persons("Contacto") for _ in range(CALLERS)
+        ))
+    finally:
+        await service.aclose()
+
+    assert all(len(r) == 10 for r in results)
+    assert pipedrive_state.requests == {"GET /v1/persons/search": 1}
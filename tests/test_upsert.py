@@ -0,0 +1,77 @@
+import pytest
+
+from app.core.config import settings
+from app.core.exceptions import CircuitOpenException
+from app.schemas.contact import ContactUpsert
+from app.services import contact_operations
+from app.services.pipedrive_service import PipedriveService
+
+pytestmark = pytest.mark.anyio
+
+INDUSTRY = "5f3a0d1c9e8b7a6f5e4d3c2b1a0f9e8d7c6b5a49"
+
+
+@pytest.fixture
+async def service(pipedrive, monkeypatch):
+    monkeypatch.setattr(settings, "UPDATE_SKIP_UNCHANGED", True)
+    service = PipedriveService()
+    yield service
+    await service.aclose()
+
+
+async def test_failed_note_is_reported_without_losing_the_rest(service, pipedrive_state, monkeypatch):
+    pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+    add_note = service.add_note
+
+    async def flaky_add_note(person_id, content):
+        if content == "Dos":
+            raise CircuitOpenException(1.0)
+        return await add_note(person_id, content)
+
+    monkeypatch.setattr(service, "add_note", flaky_add_note)
+
+    response = await contact_operations.upsert_contact(service, ContactUpsert(
+        name="Ana Pérez",
+        email="ana@ejemplo.com",
+        fields={"Industria": "Salud"},
+        notes=["Uno", "Dos", "Tres"]
+    ))
+
+    assert response.success is False
+    data = response.data
+    assert data["update"]["success"] is True
+    assert data["updated_fields"] == {INDUSTRY: 12}
+    assert [(note["success"], note["status_code"]) for note in data["notes"]] == [(True, 201), (False, 503), (True, 201)]
+    assert pipedrive_state.requests.get("POST /v1/notes") == 2
+    assert pipedrive_state.requests.get("PUT /v1/persons/{id}") == 1
+
+
+async def test_updated_fields_lists_only_the_changes(service, pipedrive_state):
+    pipedrive_state.add_person("Ana Pérez", email="ana@ejemplo.com")
+
+    response = await contact_operations.upsert_contact(service, ContactUpsert(
+        name="Ana Pérez",
+        email="ana@ejemplo.com",
+        fields={"name": "Ana Pérez", "Industria": "Tecnología"}
+    ))
+
+    assert response.success is True
+    # El nombre no cambia: no se envía ni se reporta
+    assert response.data["updated_fields"] == {INDUSTRY: 11}
+    assert response.data["update"]["status_code"] == 200
+    assert response.data["notes"] == []
+
+
+async def test_email_match_wins_over_a_cached_name(service, pipedrive_state):
+    by_name = pipedrive_state.add_person("Carlos Ruiz", email="carlos@ejemplo.com")
+    by_email = pipedrive_state.add_person("Carlos R.", email="cruiz@ejemplo.com")
+    # Deja el nombre asociado a la primera persona en la caché
+    assert (await service.find_contact_by_identifier("Carlos Ruiz"))["id"] == by_name["id"]
+
+    response = await contact_operations.upsert_contact(service, ContactUpsert(
+        name="Carlos Ruiz",
+        email="cruiz@ejemplo.com"
+    ))
+
+    assert response.contact_id == by_email["id"]
+    assert response.data["is_new"] is False
@@ -0,0 +1,169 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from app.core.config import settings
+from app.services.pipedrive_service import PipedriveService
+from app.services.persons import parse_update_time
+from app.services.webhooks import (
+    WEBHOOK_APPLIED,
+    WEBHOOK_DUPLICATE,
+    WEBHOOK_STALE,
+    PipedriveWebhookProcessor,
+    parse_person_event
+)
+
+pytestmark = pytest.mark.anyio
+
+FIXTURES = Path(__file__).parent / "fixtures" / "webhooks"
+
+# Resultado esperado de cada entrega capturada, en orden de llegada
+EXPECTED = {
+    "01_v1_person_added.json": WEBHOOK_APPLIED,
+    "02_v1_person_updated.json": WEBHOOK_APPLIED,
+    "03_v2_person_change.json": WEBHOOK_APPLIED,
+    "04_v1_person_updated.json": WEBHOOK_APPLIED,
+    "05_v2_person_change_late.json": WEBHOOK_STALE,
+    "06_v1_person_merged.json": WEBHOOK_APPLIED,
+    "07_v2_person_merge.json": WEBHOOK_APPLIED,
+    "08_v2_person_delete.json": WEBHOOK_APPLIED,
+}
+
+
+def load_fixtures():
+    return [(path.name, json.loads(path.read_text(encoding="utf-8"))) for path in sorted(FIXTURES.glob("*.json"))]
+
+
+@pytest.fixture
+def tenant_webhooks(monkeypatch, tmp_path):
+    """Dos cuentas con sus propias credenciales de webhook, además de las globales"""
+    config = tmp_path / "tenants.json"
+    config.write_text(json.dumps({
+        "acme": {"api_token": "token-acme", "webhook_user": "acme", "webhook_password": "clave-acme"},
+        "globex": {"api_token": "token-globex", "webhook_user": "globex", "webhook_password": "clave-globex"}
+    }), encoding="utf-8")
+    monkeypatch.setattr(settings, "TENANTS_ENABLED", True)
+    monkeypatch.setattr(settings, "TENANTS_CONFIG_PATH", str(config))
+    monkeypatch.setattr(settings, "WEBHOOKS_ENABLED", True)
+    monkeypatch.setattr(settings, "WEBHOOK_USER", "global")
+    monkeypatch.setattr(settings, "WEBHOOK_PASSWORD", "clave-global")
+
+
+@pytest.fixture
+async def webhook_api(tenant_webhooks, api):
+    return api
+
+
+@pytest.fixture
+async def service(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "MIRROR_ENABLED", False)
+    service = PipedriveService()
+    yield service
+    await service.aclose()
+
+
+def cached_person(service: PipedriveService, person_id: int):
+    return service.cache.get(service._person_key(person_id))
+
+
+def test_update_time_formats_are_comparable():
+    assert parse_update_time("2024-05-02 11:00:00") > parse_update_time("2024-05-02T10:00:00Z")
+    assert parse_update_time("2024-05-02T10:00:00.000Z") == parse_update_time("2024-05-02 10:00:00")
+    assert parse_update_time("") is None
+    assert parse_update_time("no es una fecha") is None
+
+
+def test_merge_events_carry_merged_id():
+    events = {name: parse_person_event(payload) for name, payload in load_fixtures()}
+
+    assert events["06_v1_person_merged.json"].merged_id == 2
+    assert events["07_v2_person_merge.json"].merged_id == 5
+    assert events["03_v2_person_change.json"].merged_id is None
+    assert events["08_v2_person_delete.json"].current is None
+
+
+async def test_replay_captured_events(service):
+    for person_id in (2, 5):
+        service.cache.set(service._person_key(person_id), {"id": person_id, "name": "Duplicado"})
+    processor = PipedriveWebhookProcessor()
+    fixtures = load_fixtures()
+    assert [name for name, _ in fixtures] == list(EXPECTED)
+
+    results = {name: await processor.process(payload, service) for name, payload in fixtures}
+
+    assert results == EXPECTED
+    ana = cached_person(service, 1)
+    assert ana["update_time"] == "2024-05-02 12:00:00"
+    assert [phone["value"] for phone in ana["phone"]] == ["+57 311 1111111"]
+    assert [email["value"] for email in ana["email"]] == ["ana.perez@ejemplo.com"]
+    assert cached_person(service, 4)["name"] == "Diana Torres"
+    # Las personas absorbidas por una fusión y la eliminada salen de la caché
+    for person_id in (2, 3, 5):
+        assert cached_person(service, person_id) is None
+
+    # Pipedrive reintenta las entregas: la segunda pasada no aplica nada
+    replay = {name: await processor.process(payload, service) for name, payload in fixtures}
+    assert set(replay.values()) == {WEBHOOK_DUPLICATE}
+    assert processor.stats()["applied"] == len(EXPECTED) - 1
+
+
+async def test_failed_apply_is_redelivered(service, monkeypatch):
+    processor = PipedriveWebhookProcessor()
+    payload = json.loads((FIXTURES / "02_v1_person_updated.json").read_text(encoding="utf-8"))
+    apply = service.apply_person_change
+    calls = 0
+
+    async def flaky_apply(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("fallo al aplicar")
+        return await apply(*args, **kwargs)
+
+    monkeypatch.setattr(service, "apply_person_change", flaky_apply)
+
+    with pytest.raises(RuntimeError):
+        await processor.process(payload, service)
+    assert await processor.process(payload, service) == WEBHOOK_APPLIED
+    assert await processor.process(payload, service) == WEBHOOK_DUPLICATE
+    assert cached_person(service, 1)["name"] == "Ana Pérez Gómez"
+
+
+async def test_mirror_write_does_not_block_the_event_loop(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "MIRROR_ENABLED", True)
+    monkeypatch.setattr(settings, "MIRROR_PATH", str(tmp_path / "mirror.db"))
+    service = PipedriveService()
+    processor = PipedriveWebhookProcessor()
+    payload = json.loads((FIXTURES / "01_v1_person_added.json").read_text(encoding="utf-8"))
+    try:
+        # Una sincronización completa tiene el lock de la réplica
+        service.mirror._lock.acquire()
+        try:
+            delivery = asyncio.ensure_future(processor.process(payload, service))
+            await asyncio.sleep(0.05)
+            # El bucle de eventos sigue atendiendo mientras la escritura espera el lock
+            assert not delivery.done()
+        finally:
+            service.mirror._lock.release()
+
+        assert await asyncio.wait_for(delivery, 1) == WEBHOOK_APPLIED
+        assert service.mirror.get(3)["name"] == "Carlos Ruiz"
+    finally:
+        await service.aclose()
+
+
+async def test_each_tenant_authenticates_with_its_own_credentials(webhook_api):
+    payload = json.loads((FIXTURES / "01_v1_person_added.json").read_text(encoding="utf-8"))
+
+    async def deliver(tenant, auth):
+        return await webhook_api.post("/crm/webhooks/pipedrive", params={"tenant": tenant}, json=payload, auth=auth)
+
+    assert (await deliver("acme", ("acme", "clave-acme"))).status_code == 200
+    # Las credenciales de otra cuenta o las globales no sirven para acme
+    assert (await deliver("acme", ("globex", "clave-globex"))).status_code == 401
+    assert (await deliver("acme", ("global", "clave-global"))).status_code == 401
+    assert (await deliver("globex", ("globex", "clave-globex"))).status_code == 200
+    assert (await deliver("desconocido", ("acme", "clave-acme"))).status_code == 401